@@ -12,23 +12,32 @@ class Assembler:
 
 	def _initial(self):
 		self.symbols = SymbolTable()
+		self.labels = {}
 		self.next_addr = 16
 
 	def assemble(self, path, dest=None):
 		if dest is None:
 			dest = path.rsplit('.')[0] + '.hack'
-		p = Parser(path)
+		words = self.translate(path)
 		with open(dest, 'w') as target:
-			for cm in self.extract_labels(p):
-				tag, parts = cm
-				if tag == 'a_command':
-					bits = complete_A(self.get_address(parts))
-					target.write(bits + '\n')
-				elif tag == 'c_command':
-					bits = complete_C(parts[0], parts[1], parts[2])
-					target.write(bits + '\n')
+			for bits in words:
+				target.write(bits + '\n')
 		self._initial()
 
+	def translate(self, path):
+		"""Return the machine words (as strings of bits) of the asm file in
+		path. The symbols (and the labels) of the program are kept in
+		self.symbols (and self.labels) until the next translation."""
+		self._initial()
+		words = []
+		for cm in self.extract_labels(Parser(path)):
+			tag, parts = cm
+			if tag == 'a_command':
+				words.append(complete_A(self.get_address(parts)))
+			elif tag == 'c_command':
+				words.append(complete_C(parts[0], parts[1], parts[2]))
+		return words
+
 	def extract_labels(self, p):
 		"""Extract the labels out of commands and return the rest commands (A and
 		C commands)."""
@@ -39,6 +48,7 @@ class Assembler:
 			cm_type = p.command_type
 			if cm_type == 'l_command':
 				self.symbols.add_entry(p.symbol, rom_address)
+				self.labels[p.symbol] = rom_address
 			elif cm_type == 'a_command':
 				rest_commands.append((cm_type, p.symbol))
 				rom_address += 1
@@ -0,0 +1,427 @@
+"""The Emulator module provides class Emulator to run programs in Hack machine
+language (a hack file, or an asm file which is assembled on the fly).
+
+The function of emulator in this file would be as follow:
+
+>>> emu = Emulator().load('max/Max.hack')
+>>> emu.ram[0], emu.ram[1] = 3, 5
+>>> emu.run(50)
+>>> emu.ram[2]
+5
+
+The ROM is decoded once when a program is loaded, so the CPU loop only
+dispatches on prepared tuples. The RAM may be put in shared memory
+(shared=True) for other threads or processes to sample it, e.g. the screen
+renderer in Renderer.py.
+"""
+
+import os
+from array import array
+from multiprocessing import shared_memory
+from Assembler import Assembler
+from Code import COMP_CODES, DEST_CODES, JUMP_CODES
+
+ROM_SIZE    = 0x8000
+RAM_SIZE    = 0x8000            # the whole 15-bit address space
+SCREEN      = 0x4000
+SCREEN_SIZE = 0x2000            # 256 rows * 32 words
+KBD         = 0x6000
+WORD_MASK   = 0xFFFF
+
+# the computations of the comp field (zx nx zy ny f no), where D is the x
+# input of the ALU and X is the y input (A or M, by the a-bit)
+COMP_FUNCTIONS = {
+	0b101010: lambda D, X: 0,
+	0b111111: lambda D, X: 1,
+	0b111010: lambda D, X: WORD_MASK,
+	0b001100: lambda D, X: D,
+	0b110000: lambda D, X: X,
+	0b001101: lambda D, X: D ^ WORD_MASK,
+	0b110001: lambda D, X: X ^ WORD_MASK,
+	0b001111: lambda D, X: -D & WORD_MASK,
+	0b110011: lambda D, X: -X & WORD_MASK,
+	0b011111: lambda D, X: (D + 1) & WORD_MASK,
+	0b110111: lambda D, X: (X + 1) & WORD_MASK,
+	0b001110: lambda D, X: (D - 1) & WORD_MASK,
+	0b110010: lambda D, X: (X - 1) & WORD_MASK,
+	0b000010: lambda D, X: (D + X) & WORD_MASK,
+	0b010011: lambda D, X: (D - X) & WORD_MASK,
+	0b000111: lambda D, X: (X - D) & WORD_MASK,
+	0b000000: lambda D, X: D & X,
+	0b010101: lambda D, X: D | X,
+}
+
+# (jump if out < 0, jump if out == 0, jump if out > 0) for each jump field
+JUMP_CONDITIONS = tuple((bool(j & 4), bool(j & 2), bool(j & 1))
+						for j in range(8))
+
+# mnemonics of the fields of a C-instruction, for disassembling
+_COMP_MNEMONICS = dict((int(bits, 2), mn) for mn, bits in COMP_CODES.items())
+_DEST_MNEMONICS = dict((int(bits, 2), mn) for mn, bits in DEST_CODES.items())
+_JUMP_MNEMONICS = dict((int(bits, 2), mn) for mn, bits in JUMP_CODES.items())
+
+class EmulatorError(RuntimeError):
+	pass
+
+class EmulatorFault(EmulatorError):
+	"""A program did something that a correct program never does, e.g.
+	accessed memory out of range."""
+	pass
+
+def out_of_range(pc, A):
+	"""The fault of an instruction which raised IndexError: its pc is out of
+	the ROM, or the address A out of the RAM."""
+	if pc >= ROM_SIZE:
+		return "pc %s out of ROM" %pc
+	return "RAM[%s] out of range" %A
+
+def alu(x, y, control):
+	"""The Hack ALU on two 16-bit words for any 6-bit control code, used for
+	the comp fields which have no entry in COMP_FUNCTIONS."""
+	if control & 0b100000:
+		x = 0
+	if control & 0b010000:
+		x ^= WORD_MASK
+	if control & 0b001000:
+		y = 0
+	if control & 0b000100:
+		y ^= WORD_MASK
+	out = (x + y) & WORD_MASK if control & 0b000010 else x & y
+	if control & 0b000001:
+		out ^= WORD_MASK
+	return out
+
+def comp_function(control):
+	if control in COMP_FUNCTIONS:
+		return COMP_FUNCTIONS[control]
+	return lambda D, X: alu(D, X, control)
+
+def decode(word):
+	"""Decode a machine word into None (an A-instruction, whose value is the
+	word itself) or a tuple (comp, uses_m, dest, jump)."""
+	if not word & 0x8000:
+		return None
+	comp = comp_function((word >> 6) & 0b111111)
+	uses_m = bool(word & 0x1000)
+	dest = (word >> 3) & 0b111            # A D M
+	jump = word & 0b111
+	return comp, uses_m, dest, (JUMP_CONDITIONS[jump] if jump else None)
+
+def disassemble(word):
+	"""The asm text of a machine word."""
+	if not word & 0x8000:
+		return '@%s' %word
+	comp = _COMP_MNEMONICS.get((word >> 6) & 0b1111111,
+							   '?%s' %format((word >> 6) & 0b1111111, '07b'))
+	dest = _DEST_MNEMONICS[(word >> 3) & 0b111]
+	jump = _JUMP_MNEMONICS[word & 0b111]
+	return ((dest + '=' if dest != 'null' else '') + comp +
+			(';' + jump if jump != 'null' else ''))
+
+def read_program(path):
+	"""Return the machine words of a hack or asm file, the labels and all
+	the symbols of the program (both empty for a hack file)."""
+	_, ext = os.path.splitext(path)
+	if ext == '.hack':
+		with open(path, 'r') as file:
+			words = [int(line, 2) for line in map(str.strip, file) if line]
+		return words, {}, {}
+	elif ext == '.asm':
+		assembler = Assembler()
+		words = [int(bits, 2) for bits in assembler.translate(path)]
+		return words, assembler.labels, dict(assembler.symbols._symbols)
+	raise ValueError("Except a hack or asm file.")
+
+class Emulator:
+	"""
+	Execute Hack machine language. The registers are A, D and pc, the data
+	memory is ram (32K words, indexable as unsigned 16-bit integers).
+
+	A TraceRecorder (Tracer.py) may be attached as tracer, a RAMHeatmap
+	(Heatmap.py) as heatmap, and native routines (Hooks.py) into hooks; the
+	program then runs in an instrumented loop, or in a loop of its own with
+	a tracer alone, which also check for faults when tracing. An access out of the RAM or a jump out of the ROM raises
+	EmulatorFault in any loop, the registers being those before the
+	instruction.
+	"""
+	def __init__(self, shared=False):
+		self._shm = None
+		if shared:
+			self._shm = shared_memory.SharedMemory(create=True,
+												   size=RAM_SIZE * 2)
+			self.ram = self._shm.buf.cast('H')
+		else:
+			self.ram = array('H', bytes(RAM_SIZE * 2))
+		self.rom = array('H', bytes(ROM_SIZE * 2))
+		self.labels = {}
+		self.symbols = {}
+		self.program_size = 0
+		self._code = [None] * ROM_SIZE
+		self.A = self.D = self.pc = 0
+		self.cycles = 0
+		self.tracer = None
+		self.heatmap = None
+		self.hooks = {}                 # ROM address: Hook
+
+	@property
+	def shm_name(self):
+		"""name of the shared memory block holding the RAM, or None"""
+		return self._shm.name if self._shm else None
+
+	def load(self, path):
+		words, self.labels, self.symbols = read_program(path)
+		self.load_words(words)
+		return self
+
+	def load_words(self, words):
+		if len(words) > ROM_SIZE:
+			raise EmulatorError("Program too large: %s words" %len(words))
+		self.rom[:] = array('H', bytes(ROM_SIZE * 2))
+		self.rom[:len(words)] = array('H', words)
+		self._code = [decode(w) for w in words]
+		self._code.extend([None] * (ROM_SIZE - len(words)))
+		self.program_size = len(words)
+		self.reset()
+		return self
+
+	def reset(self):
+		self.pc = 0
+		self.cycles = 0
+
+	def step(self):
+		self.run(1)
+
+	def run(self, cycles):
+		"""Execute the given number of instructions."""
+		if self.heatmap is not None:
+			# the logged addresses are counted between chunks
+			while cycles > 0:
+				chunk = min(cycles, self.heatmap.chunk)
+				try:
+					self._run_instrumented(chunk)
+				finally:
+					self.heatmap.flush()
+				cycles -= chunk
+			return
+		if self.hooks:
+			return self._run_instrumented(cycles)
+		if self.tracer is not None:
+			return self._run_traced(cycles)
+		code, rom, ram = self._code, self.rom, self.ram
+		A, D, pc = self.A, self.D, self.pc
+		done = 0
+		try:
+			for done in range(cycles):
+				op = code[pc]
+				if op is None:
+					A = rom[pc]
+					pc += 1
+					continue
+				comp, uses_m, dest, jump = op
+				out = comp(D, ram[A] if uses_m else A)
+				target = A
+				if dest:
+					if dest & 1:
+						ram[A] = out
+					if dest & 2:
+						D = out
+					if dest & 4:
+						A = out
+				if jump and (jump[0] if out & 0x8000 else
+							 jump[1] if out == 0 else jump[2]):
+					pc = target
+				else:
+					pc += 1
+			else:
+				done = cycles
+		except IndexError:
+			# the instruction at pc was not executed
+			raise EmulatorFault('cycle %s, pc %s: %s'
+								%(self.cycles + done, pc,
+								  out_of_range(pc, A))) from None
+		finally:
+			self.A, self.D, self.pc = A, D, pc
+			self.cycles += done
+
+	def _run_traced(self, cycles):
+		"""The loop of run with a tracer alone. The steps run by segments of
+		the ring of pcs, so that the index of the loop is that of the pc in
+		the ring; the pc is computed before the stores, so that an SP
+		underflow ends the step where it is found."""
+		code, rom, ram = self._code, self.rom, self.ram
+		A, D, pc = self.A, self.D, self.pc
+		limit = self.program_size
+		tracer = self.tracer
+		pcs, mask, start = tracer.pcs, tracer.mask, tracer.count
+		stack_base = tracer.stack_base or 0
+		fault = None
+		count, end = start, start + cycles  # count: the steps done
+		try:
+			while count < end:
+				base = count & ~mask        # the step of pcs[0]
+				top = min(mask + 1, end - base)
+				for i in range(count - base, top):
+					op = code[pc]
+					pcs[i] = pc
+					if op is None:
+						if pc >= limit:
+							fault = ("pc %s out of the program (%s words)"
+									 %(pc, limit))
+							count = base + i
+							break
+						A = rom[pc]
+						pc += 1
+						continue
+					comp, uses_m, dest, jump = op
+					if A > KBD and (uses_m or dest & 1):
+						fault = "RAM[%s] out of range" %A
+						count = base + i
+						break
+					out = comp(D, ram[A] if uses_m else A)
+					if jump and (jump[0] if out & 0x8000 else
+								 jump[1] if out == 0 else jump[2]):
+						pc = A
+					else:
+						pc += 1
+					if dest:
+						if dest & 1:
+							ram[A] = out
+							pcs[i] = (pcs[i], A, out)
+							if A == 0 and out < stack_base:
+								fault = "SP underflow: SP = %s" %out
+								if dest & 2:
+									D = out
+								if dest & 4:
+									A = out
+								count = base + i + 1
+								break
+						if dest & 2:
+							D = out
+						if dest & 4:
+							A = out
+				else:
+					count = base + top
+					continue
+				break
+		except IndexError:
+			fault = out_of_range(pc, A)     # at pc, not executed
+			count = base + i
+		finally:
+			self.A, self.D, self.pc = A, D, pc
+			self.cycles += count - start
+			tracer.count = count
+		if fault:
+			tracer.on_fault(self, fault)
+			raise EmulatorFault('cycle %s, pc %s: %s'
+								%(self.cycles, pc, fault))
+
+	def _run_instrumented(self, cycles):
+		"""The loop of run with the attached instruments."""
+		code, rom, ram = self._code, self.rom, self.ram
+		A, D, pc = self.A, self.D, self.pc
+		limit = self.program_size
+		tracer = self.tracer
+		tracing = tracer is not None
+		if tracing:
+			pcs, mask, count = tracer.pcs, tracer.mask, tracer.count
+			stack_base = tracer.stack_base or 0
+		counting = self.heatmap is not None
+		if counting:
+			log_read = self.heatmap.read_log.append
+			log_write = self.heatmap.write_log.append
+		hooks = self.hooks
+		fault = None
+		done = 0
+		try:
+			for done in range(cycles):
+				if hooks and pc in hooks:
+					if tracing:
+						pcs[count & mask] = pc
+						count += 1
+					pc = A = hooks[pc].call(self)
+					D = ram[1]
+					continue
+				op = code[pc]
+				if tracing:
+					if op is None and pc >= limit:
+						fault = ("pc %s out of the program (%s words)"
+								 %(pc, limit))
+						break
+					pcs[count & mask] = pc
+					count += 1
+				if op is None:
+					A = rom[pc]
+					pc += 1
+					continue
+				comp, uses_m, dest, jump = op
+				if tracing and A > KBD and (uses_m or dest & 1):
+					fault = "RAM[%s] out of range" %A
+					count -= 1              # not executed
+					break
+				if counting:
+					if uses_m:
+						log_read(A)
+					if dest & 1:
+						log_write(A)
+				out = comp(D, ram[A] if uses_m else A)
+				target = A
+				if dest:
+					if dest & 1:
+						ram[A] = out
+						if tracing:
+							i = (count - 1) & mask
+							pcs[i] = (pcs[i], A, out)
+							if A == 0 and out < stack_base:
+								fault = "SP underflow: SP = %s" %out
+					if dest & 2:
+						D = out
+					if dest & 4:
+						A = out
+				if jump and (jump[0] if out & 0x8000 else
+							 jump[1] if out == 0 else jump[2]):
+					pc = target
+				else:
+					pc += 1
+				if fault:
+					done += 1
+					break
+			else:
+				done = cycles
+		except IndexError:
+			fault = out_of_range(pc, A)     # at pc, not executed
+		finally:
+			self.A, self.D, self.pc = A, D, pc
+			self.cycles += done
+		if tracing:
+			tracer.count = count
+			if fault:
+				tracer.on_fault(self, fault)
+		if fault:
+			raise EmulatorFault('cycle %s, pc %s: %s'
+								%(self.cycles, pc, fault))
+
+	def screen(self):
+		"""a copy of the screen memory map as bytes (little-endian words)"""
+		return bytes(memoryview(self.ram).cast('B')[SCREEN * 2:
+									 (SCREEN + SCREEN_SIZE) * 2])
+
+	def close(self):
+		"""Release the shared memory (if any)."""
+		if self._shm is not None:
+			view, self.ram = self.ram, array('H', self.ram)
+			view.release()
+			self._shm.close()
+			self._shm.unlink()
+			self._shm = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+if __name__ == '__main__':
+	emu = Emulator().load('max/Max.hack')
+	emu.ram[0], emu.ram[1] = 3, 5
+	emu.run(50)
+	print('max(3, 5) = %s' %emu.ram[2])
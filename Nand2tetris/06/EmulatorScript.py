@@ -0,0 +1,197 @@
+"""The EmulatorScript module runs the test scripts of the CPU emulator (the .tst
+of projects 04, 07 and 08) on the Emulator, and compares their output with
+the compare file (.cmp). The commands are load, output-file (ignored),
+compare-to, output-list, set (RAM[k] or PC), ticktock, repeat n {...} and
+output; the cells are compared by value, not by their format. A fault of
+the program, like an access out of the RAM, fails the script as a
+comparison does (ScriptError).
+
+The function of script in this file would be as follow:
+
+>>> run_script('../07/StackArithmetic/StackTest/StackTest.tst')
+(4, 1000)
+
+The program may be another asm or hack file than the one the script loads,
+e.g. the output of an optimized translation:
+
+>>> run_script('SimpleFunction.tst', program='/tmp/SimpleFunction.asm')
+
+Run this file with test scripts as arguments; -p PROGRAM runs them on the
+asm or hack file PROGRAM instead of the ones they load.
+"""
+
+import os
+import re
+import sys
+from Emulator import Emulator, EmulatorError
+from Parser import CommandError
+
+_TOKEN = re.compile(r'//[^\n]*|/\*.*?\*/|([{}])|[,;]|([^\s,;{}]+)', re.S)
+_RAM = re.compile(r'RAM\[(\d+)\]$')
+
+class ScriptError(Exception):
+	pass
+
+def parse_script(text):
+	"""The commands of the script text: lists of words, and [('repeat',
+	n, commands)] for the loops."""
+	commands, stack, words = [], [], []
+	for m in _TOKEN.finditer(text):
+		brace, word = m.group(1), m.group(2)
+		if word:
+			words.append(word)
+			continue
+		if not m.group(0) or m.group(0).startswith('/'):
+			continue
+		if words:
+			commands.append(words)
+			words = []
+		if brace == '{':
+			if not commands or commands[-1][0] != 'repeat':
+				raise ScriptError("'{' after no repeat")
+			if len(commands[-1]) != 2:
+				raise ScriptError("a repeat without a count runs forever")
+			count = int(commands.pop()[1])
+			stack.append((commands, count))
+			commands = []
+		elif brace == '}':
+			if not stack:
+				raise ScriptError("unbalanced '}'")
+			outer, count = stack.pop()
+			outer.append(('repeat', count, commands))
+			commands = outer
+	if words:
+		commands.append(words)
+	if stack:
+		raise ScriptError("unbalanced '{'")
+	return commands
+
+def _cells(line):
+	return [cell.strip() for cell in line.strip().strip('|').split('|')]
+
+def _signed(value):
+	return value - 0x10000 if value & 0x8000 else value
+
+class EmulatorScript:
+	"""
+	Run the script path on an Emulator; cycles counts the ticktocks and
+	rows the rows compared.
+	"""
+	def __init__(self, path, program=None):
+		self.path = path
+		self.directory = os.path.dirname(os.path.abspath(path))
+		self.program = program
+		self.emu = Emulator()
+		self.cycles = 0
+		self.rows = 0
+		self._columns = []
+		self._compare = []
+
+	def run(self):
+		with open(self.path) as f:
+			self.execute(parse_script(f.read()))
+		return self.rows, self.cycles
+
+	def execute(self, commands):
+		for command in commands:
+			if command[0] == 'repeat':
+				_, count, body = command
+				if all(words == ['ticktock'] for words in body):
+					self.run_cycles(count * len(body))
+				else:
+					for _ in range(count):
+						self.execute(body)
+			else:
+				self.command(command)
+
+	def command(self, words):
+		name, args = words[0], words[1:]
+		emu = self.emu
+		if name == 'load':
+			emu.load(self.program or os.path.join(self.directory, args[0]))
+		elif name == 'output-file':
+			pass
+		elif name == 'compare-to':
+			with open(os.path.join(self.directory, args[0])) as f:
+				self._compare = [line for line in f if line.strip()]
+		elif name == 'output-list':
+			self._columns = [spec.split('%')[0] for spec in args]
+			self.output(self._columns, header=True)
+		elif name == 'set':
+			target, value = args[0], int(args[1]) & 0xFFFF
+			m = _RAM.match(target)
+			if m:
+				emu.ram[int(m.group(1))] = value
+			elif target == 'PC':
+				emu.pc = value
+			else:
+				raise ScriptError("%s: cannot set %s" %(self.path, target))
+		elif name == 'ticktock':
+			self.run_cycles(1)
+		elif name == 'output':
+			self.output([str(_signed(self.value(c))) for c in self._columns])
+		elif name != 'echo':
+			raise ScriptError("%s: unknown command %s"
+							  %(self.path, ' '.join(words)))
+
+	def run_cycles(self, cycles):
+		"""Run the emulator; a fault of the program (an access out of the
+		RAM, see Emulator.run) fails the script."""
+		start = self.emu.cycles
+		try:
+			self.emu.run(cycles)
+		except EmulatorError as e:
+			raise ScriptError("%s: %s" %(self.path, e))
+		finally:
+			self.cycles += self.emu.cycles - start
+
+	def value(self, name):
+		m = _RAM.match(name)
+		if m:
+			return self.emu.ram[int(m.group(1))]
+		if name in ('A', 'D'):
+			return getattr(self.emu, name)
+		if name == 'PC':
+			return self.emu.pc
+		raise ScriptError("%s: unknown variable %s" %(self.path, name))
+
+	def output(self, cells, header=False):
+		if self.rows >= len(self._compare):
+			raise ScriptError("%s: more rows than the compare file"
+							  %self.path)
+		expected = _cells(self._compare[self.rows])
+		self.rows += 1
+		if header:      # the names are cut to the width of their columns
+			cells = [cell[:len(name)] for cell, name in zip(cells, expected)]
+		if expected != cells:
+			raise ScriptError("%s: comparison failure at line %d\n"
+							  "expected: %s\ngot:      %s"
+							  %(self.path, self.rows, '|'.join(expected),
+								'|'.join(cells)))
+
+def run_script(path, program=None):
+	"""Run the script path (on program instead of the one it loads, if
+	given); return (the rows compared, the cycles)."""
+	return EmulatorScript(path, program).run()
+
+def main(args):
+	program, paths = None, []
+	while args:
+		arg = args.pop(0)
+		if arg == '-p':
+			program = args.pop(0)
+		else:
+			paths.append(arg)
+	passed = True
+	for path in paths:
+		try:
+			rows, cycles = run_script(path, program)
+			print('%s: %d rows compared successfully (%d cycles)'
+				  %(path, rows, cycles))
+		except (ScriptError, CommandError, IOError) as e:
+			print(e)
+			passed = False
+	return passed
+
+if __name__ == '__main__':
+	sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -0,0 +1,138 @@
+"""The Heatmap module provides class RAMHeatmap to count the reads and the
+writes of each RAM address while an Emulator runs a program, and to report
+them by the regions of the Hack memory:
+
+  * the registers SP, LCL, ARG, THIS and THAT (RAM[0]-RAM[4])
+  * temp (RAM[5]-RAM[12]) and the general registers R13-R15
+  * statics (RAM[16]-RAM[255])
+  * stack (RAM[256]-RAM[2047])
+  * heap (RAM[2048]-RAM[16383])
+  * screen (RAM[16384]-RAM[24575]) and keyboard (RAM[24576])
+
+The function of heatmap in this file would be as follow:
+
+>>> emu = Emulator().load('pong/Pong.hack')
+>>> emu.heatmap = RAMHeatmap()
+>>> emu.run(10000000)
+>>> emu.heatmap.report()
+>>> emu.heatmap.save_image('pong.png')
+
+The emulator logs the accessed addresses into packed arrays, which are
+counted into the NumPy arrays reads and writes with bincount between chunks
+of the run. The accesses out of the RAM (the last one, which makes the
+emulator fault) are counted apart, in outside_reads and outside_writes.
+
+Run this file with a program and an image path as arguments (pong/Pong.hack
+and PongHeatmap.png in the temporary directory by default) to report the
+accesses of 10M cycles of the program and save their image.
+"""
+
+import os
+import sys
+import tempfile
+from array import array
+import numpy as np
+from Emulator import RAM_SIZE, SCREEN, KBD
+from png_writer import write_png, RGB
+
+REGIONS = (('SP',       0,      1),
+		   ('LCL',      1,      2),
+		   ('ARG',      2,      3),
+		   ('THIS',     3,      4),
+		   ('THAT',     4,      5),
+		   ('temp',     5,      13),
+		   ('R13-R15',  13,     16),
+		   ('static',   16,     256),
+		   ('stack',    256,    2048),
+		   ('heap',     2048,   SCREEN),
+		   ('screen',   SCREEN, KBD),
+		   ('keyboard', KBD,    KBD + 1))
+
+class RAMHeatmap:
+	"""
+	Count the reads and the writes of each RAM address in the NumPy arrays
+	reads and writes. chunk is the number of steps between two countings of
+	the logs.
+	"""
+	def __init__(self, chunk=1 << 20):
+		self.chunk = chunk
+		self.reads = np.zeros(RAM_SIZE, dtype=np.int64)
+		self.writes = np.zeros(RAM_SIZE, dtype=np.int64)
+		self.outside_reads = self.outside_writes = 0
+		self.read_log = array('H')
+		self.write_log = array('H')
+
+	def flush(self):
+		"""Count the logged addresses."""
+		for log, counts, outside in ((self.read_log, self.reads,
+									  'outside_reads'),
+									 (self.write_log, self.writes,
+									  'outside_writes')):
+			if log:
+				addresses = np.frombuffer(log, dtype=np.uint16)
+				inside = addresses[addresses < RAM_SIZE]
+				counts += np.bincount(inside, minlength=RAM_SIZE)
+				setattr(self, outside, getattr(self, outside) +
+						len(addresses) - len(inside))
+				del addresses, inside   # the buffer of log is released
+				del log[:]
+
+	def clear(self):
+		self.flush()
+		self.reads[:] = 0
+		self.writes[:] = 0
+		self.outside_reads = self.outside_writes = 0
+
+	def regions(self):
+		"""A list of (name, reads, writes) for each region."""
+		self.flush()
+		return [(name, int(self.reads[lo:hi].sum()),
+				 int(self.writes[lo:hi].sum())) for name, lo, hi in REGIONS]
+
+	def report(self, stream=None):
+		stream = stream or sys.stdout
+		rows = self.regions()
+		total = sum(r + w for _, r, w in rows) or 1
+		stream.write('%-10s %12s %12s %7s\n' %('region', 'reads', 'writes',
+												'share'))
+		for name, reads, writes in rows:
+			stream.write('%-10s %12d %12d %6.1f%%\n'
+						 %(name, reads, writes, 100.0 * (reads + writes) / total))
+		if self.outside_reads or self.outside_writes:
+			stream.write('%-10s %12d %12d\n' %('outside', self.outside_reads,
+												self.outside_writes))
+
+	def save_image(self, path, kind='total', width=128, zoom=4):
+		"""Save the counts of kind ('reads', 'writes' or 'total') of the
+		addresses up to the keyboard as a PNG image, width addresses in each
+		row, each of them a zoom x zoom square. The colors go from black
+		through red and yellow to white, on a logarithmic scale."""
+		self.flush()
+		counts = (self.reads if kind == 'reads' else
+				  self.writes if kind == 'writes' else self.reads + self.writes)
+		counts = counts[:KBD + 1]
+		height = -(-len(counts) // width)
+		grid = np.zeros(width * height, dtype=np.float64)
+		grid[:len(counts)] = np.log1p(counts)
+		if grid.max() > 0:
+			grid /= grid.max()
+		heat = grid.reshape(height, width) * 3
+		pixels = np.stack([np.clip(heat, 0, 1), np.clip(heat - 1, 0, 1),
+						   np.clip(heat - 2, 0, 1)], axis=-1)
+		pixels = (pixels * 255).astype(np.uint8)
+		pixels = pixels.repeat(zoom, axis=0).repeat(zoom, axis=1)
+		write_png(path, width * zoom, height * zoom,
+				  [row.tobytes() for row in pixels], color_type=RGB)
+
+if __name__ == '__main__':
+	from Emulator import Emulator
+	program = sys.argv[1] if len(sys.argv) > 1 else 'pong/Pong.hack'
+	image = (sys.argv[2] if len(sys.argv) > 2 else
+			 os.path.join(tempfile.gettempdir(), os.path.splitext(
+				 os.path.basename(program))[0] + 'Heatmap.png'))
+	emu = Emulator().load(program)
+	emu.heatmap = RAMHeatmap()
+	emu.run(10000000)
+	emu.heatmap.report()
+	emu.heatmap.save_image(image)
+	print('saved %s' %image)
@@ -0,0 +1,228 @@
+"""The Hooks module provides class Hook to run a routine natively in Python
+in place of its compiled code, when the pc of an Emulator reaches the label
+of the routine, and native versions of the hot routines of the Jack OS in
+project 12 (Math and Memory).
+
+A hooked routine reads its arguments from the ARG segment, and returns to
+the caller as the return sequence of the VM translator (project 08) does:
+the return value goes to *ARG, SP = ARG+1, THAT, THIS, ARG and LCL are
+restored from the frame, R13 = FRAME and R14 = the return address.
+
+The function of hooks in this file would be as follow:
+
+>>> emu = Emulator().load('MathTest.asm')
+>>> install_hooks(emu)                   # the routines of OS_ROUTINES
+10
+>>> emu.run(100000)
+
+The native routines follow the Jack code of 12/OSImplementation step by
+step, with 16-bit arithmetic and the comparisons of the VM translator (the
+sign of the 16-bit difference), so that they give the same results, and
+leave the heap in the same state.
+"""
+
+from Emulator import EmulatorError
+
+R_SP, R_LCL, R_ARG, R_THIS, R_THAT, R_FRAME, R_RET = 0, 1, 2, 3, 4, 13, 14
+
+def word(value):
+	"""value as an unsigned 16-bit word"""
+	return value & 0xFFFF
+
+def signed(value):
+	"""value as a signed 16-bit integer"""
+	value &= 0xFFFF
+	return value - 0x10000 if value & 0x8000 else value
+
+def lt(a, b):
+	return signed(a - b) < 0
+
+def gt(a, b):
+	return signed(a - b) > 0
+
+class Hook:
+	"""
+	A routine with num_args arguments, run by function(emulator, *args)
+	with the arguments as 16-bit words. The result is the return value.
+	"""
+	def __init__(self, name, function, num_args):
+		self.name = name
+		self.function = function
+		self.num_args = num_args
+		self.calls = 0
+
+	def call(self, emulator):
+		"""Run the routine when the pc reaches its label (just after the
+		call, so LCL is the frame) and return the return address."""
+		ram = emulator.ram
+		frame, arg = ram[R_LCL], ram[R_ARG]
+		args = [ram[arg + k] for k in range(self.num_args)]
+		value = self.function(emulator, *args)
+		ret = ram[frame - 5]
+		ram[arg] = word(value or 0)
+		ram[R_SP] = arg + 1
+		ram[R_THAT] = ram[frame - 1]
+		ram[R_THIS] = ram[frame - 2]
+		ram[R_ARG] = ram[frame - 3]
+		ram[R_LCL] = ram[frame - 4]
+		ram[R_FRAME], ram[R_RET] = frame, ret
+		self.calls += 1
+		return ret
+
+########
+# Math #
+########
+
+def math_multiply(emu, x, y):
+	return x * y
+
+def math_divide(emu, x, y):
+	if y == 0:
+		raise EmulatorError("Math.divide: division by zero")
+	return _divide(signed(x), signed(y))
+
+def _divide(x, y):
+	neg_x, neg_y = x < 0, y < 0
+	x, y = signed(abs(x)), signed(abs(y))
+	if y == 0:
+		# as y + y overflows, the Jack code would recurse until the stack
+		# runs over the heap (x = -32768)
+		raise EmulatorError("Math.divide: no result for x = %d" %x)
+	if gt(y, x):
+		return 0
+	q = _divide(x, signed(y + y))
+	temp = signed(q + q)
+	res = temp if lt(x - temp * y, y) else signed(temp + 1)
+	return res if neg_x == neg_y else signed(-res)
+
+def math_sqrt(emu, x):
+	x, y = signed(x), 0
+	for j in range(7, -1, -1):
+		approx = y + (1 << j)
+		square = signed(approx * approx)
+		if not gt(square, x) and gt(square, 0):
+			y = approx
+	return y
+
+def math_abs(emu, x):
+	return -signed(x) if lt(x, 0) else x
+
+def math_max(emu, a, b):
+	return a if gt(a, b) else b
+
+def math_min(emu, a, b):
+	return a if lt(a, b) else b
+
+##########
+# Memory #
+##########
+
+# the static variables of Memory (in order of declaration) and the layout of
+# its blocks
+MEMORY_FREE_LIST = 'Memory.1'
+NO_BLOCK, FL_LENGTH, FL_NEXT, ALLOC_SIZE = 16384, 0, 1, -1
+
+def memory_peek(emu, address):
+	return emu.ram[address]
+
+def memory_poke(emu, address, value):
+	emu.ram[address] = value
+
+def memory_alloc(emu, size):
+	ram, free_list = emu.ram, emu.symbols[MEMORY_FREE_LIST]
+	size = signed(size)
+	prev_block = _best_fit(ram, ram[free_list], size)
+	if prev_block == NO_BLOCK:
+		found_block = 0
+	elif prev_block == 0:
+		found_block = ram[free_list]
+		ram[free_list] = _do_alloc(ram, found_block, size)
+	else:
+		found_block = ram[prev_block + FL_NEXT]
+		ram[prev_block + FL_NEXT] = _do_alloc(ram, found_block, size)
+	return found_block + 1
+
+def _best_fit(ram, cur_block, size):
+	best_block, best_size, prev_block = NO_BLOCK, 16384 - 2048, 0
+	while cur_block != 0:
+		cur_size = signed(ram[cur_block + FL_LENGTH] - 1)
+		if not lt(cur_size, size) and lt(cur_size, best_size):
+			best_block, best_size = prev_block, cur_size
+		prev_block, cur_block = cur_block, ram[cur_block + FL_NEXT]
+	return best_block
+
+def _do_alloc(ram, found_block, size):
+	if gt(ram[found_block + FL_LENGTH], size + 1 + 2):
+		next_block = word(found_block + size + 1)
+		ram[next_block + FL_NEXT] = ram[found_block + FL_NEXT]
+		ram[next_block + FL_LENGTH] = word(ram[found_block + FL_LENGTH] -
+										   (next_block - found_block))
+		ram[found_block + 1 + ALLOC_SIZE] = word(size + 1)
+	else:
+		next_block = ram[found_block + FL_NEXT]
+		ram[found_block + 1 + ALLOC_SIZE] = ram[found_block + FL_LENGTH]
+	return next_block
+
+def memory_dealloc(emu, obj):
+	ram, free_list = emu.ram, emu.symbols[MEMORY_FREE_LIST]
+	alloc_size = ram[obj + ALLOC_SIZE]
+	obj = obj - 1
+	prev_block = _find_prev_free(ram, ram[free_list], obj)
+	if prev_block == 0:
+		ram[obj + FL_LENGTH] = alloc_size
+		ram[obj + FL_NEXT] = ram[free_list]
+		ram[free_list] = obj
+		prev_block = obj
+	elif word(prev_block + ram[prev_block + FL_LENGTH]) == obj:
+		ram[prev_block + FL_LENGTH] = word(ram[prev_block + FL_LENGTH] +
+										   alloc_size)
+	else:
+		ram[obj + FL_LENGTH] = alloc_size
+		ram[obj + FL_NEXT] = ram[prev_block + FL_NEXT]
+		ram[prev_block + FL_NEXT] = obj
+		prev_block = obj
+	next_block = ram[prev_block + FL_NEXT]
+	if word(prev_block + ram[prev_block + FL_LENGTH]) == next_block:
+		ram[prev_block + FL_LENGTH] = word(ram[prev_block + FL_LENGTH] +
+										   ram[next_block + FL_LENGTH])
+		ram[prev_block + FL_NEXT] = ram[next_block + FL_NEXT]
+
+def _find_prev_free(ram, block, obj):
+	if gt(block, obj):
+		return 0
+	while ram[block + FL_NEXT] != 0 and lt(ram[block + FL_NEXT], obj):
+		block = ram[block + FL_NEXT]
+	return block
+
+# name: (function, number of arguments)
+OS_ROUTINES = {
+	'Math.multiply':  (math_multiply, 2),
+	'Math.divide':    (math_divide, 2),
+	'Math.sqrt':      (math_sqrt, 1),
+	'Math.abs':       (math_abs, 1),
+	'Math.max':       (math_max, 2),
+	'Math.min':       (math_min, 2),
+	'Memory.peek':    (memory_peek, 1),
+	'Memory.poke':    (memory_poke, 2),
+	'Memory.alloc':   (memory_alloc, 1),
+	'Memory.deAlloc': (memory_dealloc, 1),
+}
+
+def install_hooks(emulator, routines=OS_ROUTINES):
+	"""Hook the routines (name: (function, num_args)) whose labels are in
+	the program of emulator, and return the number of hooks installed.
+	Raise EmulatorError if there is none, so that the routines are not
+	emulated unnoticed (a .hack program has no labels)."""
+	count = 0
+	for name, (function, num_args) in routines.items():
+		if name in emulator.labels:
+			emulator.hooks[emulator.labels[name]] = Hook(name, function,
+														 num_args)
+			count += 1
+	if not count:
+		raise EmulatorError(
+			"No routine to hook: the program has no labels (load its asm)"
+			if not emulator.labels else
+			"No routine to hook: none of %s is in the program"
+			%', '.join(sorted(routines)))
+	return count
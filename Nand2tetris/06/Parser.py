@@ -138,7 +138,7 @@ class Parser(object):
 
 	@property
 	def dest(self):
-		assert self.command_type == 'C_COMMAND'
+		assert self.command_type == 'c_command'
 		if '=' in self.current and self.current != '=':
 			if self.current[0] not in Code.DEST_CODES:
 				self._trackback("Unknown destination.")
@@ -147,7 +147,7 @@ class Parser(object):
 
 	@property
 	def comp(self):
-		assert self.command_type == 'C_COMMAND'
+		assert self.command_type == 'c_command'
 		if '=' in self.current:
 			comp = self.current[self.current.index('=')+1]
 		else:
@@ -158,7 +158,7 @@ class Parser(object):
 
 	@property
 	def jump(self):
-		assert self.command_type == 'C_COMMAND'
+		assert self.command_type == 'c_command'
 		if ';' in self.current and self.current[-1] != ';':
 			if self.current[-1] not in Code.JUMP_CODES:
 				self._trackback("Jump directive expected")
@@ -0,0 +1,158 @@
+"""The Renderer module provides class ScreenRenderer to draw the screen of an
+Emulator while its program is running, and the sinks for the frames:
+
+  * TerminalSink (block characters, redrawn in place)
+  * PNGSink (one PNG file for each frame)
+
+The renderer never touches the CPU loop. It samples the screen memory map at
+a fixed frame rate from a thread, or from a process which attaches to the
+shared memory of the RAM (Emulator(shared=True)), and it only draws the
+frames that changed:
+
+>>> emu = Emulator(shared=True).load('pong/Pong.hack')
+>>> with ScreenRenderer(emu, TerminalSink(), fps=20, mode='process'):
+... 	emu.run(30000000)
+
+"""
+
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from Emulator import SCREEN, SCREEN_SIZE
+from png_writer import write_png
+
+SCREEN_WIDTH  = 512
+SCREEN_HEIGHT = 256
+ROW_BYTES     = SCREEN_WIDTH // 8
+
+# a frame is the screen memory map as bytes of little-endian words, so the
+# pixels of each byte go from the least significant bit to the most one.
+_BYTE_PIXELS = tuple(''.join('1' if b >> i & 1 else '0' for i in range(8))
+					 for b in range(256))
+# PNG packs the leftmost pixel into the most significant bit, and 0 is black
+_PNG_BYTE = bytes(int(format(b, '08b')[::-1], 2) ^ 0xFF for b in range(256))
+_HALF_BLOCKS = {('0', '0'): ' ', ('1', '0'): '▀',
+				('0', '1'): '▄', ('1', '1'): '█'}
+
+def frame_rows(frame):
+	"""The rows of a frame as strings of '0' and '1', one for each pixel."""
+	return [''.join([_BYTE_PIXELS[b] for b in frame[k:k + ROW_BYTES]])
+			for k in range(0, len(frame), ROW_BYTES)]
+
+class TerminalSink:
+	"""Draw frames with block characters, each of them holds two rows of
+	pixels. The screen is sampled with one pixel out of every scale."""
+	def __init__(self, scale=4, stream=None):
+		self.scale = scale
+		self.stream = stream
+
+	def draw(self, frame):
+		rows = [row[::self.scale] for row in frame_rows(frame)[::self.scale]]
+		if len(rows) % 2:
+			rows.append('0' * len(rows[0]))
+		lines = [''.join(_HALF_BLOCKS[pair] for pair in zip(top, bottom))
+				 for top, bottom in zip(rows[::2], rows[1::2])]
+		stream = self.stream or sys.stdout
+		stream.write('\x1b[H' + '\n'.join(lines) + '\n')
+		stream.flush()
+
+class PNGSink:
+	"""Write each frame into directory as prefix00000.png, prefix00001.png,
+	..."""
+	def __init__(self, directory, prefix='frame'):
+		self.directory = directory
+		self.prefix = prefix
+		self.count = 0
+
+	def draw(self, frame):
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+		name = '%s%05d.png' %(self.prefix, self.count)
+		pixels = frame.translate(_PNG_BYTE)
+		rows = [pixels[k:k + ROW_BYTES]
+				for k in range(0, len(pixels), ROW_BYTES)]
+		write_png(os.path.join(self.directory, name),
+				  SCREEN_WIDTH, SCREEN_HEIGHT, rows, bit_depth=1)
+		self.count += 1
+
+def _render_loop(read_frame, sink, period, stop):
+	"""Draw the changed frames until stop is set, one sample every period
+	seconds. The last frame is drawn once more when stopping."""
+	last = None
+	deadline = time.monotonic()
+	while True:
+		stopping = stop.is_set()
+		frame = read_frame()
+		if frame != last:
+			sink.draw(frame)
+			last = frame
+		if stopping:
+			break
+		deadline += period
+		stop.wait(max(0.0, deadline - time.monotonic()))
+
+def _render_process(shm_name, sink, period, stop):
+	shm = shared_memory.SharedMemory(name=shm_name)
+	try:
+		screen = shm.buf[SCREEN * 2:(SCREEN + SCREEN_SIZE) * 2]
+		_render_loop(screen.tobytes, sink, period, stop)
+		screen.release()
+	finally:
+		shm.close()
+
+class ScreenRenderer:
+	"""
+	Sample the screen of emulator fps times a second and draw the changed
+	frames into sink, from a thread (mode='thread') or from a process
+	(mode='process', which needs the RAM in shared memory). Use it as a
+	context manager, or call start and stop.
+	"""
+	def __init__(self, emulator, sink, fps=30, mode='thread'):
+		if mode not in ('thread', 'process'):
+			raise ValueError("Unknown mode: " + str(mode))
+		if mode == 'process' and emulator.shm_name is None:
+			raise ValueError("Process mode needs Emulator(shared=True).")
+		self.emulator = emulator
+		self.sink = sink
+		self.period = 1.0 / fps
+		self.mode = mode
+		self._worker = None
+		self._stop = None
+
+	def start(self):
+		if self.mode == 'thread':
+			self._stop = threading.Event()
+			self._worker = threading.Thread(
+				target=_render_loop, daemon=True,
+				args=(self.emulator.screen, self.sink, self.period,
+					  self._stop))
+		else:
+			self._stop = multiprocessing.Event()
+			self._worker = multiprocessing.Process(
+				target=_render_process, daemon=True,
+				args=(self.emulator.shm_name, self.sink, self.period,
+					  self._stop))
+		self._worker.start()
+		return self
+
+	def stop(self):
+		if self._worker is not None:
+			self._stop.set()
+			self._worker.join()
+			self._worker = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.stop()
+
+if __name__ == '__main__':
+	from Emulator import Emulator
+	with Emulator(shared=True) as emu:
+		emu.load('pong/Pong.hack')
+		with ScreenRenderer(emu, TerminalSink(), fps=20, mode='process'):
+			emu.run(30000000)
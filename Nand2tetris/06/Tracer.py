@@ -0,0 +1,95 @@
+"""The Tracer module provides class TraceRecorder to record the last steps
+of a program run by an Emulator: the pc and the RAM write (if any) of each
+step, in a ring buffer. The buffer is dumped on demand, or when the
+emulator detects a fault:
+
+  * an access to RAM out of range (above the keyboard)
+  * a pc running out of the program
+  * an SP underflow (SP below stack_base, if given)
+
+The function of tracer in this file would be as follow:
+
+>>> emu = Emulator().load('FibonacciElement.asm')
+>>> emu.tracer = TraceRecorder(256, stack_base=256, dump_path='trace.txt')
+>>> emu.run(6000)              # dump into trace.txt if the program faults
+>>> emu.tracer.dump(emulator=emu)
+
+With a tracer alone, the emulator runs a loop of its own, which costs about
+45% more than the loop without instruments: Pong runs 2M steps in 0.55s
+against 0.38s (the loop with the hooks or the heatmap costs 90% more).
+"""
+
+import sys
+from Emulator import disassemble
+
+class TraceRecorder:
+	"""
+	Keep the last size steps (size is rounded up to a power of two) in the
+	ring pcs: the pc of a step, or (pc, address, value) for a step writing
+	the RAM. A step costs one store, and a write one more.
+	"""
+	def __init__(self, size=4096, stack_base=None, dump_path=None):
+		capacity = 1
+		while capacity < size:
+			capacity <<= 1
+		self.size = capacity
+		self.mask = capacity - 1
+		self.pcs = [0] * capacity
+		self.count = 0                  # steps recorded since the start
+		self.stack_base = stack_base
+		self.dump_path = dump_path
+		self.fault = None
+
+	def __len__(self):
+		return min(self.count, self.size)
+
+	def clear(self):
+		self.count = 0
+		self.fault = None
+
+	def entries(self):
+		"""Iterate (step, pc, address, value) from the oldest step, where
+		address and value are None for a step without RAM write."""
+		for step in range(self.count - len(self), self.count):
+			entry = self.pcs[step & self.mask]
+			if isinstance(entry, tuple):
+				yield (step,) + entry
+			else:
+				yield step, entry, None, None
+
+	def on_fault(self, emulator, message):
+		"""Called by the emulator before it raises EmulatorFault."""
+		self.fault = message
+		if self.dump_path is not None:
+			with open(self.dump_path, 'w') as file:
+				self.dump(file, emulator)
+
+	def dump(self, stream=None, emulator=None):
+		"""Write the recorded steps into stream (stdout by default), with
+		the instructions and the nearest labels if emulator is given."""
+		stream = stream or sys.stdout
+		labels = []
+		if emulator is not None:
+			labels = sorted((addr, name)
+							for name, addr in emulator.labels.items())
+		if self.fault:
+			stream.write('fault: %s\n' %self.fault)
+		for step, pc, address, value in self.entries():
+			line = '%10d  %5d' %(step, pc)
+			if emulator is not None:
+				line += '  %-16s %-12s' %(_label_of(labels, pc),
+										   disassemble(emulator.rom[pc]))
+			if address is not None:
+				line += '  RAM[%s] = %s' %(address, value)
+			stream.write(line.rstrip() + '\n')
+
+def _label_of(labels, pc):
+	"""The nearest label at or before pc in the sorted (address, name)."""
+	lo, hi = 0, len(labels)
+	while lo < hi:
+		mid = (lo + hi) // 2
+		if labels[mid][0] <= pc:
+			lo = mid + 1
+		else:
+			hi = mid
+	return labels[lo - 1][1] if lo else ''
@@ -0,0 +1,27 @@
+"""The png_writer module provides write_png function for writing images in
+PNG format with nothing but zlib, so that frames of the screen and other
+images can be saved without any imaging library.
+"""
+
+import struct
+import zlib
+
+GRAYSCALE = 0
+RGB       = 2
+
+def _chunk(tag, data):
+	body = tag + data
+	return (struct.pack('>I', len(data)) + body +
+			struct.pack('>I', zlib.crc32(body) & 0xFFFFFFFF))
+
+def write_png(path, width, height, rows, bit_depth=8, color_type=GRAYSCALE):
+	"""Write an image into path. rows is an iterable of bytes, one for each
+	row of pixels, already packed according to bit_depth and color_type."""
+	raw = b''.join(b'\x00' + bytes(row) for row in rows)
+	header = struct.pack('>IIBBBBB', width, height, bit_depth, color_type,
+						 0, 0, 0)
+	with open(path, 'wb') as file:
+		file.write(b'\x89PNG\r\n\x1a\n')
+		file.write(_chunk(b'IHDR', header))
+		file.write(_chunk(b'IDAT', zlib.compress(raw, 6)))
+		file.write(_chunk(b'IEND', b''))
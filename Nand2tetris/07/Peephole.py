@@ -0,0 +1,156 @@
+"""The Peephole module provides optimize function to rewrite the instruction
+records of a CodeWriter (see CodeWriter.format_instruction) into shorter
+ones, by replacing the adjacent sequences below until none is left:
+
+  * push then pop: the value is already in D when the pop would read it, so
+    the store to the stack and the reload are dropped (push constant 7, pop
+    temp 2 is @7 D=A @R7 M=D)
+  * push then add, sub, and, or, eq, gt, lt and if-goto: likewise, with
+    A=SP left for the operation (push constant 7, add is @7 D=A @SP A=M-1
+    M=D+M)
+  * SP++ then SP-- (push then pop of local, argument, this or that)
+  * A=M D=A, A=D+A D=A and A=M A=A-1 when A is not read afterwards:
+    D=M, D=D+A and A=M-1
+
+A sequence is replaced only when there is no label inside it, so no jump
+can reach it halfway. The word above the stack is not kept: nothing reads it
+before it is pushed again.
+
+Run this file with directories of vm programs as arguments (those of this
+project by default) to translate them with and without the optimization and
+compare the number of instructions, and to run their test scripts on the
+optimized asm with the emulator of project 06.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from vm_definitions import *
+
+def _c(dest, comp, jump=''):
+    return (I_C, dest, comp, jump)
+
+_SP = (I_A, 'SP')
+_PUSH_D = [_SP, _c('A', 'M'), _c('M', 'D'), _SP, _c('M', 'M+1')]
+_POP_D = [_SP, _c('AM', 'M-1'), _c('D', 'M')]
+
+# (sequence, replacement, whether the next instruction must set A)
+RULES = [
+    (_PUSH_D + _POP_D, [], True),
+    (_PUSH_D + _POP_D, [_SP, _c('A', 'M')], False),
+    ([_SP, _c('M', 'M+1'), _SP, _c('M', 'M-1')], [], True),
+    ([_c('A', 'M'), _c('D', 'A')], [_c('D', 'M')], True),
+    ([_c('A', 'D+A'), _c('D', 'A')], [_c('D', 'D+A')], True),
+    ([_c('A', 'M'), _c('A', 'A-1')], [_c('A', 'M-1')], False),
+]
+
+def _match(instructions, k):
+    """The rule matching the instructions at k, or None."""
+    for rule in RULES:
+        sequence, _, set_a = rule
+        end = k + len(sequence)
+        if instructions[k:end] == sequence and (
+                not set_a or
+                end < len(instructions) and instructions[end][0] == I_A):
+            return rule
+    return None
+
+def optimize(instructions):
+    """A list of instruction records doing what instructions do, with the
+    sequences of RULES replaced."""
+    changed = True
+    while changed:
+        changed = False
+        result, k = [], 0
+        while k < len(instructions):
+            rule = _match(instructions, k)
+            if rule is None:
+                result.append(instructions[k])
+                k += 1
+            else:
+                result.extend(rule[1])
+                k += len(rule[0])
+                changed = True
+        instructions = result
+    return instructions
+
+#######################
+# report of the gains #
+#######################
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EMULATOR_SCRIPT = os.path.join(HERE, '..', '06', 'EmulatorScript.py')
+
+def count_instructions(path):
+    """The number of A and C instructions of the asm file path."""
+    with open(path) as f:
+        lines = [line.split('//')[0].strip() for line in f]
+    return sum(1 for line in lines if line and not line.startswith('('))
+
+def find_programs(directories):
+    """The directories of vm programs (those with a test script) in
+    directories, or under them."""
+    programs = []
+    for directory in directories:
+        names = sorted(os.listdir(directory))
+        if any(name.endswith('.vm') for name in names):
+            programs.append(directory)
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path) and os.path.exists(
+                    os.path.join(path, name + '.tst')):
+                programs.append(path)
+    return programs
+
+def run_test(script, program):
+    """Whether the test script passes on the asm file program."""
+    done = subprocess.run([sys.executable, EMULATOR_SCRIPT, '-p', program,
+                           os.path.abspath(script)],
+                          cwd=os.path.dirname(EMULATOR_SCRIPT),
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return done.returncode == 0
+
+def compare(programs, stream=None):
+    """Translate the programs with and without optimize, and report the
+    numbers of instructions and the results of their test scripts on the
+    optimized asm."""
+    from vm_translator import translate
+    stream = stream or sys.stdout
+    stream.write('%-18s %7s %7s %7s  %s\n'
+                 %('program', 'before', 'after', 'saved', 'test'))
+    total_before = total_after = 0
+    passed = True
+    temp = tempfile.mkdtemp()
+    try:
+        for program in programs:
+            name = os.path.basename(os.path.normpath(program))
+            counts = []
+            for optimized in (False, True):
+                out_path = os.path.join(temp, '%s.%d.asm' %(name, optimized))
+                translate(program, optimize=optimized, out_path=out_path)
+                counts.append(count_instructions(out_path))
+            script = os.path.join(program, name + '.tst')
+            result = ('-' if not os.path.exists(script) else
+                      'ok' if run_test(script, out_path) else 'FAILED')
+            passed = passed and result != 'FAILED'
+            before, after = counts
+            stream.write('%-18s %7d %7d %6.1f%%  %s\n'
+                         %(name, before, after,
+                           100.0 * (before - after) / before, result))
+            total_before += before
+            total_after += after
+    finally:
+        shutil.rmtree(temp)
+    stream.write('%-18s %7d %7d %6.1f%%\n'
+                 %('total', total_before, total_after,
+                   100.0 * (total_before - total_after) / max(total_before, 1)))
+    return passed
+
+if __name__ == '__main__':
+    directories = sys.argv[1:] or [
+        os.path.join(HERE, name) for name in sorted(os.listdir(HERE))
+        if os.path.isdir(os.path.join(HERE, name)) and name[0].isupper()]
+    sys.exit(0 if compare(find_programs(directories)) else 1)
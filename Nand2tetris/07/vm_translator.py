@@ -27,13 +27,16 @@ def retrive_files(path):
                 has_sys_init = True
     return has_sys_init, filepaths, outpath
 
-def translate(path):
+def translate(path, optimize=False, out_path=None, shared=False):
     """translate vm language in a vm file or files in the path to asm language
     in other files.
         path: dirpath or filepath
+        optimize: whether to rewrite the asm by Peephole.optimize
+        out_path: the asm file, instead of the one beside the vm files
+        shared: whether to call and return by the routines $CALL and $RETURN
     """
     has_sys_init, filepaths, outpath = retrive_files(path)
-    writer = CodeWriter(outpath)
+    writer = CodeWriter(out_path or outpath, optimize, shared)
     if has_sys_init:
         writer.write_sys_init()
     for filepath in filepaths:
@@ -0,0 +1,101 @@
+"""The CallRoutines module reports what the shared call and return routines
+of the CodeWriter (shared=True) save and cost: the instructions of each vm
+program translated with the frames inlined at each call and return, and with
+the routines $CALL and $RETURN, and the instructions run by a call and a
+return both ways. The frame code has no jump, so the instructions run are
+the cycles of the CPU; a shared call runs the instructions of its call site
+and those of $CALL, a shared return the jump to $RETURN and those of it.
+
+Run this file with directories of vm programs as arguments (those of this
+project and Pong of project 11 by default); the test scripts of the programs
+run on the asm with the routines, on the emulator of project 06.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from CodeWriter import CodeWriter
+from Peephole import HERE, count_instructions, find_programs, run_test
+from vm_definitions import *
+from vm_translator import translate
+
+def _count(instructions):
+    return sum(1 for record in instructions if record[0] != I_L)
+
+def path_lengths():
+    """{'call': (inlined, shared), 'return': (inlined, shared)}: the number
+    of instructions run by a call and by a return."""
+    inlined = CodeWriter(os.devnull)
+    shared = CodeWriter(os.devnull, shared=True)
+    lengths = {}
+    for name, write in (('call', lambda w: w.write_call('f', '2')),
+                        ('return', lambda w: w.write_return())):
+        for writer in (inlined, shared):
+            del writer.instructions[:]
+            write(writer)
+        site = _count(shared.instructions)
+        del shared.instructions[:]
+        shared.write_routines()
+        lengths[name] = (_count(inlined.instructions),
+                         site + _count(shared.instructions))
+    for writer in (inlined, shared):
+        del writer.instructions[:]
+        writer.close()
+    return lengths
+
+def count_commands(program, names):
+    """The number of vm commands of program (a directory) named in
+    names."""
+    count = 0
+    for name in os.listdir(program):
+        if name.endswith('.vm'):
+            with open(os.path.join(program, name)) as f:
+                for line in f:
+                    words = line.split('//')[0].split()
+                    count += bool(words) and words[0] in names
+    return count
+
+def compare(programs, stream=None):
+    """Translate the programs with the frames inlined and with the routines,
+    and report the instructions saved, the cycles added by call and the
+    results of their test scripts on the asm with the routines."""
+    stream = stream or sys.stdout
+    stream.write('%-18s %6s %7s %7s %7s %7s  %s\n'
+                 %('program', 'calls', 'returns', 'inlined', 'shared',
+                   'saved', 'test'))
+    passed = True
+    temp = tempfile.mkdtemp()
+    try:
+        for program in programs:
+            name = os.path.basename(os.path.normpath(program))
+            counts = []
+            for shared in (False, True):
+                out_path = os.path.join(temp, '%s.%d.asm' %(name, shared))
+                translate(program, out_path=out_path, shared=shared)
+                counts.append(count_instructions(out_path))
+            script = os.path.join(program, name + '.tst')
+            result = ('-' if not os.path.exists(script) else
+                      'ok' if run_test(script, out_path) else 'FAILED')
+            passed = passed and result != 'FAILED'
+            before, after = counts
+            stream.write('%-18s %6d %7d %7d %7d %6.1f%%  %s\n'
+                         %(name, count_commands(program, ('call',)),
+                           count_commands(program, ('return',)), before,
+                           after, 100.0 * (before - after) / before, result))
+    finally:
+        shutil.rmtree(temp)
+    lengths = path_lengths()
+    for name in ('call', 'return'):
+        inlined, shared = lengths[name]
+        stream.write('a %s runs %d instructions inlined, %d shared '
+                     '(%+d cycles)\n' %(name, inlined, shared,
+                                        shared - inlined))
+    return passed
+
+if __name__ == '__main__':
+    directories = sys.argv[1:] or [
+        os.path.join(HERE, name) for name in sorted(os.listdir(HERE))
+        if os.path.isdir(os.path.join(HERE, name)) and name[0].isupper()] + [
+        os.path.join(HERE, '..', '11', 'Pong')]
+    sys.exit(0 if compare(find_programs(directories)) else 1)
@@ -5,14 +5,45 @@
     write_return (Project 08)
 
 for translating vm command into asm language and write it into a new file.
+
+The instructions are kept as records in the list instructions until close,
+which writes them all at once:
+
+    ('A', 'SP')                     @SP
+    ('C', 'AM', 'M-1', '')          AM=M-1
+    ('L', 'END_1')                  (END_1)
+
+so that, if optimize is given, Peephole.optimize rewrites them before.
+
+If shared is given, the frames of calls and returns are pushed and popped by
+two routines written once at the end, $CALL and $RETURN, rather than at each
+call (47 instructions) and each return (61): a call loads the address of
+the function in R13, its number of arguments in R14 and the return address
+in D, and jumps to $CALL (12 instructions); a return jumps to $RETURN (2).
 """
 
 import os
 from vm_definitions import *
+from Peephole import optimize as peephole
+
+def format_instruction(record):
+    """The line of asm of an instruction record."""
+    kind = record[0]
+    if kind == I_A:
+        return '@%s\n' %record[1]
+    if kind == I_L:
+        return '(%s)\n' %record[1]
+    _, dest, comp, jump = record
+    return ((dest + '=' if dest else '') + comp +
+            (';' + jump if jump else '') + '\n')
 
 class CodeWriter:
-    def __init__(self, out_path):
+    def __init__(self, out_path, optimize=False, shared=False):
         self._file = open(out_path, 'w')
+        self.instructions = []
+        self.optimize = optimize
+        self.shared = shared
+        self._routines = set()
         self._vm_name = None
         self._next_end_label = 0
         self._next_ret_label = 0
@@ -55,18 +86,51 @@ class CodeWriter:
 
     def write_call(self, func_name, num_args):
         return_label = self._new_ret_label()
-        self.write_push(S_CONST, return_label)      # push return address
-        self._save_pointer(R_LCL)                   # push LCL
-        self._save_pointer(R_ARG)                   # push ARG
-        self._save_pointer(R_THIS)                  # push THIS
-        self._save_pointer(R_THAT)                  # push THAT
-        self._reg_transfer('ARG', 'SP', offset=-int(num_args)-5)
+        if self.shared:
+            self._assign(func_name, 'D', 'A')       # D = &f
+            self._assign(R_TARGET, 'M', 'D')        # TARGET = &f
+            self._assign(num_args, 'D', 'A')        # D = n
+            self._assign(R_NARGS, 'M', 'D')         # NARGS = n
+            self._assign(return_label, 'D', 'A')    # D = return address
+            self._goto_routine(CALL_ROUTINE)        # goto $CALL
+        else:
+            self.write_push(S_CONST, return_label)  # push return address
+            self._save_frame()                      # push LCL, ARG, THIS, THAT
+            self._reg_transfer('ARG', 'SP', offset=-int(num_args)-5)
                                                     # ARG = SP-n-5
-        self._reg_transfer('LCL', 'SP')             # LCL = SP
-        self.write_goto(func_name)                  # goto f
+            self._reg_transfer('LCL', 'SP')         # LCL = SP
+            self.write_goto(func_name)              # goto f
         self.write_l_command(return_label)          # (return_label)
 
     def write_return(self):
+        if self.shared:
+            self._goto_routine(RETURN_ROUTINE)      # goto $RETURN
+        else:
+            self._write_return()
+
+    def write_routines(self):
+        """$CALL and $RETURN, if they are used and not written yet."""
+        if CALL_ROUTINE in self._routines:
+            self.write_l_command(CALL_ROUTINE)
+            self._push_to_stack('D')                # push return address
+            self._save_frame()                      # push LCL, ARG, THIS, THAT
+            self._assign(R_NARGS, 'D', 'M')         # D = n
+            self._assign(5, 'D', 'D+A')             # D = n+5
+            self._assign('SP', 'D', 'M-D')          # D = SP-n-5
+            self._assign('ARG', 'M', 'D')           # ARG = SP-n-5
+            self._reg_transfer('LCL', 'SP')         # LCL = SP
+            self._assign(R_TARGET, 'A', 'M')        # A = TARGET
+            self.write_c_command('0', jump='JMP')   # goto f
+        if RETURN_ROUTINE in self._routines:
+            self.write_l_command(RETURN_ROUTINE)
+            self._write_return()
+        self._routines = set()
+
+    def _goto_routine(self, routine):
+        self._routines.add(routine)
+        self._jump(routine, '0', 'JMP')             # A=&routine, 0;JMP
+
+    def _write_return(self):
         self._reg_transfer(R_FRAME, 'LCL')          # FRAME = LCL
         self._restore_pointer(R_RET, -5)            # RET = *(FRAME-5)
         self.write_pop(S_ARG, '0')                  # *ARG = return value
@@ -84,28 +148,25 @@ class CodeWriter:
             self.write_push(S_CONST, '0')
 
     def close(self):
+        self.write_routines()
+        if self.optimize:
+            self.instructions = peephole(self.instructions)
+        self._file.writelines(map(format_instruction, self.instructions))
         self._file.close()
 
     ##################################
     # Code write function for output #
     ##################################
 
-    def write(self, text):
-        self._file.write(text)
-
     def write_a_command(self, addr_or_sym):
         """addr_or_sym: int or string"""
-        self.write("@%s\n" %addr_or_sym)
+        self.instructions.append((I_A, addr_or_sym))
 
     def write_l_command(self, symbol):
-        self.write("(%s)\n" %symbol)
+        self.instructions.append((I_L, symbol))
 
     def write_c_command(self, comp, dest='', jump=''):
-        if dest:
-            dest = dest + '='
-        if jump:
-            jump = ';' + jump
-        self.write(dest + comp + jump + '\n')
+        self.instructions.append((I_C, dest, comp, jump))
 
     def _assign(self, addr_or_sym, dest, comp):
         self.write_a_command(addr_or_sym)           # A = &addr_or_sym
@@ -234,6 +295,12 @@ class CodeWriter:
         self._load_reg_val(fr, dest='D', offset=offset) # D = fr+offset
         self._assign(to, 'M', 'D')                      # to = D
 
+    def _save_frame(self):
+        self._save_pointer(R_LCL)                       # push LCL
+        self._save_pointer(R_ARG)                       # push ARG
+        self._save_pointer(R_THIS)                      # push THIS
+        self._save_pointer(R_THAT)                      # push THAT
+
     def _save_pointer(self, address):
         self._assign(address, 'D', 'M')                 # D = *address
         self._push_to_stack('D')                        # *SP = D, SP++
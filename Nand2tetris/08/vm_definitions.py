@@ -42,6 +42,17 @@ R_R13 = R_FRAME = 13
 R_R14 = R_RET   = 14
 R_R15 = R_COPY  = 15
 
+# Registers and labels of the shared call and return routines (CodeWriter)
+R_TARGET       = R_R13      # the address of the function called
+R_NARGS        = R_R14      # its number of arguments
+CALL_ROUTINE   = '$CALL'
+RETURN_ROUTINE = '$RETURN'
+
+# Instruction records of the CodeWriter
+I_A          = 'A'          # ('A', address or symbol)
+I_C          = 'C'          # ('C', dest, comp, jump)
+I_L          = 'L'          # ('L', label)
+
 # mappings
 ARITH_INST   = ('add', 'sub', 'neg', 'eq' , 'gt', 'lt', 'and', 'or', 'not')
 STACK_INST   = {'pop': C_POP, 'push': C_PUSH}
@@ -0,0 +1,351 @@
+"""The Analyzer module reports the size and the speed of the chips: the number
+of Nand gates (and DFFs), and the depth, the length in Nands of the longest
+combinational path, from an input pin or a DFF to an output pin or a DFF.
+
+The chips are analyzed from their HDL without flattening them: a chip is
+analyzed once, and summed up by its ChipTiming, which has the delay matrix
+of the chip (the longest path from each input bit to each output bit) and
+the delays from and to its DFFs; the timing of a chip is computed from those
+of its parts. So the whole computer (which has millions of gates) is
+analyzed in a few tens of milliseconds.
+
+>>> analyzer = Analyzer(ChipLibrary('../05'))
+>>> timing = analyzer.timing('CPU')
+>>> timing.nands, timing.dffs, timing.depth
+(2631, 48, 121)
+>>> for step in analyzer.critical_path('CPU'):
+...     print(step)
+ARegister_0 (Register) DFF -> out[1] 2
+Mux16_1 (Mux16) a[1] -> out[1] 6
+ALU_0 (ALU) y[1] -> zr 97
+...
+PC_0 (PC) load -> DFF 121
+
+The builtin memory maps (ROM32K, Screen, Keyboard) have no gates nor
+delay: their outputs depend on their address and on their state.
+
+Run this file with names of chips (Add16, Inc16, ALU, CPU and Computer by
+default) to report them and their parts; -d N shows the critical path N
+levels of parts deep (1 by default, 0 for none, -1 down to the Nands).
+With -l DIR, the chips are compared with those built from the chips of
+DIR, such as the carry-lookahead adders of ../02/lookahead:
+
+                          projects           lookahead
+    chip            nands    depth      nands    depth
+    Add16             293       64        337       14
+    Inc16             132       37        151       11
+    ALU              1221       92        789       36
+    CPU              2631      121       2218       65
+"""
+
+import os
+import sys
+import time
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import *
+from HDLTokenizer import HDLError
+
+STATE = -1                              # the DFFs, as source or target
+
+class ChipTiming:
+    """
+    The timing of a chip. input_bits and output_bits are lists of (pin,
+    bit); delays[o] is the dict {source: delay} of output bit o, where a
+    source is an input bit or STATE, and to_state the dict {source: delay}
+    of the paths to the DFFs. steps records the last part of the paths, to
+    find them back.
+    """
+    def __init__(self, chip, nands=0, dffs=0, blocks=0):
+        self.name = chip.name
+        self.chip = chip
+        self.nands = nands
+        self.dffs = dffs
+        self.blocks = blocks
+        self.input_bits = [(pin, k) for pin, width in chip.inputs
+                           for k in range(width)]
+        self.output_bits = [(pin, k) for pin, width in chip.outputs
+                            for k in range(width)]
+        self.delays = [{} for _ in self.output_bits]
+        self.to_state = {}
+        self.parts = []                 # (instance, ChipTiming)
+        self.steps = {}
+
+    @property
+    def depth(self):
+        return max([0] + [d for delays in self.delays + [self.to_state]
+                          for d in delays.values()])
+
+    def critical(self):
+        """(source, target, delay) of the longest path; target is an output
+        bit or STATE."""
+        best = (STATE, STATE, -1)
+        for target, delays in enumerate(self.delays + [self.to_state]):
+            if target == len(self.delays):
+                target = STATE
+            for source, delay in delays.items():
+                if delay > best[2]:
+                    best = (source, target, delay)
+        return best
+
+    def input_name(self, source):
+        return 'DFF' if source == STATE else bit_name(self.chip,
+                                                      self.input_bits[source])
+
+    def output_name(self, target):
+        return 'DFF' if target == STATE else bit_name(self.chip,
+                                                      self.output_bits[target])
+
+    def __repr__(self):
+        return 'ChipTiming(%r, nands=%d, dffs=%d, depth=%d)' %(
+            self.name, self.nands, self.dffs, self.depth)
+
+def bit_name(chip, bit):
+    pin, k = bit
+    return pin if chip.widths[pin] == 1 else '%s[%d]' %(pin, k)
+
+class Step:
+    """A part on a path: the instance path of the part, its chip, the pins
+    (or DFF) where the path enters and leaves it, and the delay from the
+    start of the path to its exit."""
+    def __init__(self, path, chip_name, source, target, delay):
+        self.path = path
+        self.chip_name = chip_name
+        self.source = source
+        self.target = target
+        self.delay = delay
+
+    def __str__(self):
+        return '%s (%s) %s -> %s %d' %(self.path, self.chip_name, self.source,
+                                       self.target, self.delay)
+
+class Analyzer:
+    """Compute the ChipTimings of the chips of library, once for each."""
+    def __init__(self, library):
+        self.library = library
+        self._timings = {}
+
+    def timing(self, name):
+        chip = self.library.chip(name)  # ARegister is a Register
+        if chip.name not in self._timings:
+            if chip.builtin is not None:
+                self._timings[chip.name] = self._builtin(chip)
+            else:
+                self._timings[chip.name] = _ChipAnalysis(self, chip).analyze()
+        return self._timings[chip.name]
+
+    def _builtin(self, chip):
+        if chip.builtin == 'Nand':
+            timing = ChipTiming(chip, nands=1)
+            timing.delays[0] = {0: 1, 1: 1}
+        elif chip.builtin == 'DFF':
+            timing = ChipTiming(chip, dffs=1)
+            timing.delays[0] = {STATE: 0}
+            timing.to_state = {0: 0}
+        else:
+            # a memory map: the outputs depend on the address at once
+            timing = ChipTiming(chip, blocks=1)
+            combinational = {k: 0 for k, (pin, _)
+                             in enumerate(timing.input_bits)
+                             if pin not in chip.clocked}
+            timing.delays = [dict(combinational) for _ in timing.output_bits]
+            for delays in timing.delays:
+                delays[STATE] = 0
+            timing.to_state = {k: 0 for k in range(len(timing.input_bits))}
+        return timing
+
+    def critical_path(self, name, depth=1):
+        """The Steps of the critical path of chip name, through the parts
+        depth levels deep (all of them if depth is negative)."""
+        timing = self.timing(name)
+        source, target, _ = timing.critical()
+        return self._expand(timing, source, target, depth, '', 0)
+
+    def _expand(self, timing, source, target, depth, prefix, start):
+        steps = []
+        for instance, part, s, t in self._path(timing, source, target):
+            path = prefix + instance
+            delays = part.delays[t] if t != STATE else part.to_state
+            end = start + delays[s]
+            if depth != 1 and part.parts:
+                steps.extend(self._expand(part, s, t, depth - 1, path + '/',
+                                          start))
+            else:
+                steps.append(Step(path, part.name, part.input_name(s),
+                                  part.output_name(t), end))
+            start = end
+        return steps
+
+    def _path(self, timing, source, target):
+        """The list of (instance, part timing, part source, part target) of
+        the longest path of timing from source to target."""
+        path = []
+        node = ('out', target) if target != STATE else ('state', None)
+        while node is not None:
+            k, s, t, node = timing.steps[node, source]
+            instance, part = timing.parts[k]
+            path.append((instance, part, s, t))
+        path.reverse()
+        return path
+
+class _ChipAnalysis:
+    """Compute the ChipTiming of one chip, from the timings of its parts."""
+    def __init__(self, analyzer, chip):
+        self.analyzer = analyzer
+        self.chip = chip
+        self.timing = ChipTiming(chip)
+        self.inputs = {bit: k for k, bit in
+                       enumerate(self.timing.input_bits)}
+        self.part_inputs = []           # [(pin, bit) of the part: net]
+        self.drivers = {}               # net: (part, output bit)
+        self.arrivals = {}              # (part, output bit): {source: delay}
+        self._visiting = set()
+
+    def connect(self, k, part, child):
+        """Record the nets of the pins of part k, a child: its input bits
+        read them, its output bits drive them."""
+        inputs = {}
+        first_out = {}                  # the index of bit 0 of each output
+        for i, (pin, _) in enumerate(self.timing.parts[k][1].output_bits):
+            first_out.setdefault(pin, i)
+        for c in part.connections:
+            if c.pin not in child.widths:
+                raise HDLError("%s, line %d: %s has no pin %s"
+                               %(self.chip.filename, part.line,
+                                 part.chip_name, c.pin))
+            lo, hi = ((0, child.widths[c.pin] - 1) if c.pin_lo is None else
+                      (c.pin_lo, c.pin_hi))
+            wire_lo = c.wire_lo or 0
+            for j in range(hi - lo + 1):
+                net = (None if is_constant(c.wire) else
+                       (c.wire, wire_lo + j))
+                if child.is_output(c.pin):
+                    if net is not None:
+                        self.drivers[net] = (k, first_out[c.pin] + lo + j)
+                else:
+                    inputs[c.pin, lo + j] = net
+        self.part_inputs.append(inputs)
+
+    def analyze(self):
+        timing, analyzer = self.timing, self.analyzer
+        counts = {}
+        for k, part in enumerate(self.chip.parts):
+            n = counts.get(part.chip_name, 0)
+            counts[part.chip_name] = n + 1
+            child = analyzer.timing(part.chip_name)
+            timing.parts.append(('%s_%d' %(part.chip_name, n), child))
+            timing.nands += child.nands
+            timing.dffs += child.dffs
+            timing.blocks += child.blocks
+            self.connect(k, part, child.chip)
+        for o, bit in enumerate(timing.output_bits):
+            driver = self.drivers.get(bit)
+            if driver is not None:
+                timing.delays[o] = dict(self.arrival(driver))
+                for source in timing.delays[o]:
+                    timing.steps[('out', o), source] = \
+                        timing.steps[('part',) + driver, source]
+        for k, (_, child) in enumerate(timing.parts):
+            for s, delay in child.to_state.items():
+                self.reach(('state', None), k, s, STATE, delay,
+                           timing.to_state)
+        return timing
+
+    def reach(self, node, k, s, t, delay, result):
+        """Extend result, the delays of node, with the paths through part k
+        from its source s (to its target t, delay)."""
+        steps = self.timing.steps
+        if s == STATE:
+            candidates = {STATE: (0, None)}
+        else:
+            net = self.part_inputs[k].get(self.timing.parts[k][1]
+                                          .input_bits[s])
+            if net in self.inputs:
+                candidates = {self.inputs[net]: (0, None)}
+            elif net in self.drivers:
+                driver = self.drivers[net]
+                candidates = {source: (d, ('part',) + driver)
+                              for source, d in self.arrival(driver).items()}
+            else:
+                candidates = {}         # a constant
+        for source, (d, previous) in candidates.items():
+            if d + delay > result.get(source, -1):
+                result[source] = d + delay
+                steps[node, source] = (k, s, t, previous)
+
+    def arrival(self, driver):
+        """{source: delay} of the output bit o of part k, driver = (k, o)."""
+        if driver in self.arrivals:
+            return self.arrivals[driver]
+        if driver in self._visiting:
+            k, o = driver
+            instance, child = self.timing.parts[k]
+            raise HDLError("%s: combinational loop through %s.%s"
+                           %(self.chip.name, instance, child.output_name(o)))
+        self._visiting.add(driver)
+        k, o = driver
+        result = {}
+        for s, delay in self.timing.parts[k][1].delays[o].items():
+            self.reach(('part',) + driver, k, s, o, delay, result)
+        self._visiting.discard(driver)
+        self.arrivals[driver] = result
+        return result
+
+def report(names, library=None, depth=1, stream=None):
+    """Report the timings of chips names, of their parts and their
+    critical paths."""
+    stream = stream or sys.stdout
+    library = library or ChipLibrary()
+    analyzer = Analyzer(library)
+    for name in names:
+        start = time.time()
+        timing = analyzer.timing(name)
+        elapsed = time.time() - start
+        source, target, delay = timing.critical()
+        stream.write('%s: %d nands, %d dffs, depth %d (from %s to %s), '
+                     'analyzed in %.3fs\n'
+                     %(name, timing.nands, timing.dffs, delay,
+                       timing.input_name(source), timing.output_name(target),
+                       elapsed))
+        stream.write('    %-20s %-12s %9s %6s %6s\n'
+                     %('part', 'chip', 'nands', 'dffs', 'depth'))
+        for instance, part in timing.parts:
+            stream.write('    %-20s %-12s %9d %6d %6d\n'
+                         %(instance, part.name, part.nands, part.dffs,
+                           part.depth))
+        if depth != 0 and delay > 0:
+            stream.write('    critical path:\n')
+            for step in analyzer.critical_path(name, depth):
+                stream.write('        %s\n' %step)
+        stream.write('\n')
+
+def compare(names, directory, stream=None):
+    """Report the nands and the depths of chips names, built from the
+    chips of the projects and from those of directory."""
+    stream = stream or sys.stdout
+    analyzers = [Analyzer(ChipLibrary()),
+                 Analyzer(ChipLibrary(directory, (directory,) + PROJECT_DIRS))]
+    stream.write('%-12s %17s %19s\n'
+                 %('', 'projects', os.path.basename(directory)))
+    stream.write('%-12s %8s %8s %10s %8s\n'
+                 %('chip', 'nands', 'depth', 'nands', 'depth'))
+    for name in names:
+        before, after = [a.timing(name) for a in analyzers]
+        stream.write('%-12s %8d %8d %10d %8d\n'
+                     %(name, before.nands, before.depth, after.nands,
+                       after.depth))
+
+if __name__ == '__main__':
+    args, depth, directory = sys.argv[1:], 1, None
+    if '-d' in args:
+        k = args.index('-d')
+        depth = int(args[k + 1])
+        del args[k:k + 2]
+    if '-l' in args:
+        k = args.index('-l')
+        directory = os.path.abspath(args[k + 1])
+        del args[k:k + 2]
+    names = args or ['Add16', 'Inc16', 'ALU', 'CPU', 'Computer']
+    if directory:
+        compare(names, directory)
+    else:
+        report(names, depth=depth)
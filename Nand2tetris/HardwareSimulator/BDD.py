@@ -0,0 +1,389 @@
+"""The BDD module proves two combinational chips equivalent, or finds an input
+vector on which they differ, with reduced ordered binary decision diagrams.
+Exhaustive simulation stops at about 2**30 vectors (see Verifier), the ALU
+has 2**38; the BDDs of its outputs have some thousands of nodes.
+
+A node of class BDD is an int: 0 is false, 1 is true, and node u tests the
+variable var[u], going to low[u] if it is 0, to high[u] if it is 1. The
+nodes are unique (a unique table maps each (var, low, high) to its node), so
+two functions are equal if and only if their nodes are equal; the results
+of apply are memoized.
+
+A chip is a list of nodes, one by net, computed gate by gate over its
+netlist; a reference function (see reference) is called on Words, the
+symbolic ints of the BDD, whose bits are nodes. The variables are the input
+bits, the one bit pins first, then the bits of the buses interleaved from
+bit 0 (x[0], y[0], x[1], y[1], ...), which keeps the BDDs of the adders
+small.
+
+>>> library = ChipLibrary('../02')
+>>> check(flatten(library, 'ALU'), reference.ALU)
+(True, None)
+>>> lookahead = ChipLibrary('../02/lookahead')
+>>> check(flatten(lookahead, 'ALU'), flatten(library, 'ALU'))
+(True, None)
+
+Run this file to check every chip of 01 and 02 which has a reference; with
+-l DIR, the chips of DIR are checked against those of the projects instead,
+such as ../02/lookahead. The names of chips as arguments check only them.
+"""
+
+import os
+import sys
+import time
+import reference
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import PROJECT_DIRS, NET_TRUE
+from HDLTokenizer import HDLError
+from Netlist import flatten
+from Verifier import Mismatch
+
+FALSE = 0
+TRUE = 1
+TERMINAL = 1 << 30                      # the var of the terminals
+
+class BDD:
+    """
+    The nodes of the BDDs over num_vars variables, 0 being the first tested.
+    """
+    def __init__(self, num_vars):
+        self.num_vars = num_vars
+        self.var = [TERMINAL, TERMINAL]
+        self.low = [FALSE, TRUE]
+        self.high = [FALSE, TRUE]
+        self._unique = {}
+        self._and = {}
+        self._xor = {}
+        self._not = {}
+
+    def __len__(self):
+        return len(self.var)
+
+    def node(self, var, low, high):
+        """The node testing var; low if low is high."""
+        if low == high:
+            return low
+        key = (var, low, high)
+        u = self._unique.get(key)
+        if u is None:
+            u = self._unique[key] = len(self.var)
+            self.var.append(var)
+            self.low.append(low)
+            self.high.append(high)
+        return u
+
+    def variable(self, var):
+        return self.node(var, FALSE, TRUE)
+
+    def _cofactors(self, u, var):
+        if self.var[u] == var:
+            return self.low[u], self.high[u]
+        return u, u
+
+    def apply_and(self, u, v):
+        if u == FALSE or v == FALSE:
+            return FALSE
+        if u == TRUE or u == v:
+            return v
+        if v == TRUE:
+            return u
+        if u > v:
+            u, v = v, u
+        key = (u, v)
+        w = self._and.get(key)
+        if w is None:
+            var = min(self.var[u], self.var[v])
+            u0, u1 = self._cofactors(u, var)
+            v0, v1 = self._cofactors(v, var)
+            w = self._and[key] = self.node(var, self.apply_and(u0, v0),
+                                           self.apply_and(u1, v1))
+        return w
+
+    def apply_xor(self, u, v):
+        if u == v:
+            return FALSE
+        if u == FALSE:
+            return v
+        if v == FALSE:
+            return u
+        if u == TRUE:
+            return self.apply_not(v)
+        if v == TRUE:
+            return self.apply_not(u)
+        if u > v:
+            u, v = v, u
+        key = (u, v)
+        w = self._xor.get(key)
+        if w is None:
+            var = min(self.var[u], self.var[v])
+            u0, u1 = self._cofactors(u, var)
+            v0, v1 = self._cofactors(v, var)
+            w = self._xor[key] = self.node(var, self.apply_xor(u0, v0),
+                                           self.apply_xor(u1, v1))
+        return w
+
+    def apply_not(self, u):
+        if u <= TRUE:
+            return u ^ 1
+        w = self._not.get(u)
+        if w is None:
+            w = self.node(self.var[u], self.apply_not(self.low[u]),
+                          self.apply_not(self.high[u]))
+            self._not[u] = w
+            self._not[w] = u
+        return w
+
+    def apply_or(self, u, v):
+        return self.apply_not(self.apply_and(self.apply_not(u),
+                                             self.apply_not(v)))
+
+    def apply_nand(self, u, v):
+        return self.apply_not(self.apply_and(u, v))
+
+    def majority(self, u, v, w):
+        return self.apply_or(self.apply_and(u, v),
+                             self.apply_and(w, self.apply_or(u, v)))
+
+    def satisfy(self, u):
+        """{var: bit} of a path of u to true (u is not false)."""
+        values = {}
+        while u > TRUE:
+            if self.low[u] != FALSE:
+                values[self.var[u]] = 0
+                u = self.low[u]
+            else:
+                values[self.var[u]] = 1
+                u = self.high[u]
+        return values
+
+    def evaluate(self, u, values):
+        """The bit of u for the variables values ({var: bit}, 0 if
+        missing)."""
+        while u > TRUE:
+            u = self.high[u] if values.get(self.var[u]) else self.low[u]
+        return u
+
+    def size(self, roots):
+        """The number of the nodes reachable from roots."""
+        seen, stack = set(), [u for u in roots if u > TRUE]
+        while stack:
+            u = stack.pop()
+            if u not in seen:
+                seen.add(u)
+                stack.extend(w for w in (self.low[u], self.high[u])
+                             if w > TRUE)
+        return len(seen)
+
+class Word:
+    """
+    A symbolic int of bdd in two's complement: bits are the nodes of its
+    bits from bit 0, sign the node of all the bits above them. Words have
+    the operators used by the reference functions: &, |, ^, ~, +, -, and
+    >> and << by ints; the ints mixed with them are converted to Words.
+    """
+    def __init__(self, bdd, bits, sign=FALSE):
+        self.bdd = bdd
+        self.bits = list(bits)
+        self.sign = sign
+
+    @staticmethod
+    def constant(bdd, value):
+        bits = []
+        while value not in (0, -1):
+            bits.append(value & 1)
+            value >>= 1
+        return Word(bdd, bits, TRUE if value else FALSE)
+
+    def _word(self, other):
+        if isinstance(other, Word):
+            return other
+        return Word.constant(self.bdd, other)
+
+    def bit(self, k):
+        return self.bits[k] if k < len(self.bits) else self.sign
+
+    def _bitwise(self, other, op):
+        other = self._word(other)
+        width = max(len(self.bits), len(other.bits))
+        return Word(self.bdd, [op(self.bit(k), other.bit(k))
+                               for k in range(width)],
+                    op(self.sign, other.sign))
+
+    def __and__(self, other):
+        return self._bitwise(other, self.bdd.apply_and)
+
+    def __or__(self, other):
+        return self._bitwise(other, self.bdd.apply_or)
+
+    def __xor__(self, other):
+        return self._bitwise(other, self.bdd.apply_xor)
+
+    __rand__, __ror__, __rxor__ = __and__, __or__, __xor__
+
+    def __invert__(self):
+        bdd = self.bdd
+        return Word(bdd, [bdd.apply_not(b) for b in self.bits],
+                    bdd.apply_not(self.sign))
+
+    def _add(self, other, carry):
+        bdd = self.bdd
+        width = max(len(self.bits), len(other.bits))
+        bits = []
+        for k in range(width + 1):
+            a, b = self.bit(k), other.bit(k)
+            bits.append(bdd.apply_xor(bdd.apply_xor(a, b), carry))
+            carry = bdd.majority(a, b, carry)
+        # the bits above width are those of the adder of the signs
+        sign = bdd.apply_xor(bdd.apply_xor(self.sign, other.sign), carry)
+        return Word(bdd, bits, sign)
+
+    def __add__(self, other):
+        return self._add(self._word(other), FALSE)
+
+    def __sub__(self, other):
+        return self._add(~self._word(other), TRUE)
+
+    def __radd__(self, other):
+        return self._word(other) + self
+
+    def __rsub__(self, other):
+        return self._word(other) - self
+
+    def __neg__(self):
+        return Word(self.bdd, []) - self
+
+    def __rshift__(self, k):
+        return Word(self.bdd, self.bits[k:], self.sign)
+
+    def __lshift__(self, k):
+        return Word(self.bdd, [FALSE] * k + self.bits, self.sign)
+
+    def value(self, values, width):
+        """The int of the width low bits for the variables values."""
+        return sum(self.bdd.evaluate(self.bit(k), values) << k
+                   for k in range(width))
+
+def variables(inputs):
+    """{pin: [var of each bit]} of the IN pins inputs ([(pin, width)]):
+    the one bit pins first, then the bits of the buses interleaved."""
+    order = [(0, k, pin) for k, (pin, width) in enumerate(inputs)
+             if width == 1]
+    order += [(1 + bit, k, pin) for k, (pin, width) in enumerate(inputs)
+              if width > 1 for bit in range(width)]
+    numbers = {}
+    for var, (_, _, pin) in enumerate(sorted(order)):
+        numbers.setdefault(pin, []).append(var)
+    return numbers
+
+def netlist_outputs(bdd, netlist, numbers):
+    """{pin: Word} of the OUT pins of netlist (combinational), numbers the
+    variables of its IN pins."""
+    if netlist.num_dffs or netlist.blocks:
+        raise HDLError("%s is not combinational" %netlist.name)
+    if netlist.level_starts is None:
+        netlist.levelize()
+    nodes = [FALSE] * netlist.num_nets
+    nodes[NET_TRUE] = TRUE
+    for pin, nets in netlist.inputs:
+        for net, var in zip(nets, numbers[pin]):
+            nodes[net] = bdd.variable(var)
+    nand = bdd.apply_nand
+    for a, b, out in zip(netlist.gate_a, netlist.gate_b, netlist.gate_out):
+        nodes[out] = nand(nodes[a], nodes[b])
+    return {pin: Word(bdd, [nodes[net] for net in nets])
+            for pin, nets in netlist.outputs}
+
+def function_outputs(bdd, function, numbers):
+    """{pin: Word} of the reference function called on the Words of the
+    variables numbers."""
+    inputs = {pin: Word(bdd, [bdd.variable(var) for var in vars_])
+              for pin, vars_ in numbers.items()}
+    return {pin: value if isinstance(value, Word) else
+            Word.constant(bdd, value)
+            for pin, value in reference.call(function, inputs).items()}
+
+def check(netlist, other, stats=None):
+    """Prove netlist equivalent to other, another netlist with the same pins
+    or a reference function. Return (True, None), or (False, Mismatch) of
+    an input vector on which they differ, other giving the expected
+    values. stats (a dict) gets the variables and the nodes."""
+    inputs = [(pin, len(nets)) for pin, nets in netlist.inputs]
+    outputs = [(pin, len(nets)) for pin, nets in netlist.outputs]
+    if callable(other):
+        bdd = BDD(sum(width for _, width in inputs))
+        numbers = variables(inputs)
+        expected = function_outputs(bdd, other, numbers)
+    else:
+        if ([(pin, len(nets)) for pin, nets in other.inputs] != inputs or
+                sorted((pin, len(nets)) for pin, nets in other.outputs) !=
+                sorted(outputs)):
+            raise HDLError("%s and %s have different pins"
+                           %(netlist.name, other.name))
+        bdd = BDD(sum(width for _, width in inputs))
+        numbers = variables(inputs)
+        expected = netlist_outputs(bdd, other, numbers)
+    got = netlist_outputs(bdd, netlist, numbers)
+    if stats is not None:
+        stats['variables'] = bdd.num_vars
+        stats['nodes'] = bdd.size([u for pin, width in outputs
+                                   for word in (got[pin], expected[pin])
+                                   for u in word.bits[:width]])
+    for pin, width in outputs:
+        for k in range(width):
+            differ = bdd.apply_xor(got[pin].bit(k), expected[pin].bit(k))
+            if differ != FALSE:
+                values = bdd.satisfy(differ)
+                vector = {p: sum(values.get(var, 0) << j
+                                 for j, var in enumerate(numbers[p]))
+                          for p, _ in inputs}
+                return False, Mismatch(
+                    vector,
+                    {p: expected[p].value(values, w) for p, w in outputs},
+                    {p: got[p].value(values, w) for p, w in outputs})
+    return True, None
+
+def check_projects(names=None, directory=None, stream=None):
+    """Check the chips names (all those of 01 and 02 with a reference if
+    None) against their reference, or against the chips of the projects if
+    directory is given; return True if all of them are equivalent."""
+    stream = stream or sys.stdout
+    projects = ChipLibrary(None, PROJECT_DIRS)
+    if directory:
+        library = ChipLibrary(directory, PROJECT_DIRS)
+        names = names or sorted(f[:-4] for f in os.listdir(directory)
+                                if f.endswith('.hdl') and
+                                projects.find(f[:-4]))
+    else:
+        library = projects
+        names = names or sorted(f[:-4] for d in PROJECT_DIRS[:2]
+                                for f in os.listdir(d)
+                                if f.endswith('.hdl') and
+                                f[:-4] in reference.CHIPS)
+    stream.write('%-12s %-10s %5s %7s %8s  %s\n'
+                 %('chip', 'against', 'vars', 'nodes', 'time', 'result'))
+    passed = True
+    for name in names:
+        start = time.time()
+        stats = {}
+        if directory:
+            against, other = 'projects', flatten(projects, name)
+        else:
+            against, other = 'reference', reference.CHIPS[name]
+        netlist = flatten(library, name)
+        if netlist.num_dffs or netlist.blocks:
+            continue
+        equal, mismatch = check(netlist, other, stats)
+        passed = passed and equal
+        stream.write('%-12s %-10s %5d %7d %7.2fs  %s\n'
+                     %(name, against, stats['variables'], stats['nodes'],
+                       time.time() - start,
+                       'equivalent' if equal else mismatch))
+    return passed
+
+if __name__ == '__main__':
+    args, directory = sys.argv[1:], None
+    if '-l' in args:
+        k = args.index('-l')
+        directory = os.path.abspath(args[k + 1])
+        del args[k:k + 2]
+    sys.exit(0 if check_projects(args, directory) else 1)
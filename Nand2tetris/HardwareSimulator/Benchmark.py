@@ -0,0 +1,129 @@
+"""The Benchmark module measures the simulators on the programs of the
+computer, Add.hack, Max.hack and Rect.hack of project 05. The CPU is
+simulated from its HDL down to the gates (its registers and PC too), the
+memories by their models (Models.MEMORY_MODELS). For each program and each
+simulator:
+
+  * the test script (ComputerAdd.tst, ...) is run, which compares the
+    registers and the RAM with its compare file
+  * the program is run alone for some cycles, from inputs in the RAM which
+    make it work longer (Rect draws 256 rows), and the RAM or the screen is
+    checked at the end, against what the cycles run can do (Rect draws a
+    row every 13 cycles, so 1000 cycles draw 76 of them)
+
+    program  simulator            script  rows   cycles   cycles/s  result
+    Add      Simulator            ok        15     4000       1500  ok
+    ...
+    Rect     CompiledSimulator    ok        65     4000       6700  ok
+    Rect     compiled, words      ok        65     4000       8000  ok
+
+>>> benchmark(['Rect'], cycles=1000)
+
+Run this file with names of programs (Add, Max and Rect by default); -c
+CYCLES sets the number of cycles of each run (4000 by default).
+"""
+
+import os
+import sys
+import time
+import Models
+from ChipLibrary import ChipLibrary
+from Compiler import CompiledSimulator, compile_chip
+from EventSimulator import EventSimulator
+from HDLDefinitions import PROJECT_DIRS
+from HDLTokenizer import HDLError
+from Netlist import flatten
+from Optimizer import optimize
+from Simulator import Simulator
+from TestScript import TestScript
+
+DIRECTORY = PROJECT_DIRS[-1]            # 05
+REGISTERS = ('ARegister', 'DRegister', 'PC')  # shown by the scripts
+
+RECT_ROW_CYCLES = 13                    # the cycles of a row of Rect.asm
+
+def _rect_drawn(sim, cycles):
+    rows = min(256, cycles // RECT_ROW_CYCLES)
+    return all(sim.peek('Screen', 32 * row) == 0xFFFF for row in range(rows))
+
+# program: (the inputs in the RAM, a check of the state after the cycles run)
+PROGRAMS = {
+    'Add':  ({}, lambda sim, cycles: sim.peek('RAM16K', 0) == 5),
+    'Max':  ({0: 23456, 1: 12345},
+             lambda sim, cycles: sim.peek('RAM16K', 2) == 23456),
+    'Rect': ({0: 256}, _rect_drawn),
+}
+
+def simulators(library, models=Models.MEMORY_MODELS):
+    """[(label, simulator)] of the computer, one of each kind; the last one
+    simulates the bus parts of the CPU on words (Models.WORD_MODELS)."""
+    words = dict(models, **Models.WORD_MODELS)
+    netlist = flatten(library, 'Computer', Models.blocks(models))
+    keep = sorted(path + '.out' for path, name in netlist.instances.items()
+                  if name in REGISTERS)
+    return [('Simulator', Simulator(netlist, models=models)),
+            ('optimized Simulator', Simulator(optimize(netlist, keep),
+                                              models=models)),
+            ('EventSimulator', EventSimulator(netlist, models=models)),
+            ('CompiledSimulator', CompiledSimulator(
+                compile_chip(library, 'Computer', models, keep=keep),
+                models=models)),
+            ('compiled, words', CompiledSimulator(
+                compile_chip(library, 'Computer', words, keep=keep),
+                models=words))]
+
+def run_script(program, sim):
+    """Run the test script of program on sim; return the rows compared."""
+    def backend(library, name):
+        sim.reset()
+        return sim
+    path = os.path.join(DIRECTORY, 'Computer%s.tst' %program)
+    return TestScript(path, backend).run()
+
+def run_program(program, sim, cycles):
+    """Run program on sim for cycles; return (elapsed, passed)."""
+    ram, check = PROGRAMS[program]
+    sim.reset()
+    sim.load('ROM32K', os.path.join(DIRECTORY, program + '.hack'))
+    for address, value in ram.items():
+        sim.poke('RAM16K', address, value)
+    start = time.time()
+    for _ in range(cycles):
+        sim.tick()
+        sim.tock()
+    return time.time() - start, check(sim, cycles)
+
+def benchmark(programs=sorted(PROGRAMS), cycles=4000, stream=None):
+    """Report the test scripts and the cycles per second of each simulator
+    running programs; return True if all of them pass."""
+    stream = stream or sys.stdout
+    library = ChipLibrary(DIRECTORY)
+    start = time.time()
+    sims = simulators(library)
+    stream.write('built the simulators in %.2fs\n' %(time.time() - start))
+    stream.write('%-8s %-20s %-7s %5s %8s %10s  %s\n'
+                 %('program', 'simulator', 'script', 'rows', 'cycles',
+                   'cycles/s', 'result'))
+    passed = True
+    for program in programs:
+        for label, sim in sims:
+            try:
+                rows = run_script(program, sim)
+            except HDLError as e:
+                passed = False
+                stream.write('%-8s %-20s FAILED: %s\n' %(program, label, e))
+                continue
+            elapsed, ok = run_program(program, sim, cycles)
+            passed = passed and ok
+            stream.write('%-8s %-20s %-7s %5d %8d %10d  %s\n'
+                         %(program, label, 'ok', rows, cycles,
+                           cycles / elapsed, 'ok' if ok else 'FAILED'))
+    return passed
+
+if __name__ == '__main__':
+    args, cycles = sys.argv[1:], 4000
+    if '-c' in args:
+        k = args.index('-c')
+        cycles = int(args[k + 1])
+        del args[k:k + 2]
+    sys.exit(0 if benchmark(args or sorted(PROGRAMS), cycles) else 1)
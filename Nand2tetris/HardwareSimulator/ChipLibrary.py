@@ -0,0 +1,93 @@
+"""The ChipLibrary module provides class ChipLibrary to find the chips used as
+parts by name, in the directory of the chip under test and then in the
+directories of the projects (01, 02, 03/a, 03/b, 04, 05), as the hardware
+simulator of the course does. The builtin chips (Nand, DFF and the memory
+maps) and the aliases of Register (ARegister, DRegister) need no HDL file.
+
+>>> library = ChipLibrary('../05')
+>>> library.chip('ALU')                   # parsed from ../02/ALU.hdl
+Chip('ALU')
+>>> library.dependencies('CPU')
+{'ALU', 'Add16', 'And', ...}
+
+"""
+
+import os
+import hashlib
+from HDLDefinitions import *
+from HDLParser import parse_chip, parse_file
+from HDLTokenizer import HDLError
+
+class ChipLibrary:
+    """
+    Parse the chips found in directory (if given) and in search_path, and
+    cache them by name.
+    """
+    def __init__(self, directory=None, search_path=PROJECT_DIRS):
+        self.search_path = ([directory] if directory else []) + \
+                           [d for d in search_path if d != directory]
+        self._chips = {}
+
+    def find(self, name):
+        """The path of the HDL file of chip name, or None."""
+        for directory in self.search_path:
+            path = os.path.join(directory, name + '.hdl')
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def chip(self, name):
+        if name not in self._chips:
+            self._chips[name] = self._load(name)
+        return self._chips[name]
+
+    def _load(self, name):
+        if name in PRIMITIVES or (name in BUILTIN_HDL and
+                                  self.find(name) is None):
+            return parse_chip(BUILTIN_HDL[name], name + '.hdl')
+        if name in ALIASES and self.find(name) is None:
+            return self.chip(ALIASES[name])
+        path = self.find(name)
+        if path is None:
+            raise HDLError("Chip %s is not found." %name)
+        chip = parse_file(path)
+        if chip.name != name:
+            raise HDLError("%s defines chip %s" %(path, chip.name))
+        return chip
+
+    def add(self, chip):
+        """Use chip (parsed elsewhere) for its name."""
+        self._chips[chip.name] = chip
+
+    def dependencies(self, name):
+        """The set of the names of the chips used by chip name, directly or
+        through its parts."""
+        result, stack = set(), [name]
+        while stack:
+            for part_name in self.chip(stack.pop()).part_names:
+                if part_name not in result:
+                    result.add(part_name)
+                    stack.append(part_name)
+        return result
+
+    def source_names(self, name):
+        """The names of the chips whose HDL makes chip name: name, the chips
+        it uses and the chips they are aliases of."""
+        names = self.dependencies(name) | {name}
+        return names | {ALIASES[n] for n in names
+                        if n in ALIASES and self.find(n) is None}
+
+    def source_hash(self, names):
+        """A hash of the HDL of the chips names, from the bytes of the files
+        found for them (none is parsed), or from their builtin HDL."""
+        digest = hashlib.sha1()
+        for chip_name in sorted(names):
+            path = self.find(chip_name)
+            digest.update(('%s %s\0' %(chip_name, path)).encode())
+            if path is None:
+                digest.update(BUILTIN_HDL.get(chip_name, '').encode())
+            else:
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+            digest.update(b'\0')
+        return digest.hexdigest()
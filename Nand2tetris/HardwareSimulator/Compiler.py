@@ -0,0 +1,352 @@
+"""The Compiler module compiles a flattened chip to the source of one
+straight-line Python function, so that an eval is a single call instead of
+a loop over the gates:
+
+    def evaluate(v, s, d, m, M):
+        n2 = v[2]                       # the IN pins, from the list of nets
+        n9 = s[0]                       # the DFFs, from the state slots
+        n10 = M ^ (n2 & n9)             # a Nand gate
+        ...
+        o = m[0].eval({'address': n12 | n13 << 1 | ...})   # a block
+        n40 = o['out'] & 1
+        n44 = t0[n41 | n42 << 1 | n43 << 2]  # a lookup table
+        w2 = w1 if n45 else x3          # a word chip (Mux16), on words
+        ...
+        v[5] = n40                      # the nets kept (OUT pins, wires of
+        d[0] = n10                      # the top chip), the DFF inputs
+
+The wires are local variables, and the state of the DFFs is an array of
+slots. The table of each chip looked up is bound once (t0 = m[1].table,
+or m[1].rows, the tuples of the bits, for several outputs), and the pins
+of the tables, like those of the word chips, are not written back. The
+compiled chips are cached on disk (in CACHE_DIR), keyed by the hash of the
+HDL files of the chip and of all its parts (ChipLibrary.source_hash); the
+names of those chips are kept beside, so that a test run reads the files of
+a chip compiled before, but neither parses nor flattens them.
+
+>>> sim = compiled_simulator(ChipLibrary('../05'), 'CPU')
+>>> sim.set('instruction', 0x3039)
+>>> sim.tick(); sim.tock()
+
+Run this file to compare the time of a run of the computer with the
+Simulator and with the CompiledSimulator.
+"""
+
+import os
+import sys
+import time
+import pickle
+import marshal
+import hashlib
+import Models
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import NET_FALSE, NET_TRUE
+from HDLTokenizer import HDLError
+from Netlist import Block, Netlist, flatten
+from Optimizer import optimize
+from Simulator import Simulator
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '__hdlcache__')
+VERSION = 2                             # of the generated code
+
+def kept_nets(netlist, keep=(), words=(), tables=()):
+    """The nets written back by evaluate: the OUT pins, the pins of the
+    blocks, the wires of the top chip (not inside its parts) and those in
+    keep; but the pins of the lookup tables tables, and those of the word
+    chips words and the wires of their outputs, which stay words."""
+    kept = set(netlist.output_nets)
+    for wire in keep:
+        kept.update(netlist.wires[wire])
+    word_nets = set()
+    for block in netlist.blocks:
+        if block.chip_name in words:
+            word_nets.update(block.pins['out'])
+        elif block.chip_name not in tables:
+            kept.update(net for _, nets in block.inputs + block.outputs
+                        for net in nets)
+    for wire, nets in netlist.wires.items():
+        if '/' not in wire and not word_nets.issuperset(nets):
+            kept.update(nets)
+    return kept
+
+def _word(nets):
+    """The expression of the value of the bits nets (on one lane): the
+    false bits are left out, and the true ones are a constant."""
+    ones = sum(1 << k for k, net in enumerate(nets) if net == NET_TRUE)
+    terms = ['n%d' %net if k == 0 else 'n%d << %d' %(net, k)
+             for k, net in enumerate(nets) if net not in (NET_FALSE, NET_TRUE)]
+    if ones or not terms:
+        terms.append('%d' %ones)
+    return ' | '.join(terms)
+
+def _bit_nets(netlist, kept, words):
+    """The nets needed as bits: all of them but the outputs of the word
+    chips read only as the same whole buses by other word chips."""
+    needed = set(netlist.gate_a) | set(netlist.gate_b) | set(netlist.dff_d)
+    needed |= kept
+    produced = {tuple(block.pins['out']) for block in netlist.blocks
+                if block.chip_name in words}
+    for block in netlist.blocks:
+        for _, nets in block.inputs:
+            if block.chip_name not in words or tuple(nets) not in produced:
+                needed.update(nets)
+    return needed
+
+def generate(netlist, kept, tables=(), words=None):
+    """The source of function evaluate of netlist; the blocks of the chips
+    tables are looked up in the table of their model (see Synthesis), those
+    of the word chips words ({chip name: expression}, see Models.WordChip)
+    are inlined."""
+    words = words or {}
+    lines = ['def evaluate(v, s, d, m, M):',
+             '    n%d = 0' %NET_FALSE,
+             '    n%d = M' %NET_TRUE]
+    for net in netlist.input_nets:
+        lines.append('    n%d = v[%d]' %(net, net))
+    for k, net in enumerate(netlist.dff_q):
+        lines.append('    n%d = s[%d]' %(net, k))
+    levels, table_names = {}, {}
+    for k, block in enumerate(netlist.blocks):
+        levels.setdefault(block.level, []).append(k)
+        if block.chip_name in tables and block.chip_name not in table_names:
+            table_names[block.chip_name] = 't%d' %len(table_names)
+            lines.append('    %s = m[%d].%s'
+                         %(table_names[block.chip_name], k,
+                           'table' if len(block.output_nets) == 1 else
+                           'rows'))
+    gate_a, gate_b, gate_out = (netlist.gate_a, netlist.gate_b,
+                                netlist.gate_out)
+    needed = _bit_nets(netlist, kept, words) if words else None
+    names = {}                          # buses: the variables of their words
+    ranges = [(0, 0, 0)] + list(netlist.level_ranges())
+    last = ranges[-1][0]
+    for lv in range(max([last] + list(levels)) + 1):
+        if lv <= last:
+            _, lo, hi = ranges[lv]
+            for k in range(lo, hi):
+                lines.append('    n%d = M ^ (n%d & n%d)'
+                             %(gate_out[k], gate_a[k], gate_b[k]))
+        for k in levels.get(lv, ()):
+            block = netlist.blocks[k]
+            if block.chip_name in words:
+                operands = {}
+                for pin, nets in block.inputs:
+                    bus = tuple(nets)
+                    if bus not in names:
+                        if len(nets) == 1:
+                            names[bus] = 'n%d' %nets[0]
+                        elif all(net == NET_FALSE for net in nets):
+                            names[bus] = '0'
+                        elif all(net == NET_TRUE for net in nets):
+                            names[bus] = '0x%X' %((1 << len(nets)) - 1)
+                        else:
+                            names[bus] = 'x%d' %len(names)
+                            lines.append('    %s = %s'
+                                         %(names[bus], _word(nets)))
+                    operands[pin] = names[bus]
+                out = block.pins['out']
+                names[tuple(out)] = 'w%d' %k
+                lines.append('    w%d = %s'
+                             %(k, words[block.chip_name].format(**operands)))
+                for j, net in enumerate(out):
+                    if net in needed:
+                        lines.append('    n%d = w%d >> %d & 1' %(net, k, j))
+                continue
+            if block.chip_name in tables:
+                lookup = '%s[%s]' %(table_names[block.chip_name],
+                                    _word(block.combinational_nets))
+                lines.append('    %s = %s'
+                             %(', '.join('n%d' %net
+                                         for net in block.output_nets),
+                               lookup))
+                continue
+            lines.append('    o = m[%d].eval({%s})'
+                         %(k, ', '.join("'%s': %s" %(pin, _word(nets))
+                                        for pin, nets in block.inputs
+                                        if pin not in block.clocked)))
+            for pin, nets in block.outputs:
+                for j, net in enumerate(nets):
+                    lines.append("    n%d = o['%s'] >> %d & 1"
+                                 %(net, pin, j))
+    for net in sorted(kept - set(netlist.input_nets) - {NET_FALSE, NET_TRUE}):
+        lines.append('    v[%d] = n%d' %(net, net))
+    for k, net in enumerate(netlist.dff_d):
+        lines.append('    d[%d] = n%d' %(k, net))
+    return '\n'.join(lines) + '\n'
+
+class CompiledChip:
+    """
+    A compiled chip: netlist has the pins, the blocks, the wires kept and
+    the instances of the chip (but no gates), code the code object of the
+    module defining evaluate.
+    """
+    def __init__(self, netlist, num_dffs, code):
+        self.netlist = netlist
+        self.num_dffs = num_dffs
+        self.code = code
+        namespace = {}
+        exec(code, namespace)
+        self.evaluate = namespace['evaluate']
+
+    @staticmethod
+    def from_netlist(netlist, keep=(), tables=(), words=None):
+        if netlist.level_starts is None:
+            netlist.levelize()
+        kept = kept_nets(netlist, keep, words or (), tables)
+        code = compile(generate(netlist, kept, tables, words),
+                       '<%s>' %netlist.name, 'exec')
+        wires = {wire: nets for wire, nets in netlist.wires.items()
+                 if all(net in kept or net in (NET_FALSE, NET_TRUE)
+                        for net in nets)}
+        wires.update(netlist.pins)
+        lite = Netlist(netlist.name, netlist.num_nets, netlist.inputs,
+                       netlist.outputs, blocks=netlist.blocks, wires=wires,
+                       instances=netlist.instances)
+        return CompiledChip(lite, netlist.num_dffs, code)
+
+    def save(self, path):
+        netlist = self.netlist
+        blocks = [(b.chip_name, b.path, b.inputs, b.outputs,
+                   sorted(b.clocked), b.level) for b in netlist.blocks]
+        data = (netlist.name, netlist.num_nets, netlist.inputs,
+                netlist.outputs, blocks, netlist.wires, netlist.instances,
+                self.num_dffs, marshal.dumps(self.code))
+        tmp = '%s.%d.tmp' %(path, os.getpid())  # for concurrent test runs
+        with open(tmp, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            (name, num_nets, inputs, outputs, blocks, wires, instances,
+             num_dffs, code) = pickle.load(f)
+        block_list = []
+        for chip_name, block_path, ins, outs, clocked, level in blocks:
+            block = Block(chip_name, block_path, ins, outs, clocked)
+            block.level = level
+            block_list.append(block)
+        netlist = Netlist(name, num_nets, inputs, outputs, blocks=block_list,
+                          wires=wires, instances=instances)
+        return CompiledChip(netlist, num_dffs, marshal.loads(code))
+
+def compile_chip(library, name, models=Models.MODELS, optimized=True,
+                 cache_dir=CACHE_DIR, keep=()):
+    """The CompiledChip of chip name, its parts in models being blocks, and
+    the wires keep being kept; from the cache if it was compiled from the
+    same HDL."""
+    tables = sorted(chip_name for chip_name, model in models.items()
+                    if getattr(model, 'table', None) is not None)
+    words = {chip_name: model.expression
+             for chip_name, model in models.items()
+             if getattr(model, 'expression', None) is not None}
+    config = hashlib.sha1(('%s %s %s %s %s %d %s' %(
+        sorted(Models.blocks(models).items()), tables, sorted(words.items()),
+        optimized, sorted(keep), VERSION,
+        sys.version_info[:2])).encode()).hexdigest()
+    def cache_path(names):
+        digest = hashlib.sha1((config + library.source_hash(names)).encode())
+        return os.path.join(cache_dir, '%s-%s.pickle'
+                            %(name, digest.hexdigest()))
+    names_path = (os.path.join(cache_dir, '%s-%s.parts' %(name, config))
+                  if cache_dir else None)
+    if names_path and os.path.isfile(names_path):
+        with open(names_path) as f:
+            path = cache_path(f.read().split())
+        if os.path.isfile(path):
+            try:
+                return CompiledChip.load(path)
+            except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+                pass                    # compile it again
+    netlist = flatten(library, name, Models.blocks(models))
+    if optimized:
+        netlist = optimize(netlist, keep)
+    chip = CompiledChip.from_netlist(netlist, keep, tables, words)
+    if names_path:
+        names = sorted(library.source_names(name))
+        os.makedirs(cache_dir, exist_ok=True)
+        chip.save(cache_path(names))
+        tmp = '%s.%d.tmp' %(names_path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(names) + '\n')
+        os.replace(tmp, names_path)
+    return chip
+
+class CompiledSimulator(Simulator):
+    """
+    A Simulator of a CompiledChip: values holds the nets kept, state the
+    DFFs, and the models of the blocks are passed to evaluate.
+    """
+    def __init__(self, chip, lanes=1, models=Models.MODELS):
+        netlist = chip.netlist
+        self.chip = chip
+        self.netlist = netlist
+        self.lanes = lanes
+        self.mask = (1 << lanes) - 1
+        self.models = {}
+        for block in netlist.blocks:
+            if models is None or block.chip_name not in models:
+                raise HDLError("%s: no model for %s" %(netlist.name, block))
+            if lanes != 1:
+                raise HDLError("%s: the models simulate one lane"
+                               %netlist.name)
+            self.models[block.path] = models[block.chip_name]()
+        self._model_list = [self.models[b.path] for b in netlist.blocks]
+        self._evaluate = chip.evaluate
+        self.reset()
+
+    def reset(self):
+        self.values = [0] * self.netlist.num_nets
+        self.values[NET_TRUE] = self.mask
+        self.state = [0] * self.chip.num_dffs
+        self._sampled = self.state
+        self._inputs = [0] * self.chip.num_dffs
+        self.time = 0
+        for model in self.models.values():
+            model.reset()
+
+    def eval(self):
+        self._evaluate(self.values, self.state, self._inputs,
+                       self._model_list, self.mask)
+
+    def tick(self):
+        """Evaluate, then let the DFFs and the models sample their inputs."""
+        self.eval()
+        self._sampled = list(self._inputs)
+        for block in self.netlist.blocks:
+            model = self.models[block.path]
+            if model.clocked:
+                model.tick(self._pins(block))
+        self.time += 1
+
+def compiled_simulator(library, name, lanes=1, models=Models.MODELS,
+                       cache_dir=CACHE_DIR):
+    return CompiledSimulator(compile_chip(library, name, models,
+                                          cache_dir=cache_dir),
+                             lanes, models)
+
+def benchmark(program, cycles=20000, stream=None):
+    """Run program (a .hack file) on the Computer for cycles with both
+    simulators, and report their cycles per second."""
+    stream = stream or sys.stdout
+    library = ChipLibrary(os.path.join(os.path.dirname(CACHE_DIR), '..',
+                                       '05'))
+    start = time.time()
+    compiled = compiled_simulator(library, 'Computer')
+    stream.write('compiled Computer in %.2fs\n' %(time.time() - start))
+    sims = [('Simulator', Models.simulator(library, 'Computer')),
+            ('CompiledSimulator', compiled)]
+    for label, sim in sims:
+        sim.load('ROM32K', program)
+        start = time.time()
+        for _ in range(cycles):
+            sim.tick()
+            sim.tock()
+        elapsed = time.time() - start
+        stream.write('%-18s %8d cycles/s\n' %(label, cycles / elapsed))
+
+if __name__ == '__main__':
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else
+              os.path.join(os.path.dirname(CACHE_DIR), '..', '06', 'rect',
+                           'Rect.hack'))
@@ -0,0 +1,208 @@
+"""The Coverage module measures the toggle coverage of a test script: which
+nets of the chip went from 0 to 1 and from 1 to 0 while it ran. The values
+of all the nets are sampled as one bitset (the byte of net n is bit 8n of
+an int) after each eval, tick and tock, and accumulated by
+
+    rose |= now & ~last
+    fell |= last & ~now
+
+so that a sample costs a few operations on ints of num_nets bytes, whatever
+the activity of the chip. The first sample is the starting point: the nets
+set by the first eval did not toggle.
+
+Each net is reported in the chip instance where it is seen highest, by the
+name of a wire of its HDL (an internal wire rather than the pin of a part):
+
+    chip            parts    nets  toggled  coverage
+    CPU                 1     190      158     83.2%
+    ALU                 1     177      173     97.7%
+    ...
+    PC_0 (PC): 31 of 82 nets never toggled
+        incout[10..15]           stuck at 0
+        loadflag                 stuck at 1
+
+>>> coverage = Coverage()
+>>> TestScript('../02/ALU.tst', gate_level, coverage=coverage).run()
+37
+>>> coverage.report(depth=1)
+
+Run this file with test scripts as arguments (those of the ALU, the CPU and
+RAM8 by default); -d N lists the nets never toggled of the parts down to
+depth N only (1 by default, the chip and its parts, -1 for all), and -m
+simulates the memory chips and the registers by their models (their nets are
+not covered then).
+"""
+
+import os
+import sys
+import Models
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import NET_FALSE, NET_TRUE
+from HDLTokenizer import HDLError
+from TestScript import TestScript, gate_level
+
+def owners(netlist):
+    """{net: (instance path, wire, bit)}: each net (but false and true)
+    named by a wire of the instance highest in the chip, '' being the chip
+    itself; the wire is an internal wire of the instance rather than the pin
+    of a part, bit is None if it is not a bus."""
+    owner = {}
+    for name, nets in netlist.wires.items():
+        path, slash, wire = name.rpartition('/')
+        key = (path.count('/') + 1 if slash else 0, '.' in wire)
+        for k, net in enumerate(nets):
+            if net not in owner or key < owner[net][0]:
+                owner[net] = (key, path, wire, k if len(nets) > 1 else None)
+    return {net: owner[net][1:] for net in owner
+            if net not in (NET_FALSE, NET_TRUE)}
+
+def _ranges(untoggled):
+    """[(name, state)] of the sorted [(wire, bit, state)], the consecutive
+    bits of a wire in the same state as one range, like x[5..15]."""
+    ranges = []
+    for wire, bit, state in untoggled:
+        if ranges and ranges[-1][:2] == [wire, state] and bit is not None \
+                and ranges[-1][3] == bit - 1:
+            ranges[-1][3] = bit
+        else:
+            ranges.append([wire, state, bit, bit])
+    return [(wire if lo is None else '%s[%d]' %(wire, lo) if lo == hi else
+             '%s[%d..%d]' %(wire, lo, hi), state)
+            for wire, state, lo, hi in ranges]
+
+class Coverage:
+    """
+    The toggle coverage of the simulator attached: rose and fell are the
+    bitsets of the nets which went up and down since the first sample.
+    """
+    def __init__(self):
+        self.sim = None
+        self.netlist = None
+        self.rose = 0
+        self.fell = 0
+        self.samples = 0
+        self._first = None
+        self._last = None
+
+    def attach(self, sim):
+        if sim.lanes != 1:
+            raise HDLError("%s: the coverage is of one lane"
+                           %sim.netlist.name)
+        self.sim = sim
+        self.netlist = sim.netlist
+        self.rose = self.fell = 0
+        self.samples = 0
+        self._first = self._last = None
+
+    def sample(self):
+        now = int.from_bytes(bytes(self.sim.values), 'little')
+        last = self._last
+        if last is None:
+            self._first = now
+        elif now != last:
+            self.rose |= now & ~last
+            self.fell |= last & ~now
+        self._last = now
+        self.samples += 1
+
+    def close(self):
+        pass
+
+    def toggled(self, net):
+        """Whether net went both up and down."""
+        return bool((self.rose & self.fell) >> 8 * net & 1)
+
+    def state(self, net):
+        """'toggled', 'stuck at 0', 'stuck at 1', 'never rose' or 'never
+        fell'."""
+        rose, fell = self.rose >> 8 * net & 1, self.fell >> 8 * net & 1
+        if rose and fell:
+            return 'toggled'
+        if rose:
+            return 'never fell'
+        if fell:
+            return 'never rose'
+        return 'stuck at %d' %((self._first or 0) >> 8 * net & 1)
+
+    def instances(self):
+        """[(path, chip name, nets, untoggled)] of the instances of the chip
+        owning nets (see owners), in order of their paths; untoggled are the
+        (wire, bit, state) of the nets never toggled."""
+        netlist = self.netlist
+        both = (self.rose & self.fell).to_bytes(netlist.num_nets, 'little')
+        nets = {}
+        for net, (path, wire, bit) in owners(netlist).items():
+            nets.setdefault(path, []).append((wire, -1 if bit is None else bit,
+                                              net))
+        return [(path, netlist.instances[path] if path else netlist.name,
+                 len(named),
+                 [(wire, None if bit < 0 else bit, self.state(net))
+                  for wire, bit, net in sorted(named) if not both[net]])
+                for path, named in sorted(nets.items())]
+
+    def summary(self):
+        """[(chip name, instances, nets, nets toggled)] by chip, the chip
+        first."""
+        chips = {}
+        for path, chip_name, nets, untoggled in self.instances():
+            counts = chips.setdefault((bool(path), chip_name), [0, 0, 0])
+            counts[0] += 1
+            counts[1] += nets
+            counts[2] += nets - len(untoggled)
+        return [(chip_name,) + tuple(counts)
+                for (_, chip_name), counts in sorted(chips.items())]
+
+    def report(self, stream=None, depth=-1):
+        """Write the summary and the nets never toggled of the instances
+        down to depth (all if -1)."""
+        stream = stream or sys.stdout
+        stream.write('%-14s %6s %7s %8s %9s\n'
+                     %('chip', 'parts', 'nets', 'toggled', 'coverage'))
+        total = toggled = 0
+        for chip_name, count, nets, ok in self.summary():
+            stream.write('%-14s %6d %7d %8d %8.1f%%\n'
+                         %(chip_name, count, nets, ok, 100.0 * ok / nets))
+            total += nets
+            toggled += ok
+        stream.write('%-14s %6s %7d %8d %8.1f%%  (%d samples)\n'
+                     %('total', '', total, toggled,
+                       100.0 * toggled / max(total, 1), self.samples))
+        for path, chip_name, nets, untoggled in self.instances():
+            level = path.count('/') + 1 if path else 0
+            if not untoggled or (depth >= 0 and level > depth):
+                continue
+            stream.write('%s (%s): %d of %d nets never toggled\n'
+                         %(path or chip_name, chip_name, len(untoggled),
+                           nets))
+            for name, state in _ranges(untoggled):
+                stream.write('    %-24s %s\n' %(name, state))
+
+def main(args):
+    depth, backend, paths = 1, gate_level, []
+    while args:
+        arg = args.pop(0)
+        if arg == '-d':
+            depth = int(args.pop(0))
+        elif arg == '-m':
+            backend = Models.simulator
+        else:
+            paths.append(arg)
+    if not paths:
+        paths = [ChipLibrary().find(name)[:-4] + '.tst'
+                 for name in ('ALU', 'CPU', 'RAM8')]
+    passed = True
+    for path in paths:
+        coverage = Coverage()
+        try:
+            rows = TestScript(path, backend, coverage=coverage).run()
+        except (HDLError, IOError) as e:
+            print(e)
+            passed = False
+            continue
+        print('%s: %d rows compared' %(os.path.relpath(path), rows))
+        coverage.report(depth=depth)
+        print()
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -0,0 +1,291 @@
+"""The EventSimulator module provides class EventSimulator, a Simulator which
+evaluates only the gates whose inputs have changed since the last
+evaluation. In a clocked chip, few nets change at each tick and tock (the
+DFFs which took a new value, the pins set by the test), but a gate
+evaluated so costs about 6 times a gate of a sweep over all the gates: the
+EventSimulator gains on the memories, where a cycle reaches a few percent
+of the gates, and sweeps when the gates to evaluate pass SWEEP_ACTIVITY of
+them (the gates queued by the changes times the gates evaluated per gate
+queued so far), so that it is little slower than the Simulator elsewhere.
+Best of 5 runs of the test scripts:
+
+    script      sweep     event  speedup
+    PC          2.3ms     2.5ms     0.9x
+    RAM8       23.8ms    28.8ms     0.8x
+    RAM64     394.2ms   143.1ms     2.8x
+    RAM512   2663.8ms  1683.5ms     1.6x
+    CPU        53.8ms    50.0ms     1.1x
+
+(the small chips vary between 0.8x and 1.1x from run to run) and the
+computer of Benchmark runs Max and Rect at 2920 and 2830 cycles/s against
+1720 and 1740 for the Simulator.
+
+The gates reading net n are fanout[fanout_starts[n]:fanout_starts[n+1]],
+walked by index, and the work queue is a list of gates for each level,
+with a flag per gate in the bytearray queued: the gates of a level are
+evaluated after those of the levels below, so that a gate is evaluated at
+most once by eval, when all its inputs are known.
+
+>>> sim = EventSimulator(flatten(ChipLibrary('../03/b'), 'RAM512'))
+>>> sim.set('load', 1)
+>>> ...
+>>> sim.tick(); sim.tock()
+>>> sim.evaluated                 # gates evaluated since the start
+
+Run this file to compare the time of the test scripts of the sequential
+chips and of the CPU with the Simulator and with the EventSimulator, both
+at gate level, and the activity: the share of the gates evaluated by an
+eval. A script failing on either simulator is reported as FAILED (the CPU
+peeks its DRegister between tick and tock, see peek).
+"""
+
+import os
+import sys
+import time
+from array import array
+from ChipLibrary import ChipLibrary
+from HDLTokenizer import HDLError
+from Netlist import flatten
+from Simulator import Simulator
+from TestScript import TestScript
+
+SWEEP_ACTIVITY = 0.2    # the share of the gates beyond which a sweep is faster
+
+class EventSimulator(Simulator):
+    """
+    A Simulator evaluating the gates (and blocks) whose inputs changed. The
+    first eval after reset evaluates all of them; evaluated counts the
+    gates evaluated, and evals the calls of eval.
+    """
+    def __init__(self, netlist, lanes=1, models=None):
+        Simulator.__init__(self, netlist, lanes, models)
+        num_nets, num_gates = netlist.num_nets, netlist.num_gates
+        counts = array('i', bytes(4 * (num_nets + 1)))
+        for net in netlist.gate_a:
+            counts[net + 1] += 1
+        for a, b in zip(netlist.gate_a, netlist.gate_b):
+            if b != a:
+                counts[b + 1] += 1
+        for n in range(num_nets):
+            counts[n + 1] += counts[n]
+        self.fanout_starts = counts.tolist()
+        fill = array('i', counts)
+        fanout = array('i', bytes(4 * counts[num_nets]))
+        for k, (a, b) in enumerate(zip(netlist.gate_a, netlist.gate_b)):
+            fanout[fill[a]] = k
+            fill[a] += 1
+            if b != a:
+                fanout[fill[b]] = k
+                fill[b] += 1
+        self.fanout = fanout.tolist()
+        self.gate_level = array('i', bytes(4 * num_gates))
+        for lv, lo, hi in netlist.level_ranges():
+            for k in range(lo, hi):
+                self.gate_level[k] = lv
+        # the blocks reading each net combinationally, and the blocks of each
+        # level
+        depth = max([netlist.depth] + [b.level for b in netlist.blocks])
+        self._readers = {}
+        self._level_blocks = [[] for _ in range(depth + 1)]
+        for k, block in enumerate(netlist.blocks):
+            for net in block.combinational_nets:
+                self._readers.setdefault(net, []).append(k)
+            self._level_blocks[block.level].append(k)
+        self._gates = list(netlist.gates())
+        self._queue = [[] for _ in range(depth + 1)]
+        self._queued = bytearray(num_gates)     # whether gate k is queued
+        # the append of the queue of the level of gate k
+        self._push = [self._queue[lv].append for lv in self.gate_level]
+        self._dirty = set()             # the blocks to evaluate
+        self._full = True
+        # the gates queued by the changes and the gates evaluated by the
+        # evals which queued gates: their spread predicts an eval
+        self._seeded = self._reached = 1
+        self._committed = None          # the state last copied to the nets
+        self.evaluated = 0
+        self.evals = 0
+
+    def reset(self):
+        Simulator.reset(self)
+        self._full = True
+
+    def _changed(self, net):
+        """Queue the gates and blocks reading net."""
+        push, queued = self._push, self._queued
+        fanout, starts = self.fanout, self.fanout_starts
+        for i in range(starts[net], starts[net + 1]):
+            k = fanout[i]
+            if not queued[k]:
+                queued[k] = 1
+                push[k](k)
+        if net in self._readers:
+            self._dirty.update(self._readers[net])
+
+    def set(self, pin, value):
+        values, mask = self.values, self.mask
+        for k, net in enumerate(self.netlist.pins[pin]):
+            v = mask if value >> k & 1 else 0
+            if values[net] != v:
+                values[net] = v
+                self._changed(net)
+
+    def set_bits(self, pin, slices):
+        values = self.values
+        for net, s in zip(self.netlist.pins[pin], slices):
+            if values[net] != s:
+                values[net] = s
+                self._changed(net)
+
+    def _sweep(self):
+        """Simulator.eval, leaving nothing queued."""
+        Simulator.eval(self)
+        self.evaluated += self.netlist.num_gates
+        for queue in self._queue:
+            del queue[:]
+        self._queued = bytearray(self.netlist.num_gates)
+        self._dirty.clear()
+        self._full = False
+        self._committed = self.state
+
+    def eval(self):
+        """Evaluate the queued gates level by level, or sweep when the gates
+        they should lead to evaluate (by the spread of the last evals) pass
+        SWEEP_ACTIVITY of the gates."""
+        self.evals += 1
+        if self._full:
+            self._sweep()
+            return
+        values, mask = self.values, self.mask
+        if self.state is not self._committed:
+            for q, s in zip(self.netlist.dff_q, self.state):
+                if values[q] != s:
+                    values[q] = s
+                    self._changed(q)
+            self._committed = self.state
+        gates, queues = self._gates, self._queue
+        seeds = sum(map(len, queues))
+        if (seeds * self._reached >
+                SWEEP_ACTIVITY * self.netlist.num_gates * self._seeded):
+            self._sweep()
+            return
+        push, queued = self._push, self._queued
+        fanout, starts = self.fanout, self.fanout_starts
+        readers, blocks, dirty = self._readers, self.netlist.blocks, self._dirty
+        count = 0
+        for lv, queue in enumerate(queues):
+            if queue:
+                for k in queue:
+                    queued[k] = 0
+                    a, b, out = gates[k]
+                    v = mask ^ (values[a] & values[b])
+                    if values[out] != v:
+                        values[out] = v
+                        for i in range(starts[out], starts[out + 1]):
+                            g = fanout[i]
+                            if not queued[g]:
+                                queued[g] = 1
+                                push[g](g)
+                        if out in readers:
+                            dirty.update(readers[out])
+                count += len(queue)
+                del queue[:]
+            for k in self._level_blocks[lv]:
+                if k in dirty:
+                    dirty.discard(k)
+                    self._eval_block(blocks[k])
+        self.evaluated += count
+        self._seeded += seeds
+        self._reached += count
+
+    def _eval_block(self, block):
+        values = self.values
+        outputs = self.models[block.path].eval(self._pins(block))
+        for pin, nets in block.outputs:
+            value = outputs[pin]
+            for k, net in enumerate(nets):
+                v = value >> k & 1
+                if values[net] != v:
+                    values[net] = v
+                    self._changed(net)
+
+    def peek(self, chip_name, index=None):
+        """Simulator.peek, whose eval of the sampled state on a copy of the
+        nets leaves the queues and the state committed to the nets as they
+        were."""
+        saved = (self._committed, [list(queue) for queue in self._queue],
+                 bytearray(self._queued), set(self._dirty), self._full)
+        try:
+            return Simulator.peek(self, chip_name, index)
+        finally:
+            (self._committed, queues, self._queued, self._dirty,
+             self._full) = saved
+            for queue, gates in zip(self._queue, queues):
+                queue[:] = gates
+
+    def poke(self, chip_name, index, value):
+        Simulator.poke(self, chip_name, index, value)
+        self._dirty.update(range(len(self.netlist.blocks)))
+
+    def load(self, chip_name, path):
+        Simulator.load(self, chip_name, path)
+        self._dirty.update(range(len(self.netlist.blocks)))
+
+    def tock(self):
+        """Commit the DFFs and the models, then evaluate the gates reading
+        the nets which changed (and the blocks whose state changed)."""
+        self.state = self._sampled
+        for k, block in enumerate(self.netlist.blocks):
+            if self.models[block.path].tock():
+                self._dirty.add(k)
+        self.eval()
+        self.time += 1
+
+def compare(paths, runs=5, stream=None):
+    """Run the test scripts paths runs times at gate level with both
+    simulators (built once) and report the time of their fastest run and
+    the share of the gates evaluated by the EventSimulator in its last run;
+    return whether all passed."""
+    stream = stream or sys.stdout
+    stream.write('%-14s %6s %8s %10s %10s %8s %9s\n'
+                 %('script', 'rows', 'gates', 'sweep', 'event', 'speedup',
+                   'activity'))
+    passed = True
+    for path in paths:
+        library = ChipLibrary(os.path.dirname(os.path.abspath(path)))
+        name = os.path.splitext(os.path.basename(path))[0]
+        netlist = flatten(library, name)
+        times = []
+        for cls in (Simulator, EventSimulator):
+            sim = cls(netlist)
+            def backend(library, name):
+                sim.reset()
+                return sim
+            best = None
+            try:
+                for _ in range(runs):
+                    if cls is EventSimulator:
+                        sim.evaluated = sim.evals = 0
+                    start = time.perf_counter()
+                    rows = TestScript(path, backend).run()
+                    elapsed = time.perf_counter() - start
+                    best = min(best or elapsed, elapsed)
+            except HDLError as e:
+                stream.write('%-14s FAILED on the %s\n%s\n'
+                             %(os.path.basename(path), cls.__name__, e))
+                passed = False
+                break
+            times.append(best)
+        else:
+            event = sim
+            stream.write('%-14s %6d %8d %8.1fms %8.1fms %7.1fx %8.1f%%\n'
+                         %(os.path.basename(path), rows, netlist.num_gates,
+                           1000 * times[0], 1000 * times[1], times[0] / times[1],
+                           100.0 * event.evaluated /
+                           (event.evals * netlist.num_gates)))
+    return passed
+
+if __name__ == '__main__':
+    tests = ['Bit', 'Register', 'PC', 'RAM8', 'RAM64', 'RAM512', 'CPU']
+    sys.exit(0 if compare(sys.argv[1:] or
+                          [ChipLibrary().find(name)[:-4] + '.tst'
+                           for name in tests]) else 1)
@@ -0,0 +1,73 @@
+"""The HDLDefinitions module provides type define of tokens, keywords and
+symbols of the HDL files, the directories of the chips in the projects, and
+the interfaces of the builtin chips which are not (or can not be) written in
+HDL.
+"""
+
+import os
+
+# Token types
+T_KEYWORD       = 0     # keyword e.g. 'CHIP', 'IN' etc
+T_SYMBOL        = 1     # symbol e.g. '{', '=' etc
+T_INTEGER       = 2     # integer e.g. '15' in 'in[15]'
+T_ID            = 3     # identifier e.g. 'Mux16', 'sel'
+
+# Keywords for token type T_KEYWORD
+KW_CHIP         = 'CHIP'
+KW_IN           = 'IN'
+KW_OUT          = 'OUT'
+KW_PARTS        = 'PARTS'
+KW_BUILTIN      = 'BUILTIN'
+KW_CLOCKED      = 'CLOCKED'
+
+keywords = (KW_CHIP, KW_IN, KW_OUT, KW_PARTS, KW_BUILTIN, KW_CLOCKED)
+
+symbols = ('{', '}', '(', ')', '[', ']', ',', ';', ':', '=', '..')
+
+# The constant wires
+W_TRUE          = 'true'
+W_FALSE         = 'false'
+
+# Nets 0 and 1 of every netlist hold the constant wires
+NET_FALSE       = 0
+NET_TRUE        = 1
+
+# The directories of the chips of the projects, searched in order after the
+# directory of the chip under test
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_DIRS = tuple(os.path.join(_ROOT, d)
+                     for d in ('01', '02', os.path.join('03', 'a'),
+                               os.path.join('03', 'b'), '04', '05'))
+
+# Nand and DFF are the primitives of the flattened netlists; the others are
+# the memory maps of the computer, which are simulated by models.
+BUILTIN_HDL = {
+    'Nand':     "CHIP Nand { IN a, b; OUT out; BUILTIN Nand; }",
+    'DFF':      "CHIP DFF { IN in; OUT out; BUILTIN DFF; CLOCKED in; }",
+    'ROM32K':   "CHIP ROM32K { IN address[15]; OUT out[16]; "
+                "BUILTIN ROM32K; }",
+    'Screen':   "CHIP Screen { IN in[16], load, address[13]; OUT out[16]; "
+                "BUILTIN Screen; CLOCKED in, load; }",
+    'Keyboard': "CHIP Keyboard { OUT out[16]; BUILTIN Keyboard; }",
+}
+
+PRIMITIVES = ('Nand', 'DFF')
+
+# The builtin registers of the CPU are Registers which can be referred to by
+# the test scripts (ARegister[], DRegister[])
+ALIASES = {
+    'ARegister': 'Register',
+    'DRegister': 'Register',
+}
+
+def is_keyword(s):
+    return s in keywords
+
+def is_symbol(s):
+    return s in symbols
+
+def is_integer(s):
+    return s.isdigit()
+
+def is_constant(s):
+    return s in (W_TRUE, W_FALSE)
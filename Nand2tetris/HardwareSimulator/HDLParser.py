@@ -0,0 +1,164 @@
+"""The HDLParser module provides function parse_chip for parsing the text of a
+HDL file into a Chip. A chip has structures:
+
+  * IN and OUT pins (name[width], the width is 1 by default)
+  * PARTS: the parts of the chip, each of them a list of connections
+    pin[lo..hi]=wire[lo..hi] (the sub buses are optional)
+  * or BUILTIN name (and CLOCKED pins) for the builtin chips
+
+The function of parser in this file would be as follow:
+
+>>> chip = parse_file('../02/ALU.hdl')
+>>> chip.inputs
+[('x', 16), ('y', 16), ('zx', 1), ('nx', 1), ('zy', 1), ...]
+>>> chip.parts[0]
+Part('Mux16', [Connection('a', None, None, 'x', None, None), ...])
+
+"""
+
+import os
+from collections import namedtuple
+from HDLDefinitions import *
+from HDLTokenizer import Tokenizer, HDLError
+
+# pin[pin_lo..pin_hi] = wire[wire_lo..wire_hi], where None is the whole bus
+Connection = namedtuple('Connection',
+                        'pin pin_lo pin_hi wire wire_lo wire_hi')
+
+class Part:
+    def __init__(self, chip_name, connections, line=0):
+        self.chip_name = chip_name
+        self.connections = connections
+        self.line = line
+
+    def __repr__(self):
+        return 'Part(%r, %r)' %(self.chip_name, self.connections)
+
+class Chip:
+    """
+    A chip parsed from HDL. inputs and outputs are lists of (name, width),
+    parts is a list of Part, builtin is the name of the builtin chip (None
+    for the chips made of parts) and clocked is the set of clocked pins.
+    """
+    def __init__(self, name, inputs, outputs, parts, builtin=None,
+                 clocked=(), filename='<hdl>', source=''):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.parts = parts
+        self.builtin = builtin
+        self.clocked = set(clocked)
+        self.filename = filename
+        self.source = source
+        self.widths = dict(inputs + outputs)
+
+    def is_input(self, pin):
+        return any(name == pin for name, _ in self.inputs)
+
+    def is_output(self, pin):
+        return any(name == pin for name, _ in self.outputs)
+
+    @property
+    def input_width(self):
+        return sum(width for _, width in self.inputs)
+
+    @property
+    def part_names(self):
+        """The names of the chips used as parts, in order of first use."""
+        names = []
+        for part in self.parts:
+            if part.chip_name not in names:
+                names.append(part.chip_name)
+        return names
+
+    def __repr__(self):
+        return 'Chip(%r)' %self.name
+
+def parse_chip(text, filename='<hdl>'):
+    tokenizer = Tokenizer(text, filename)
+    tokenizer.expect(KW_CHIP)
+    name = tokenizer.identifier()
+    tokenizer.expect('{')
+    inputs = _parse_pins(tokenizer, KW_IN)
+    outputs = _parse_pins(tokenizer, KW_OUT)
+    parts, builtin, clocked = [], None, []
+    if tokenizer.accept(KW_BUILTIN):
+        builtin = tokenizer.identifier()
+        tokenizer.expect(';')
+        if tokenizer.accept(KW_CLOCKED):
+            clocked.append(tokenizer.identifier())
+            while tokenizer.accept(','):
+                clocked.append(tokenizer.identifier())
+            tokenizer.expect(';')
+    else:
+        tokenizer.expect(KW_PARTS)
+        tokenizer.expect(':')
+        while tokenizer.next_token != '}':
+            parts.append(_parse_part(tokenizer))
+    tokenizer.expect('}')
+    chip = Chip(name, inputs, outputs, parts, builtin, clocked, filename, text)
+    _check_chip(chip, tokenizer)
+    return chip
+
+def parse_file(path):
+    with open(path, 'r') as file:
+        return parse_chip(file.read(), os.path.basename(path))
+
+def _parse_pins(tokenizer, keyword):
+    """[(name, width)] of the IN or OUT declaration, if any."""
+    pins = []
+    if tokenizer.accept(keyword):
+        while True:
+            name = tokenizer.identifier()
+            width = 1
+            if tokenizer.accept('['):
+                width = tokenizer.integer()
+                tokenizer.expect(']')
+            pins.append((name, width))
+            if not tokenizer.accept(','):
+                break
+        tokenizer.expect(';')
+    return pins
+
+def _parse_sub_bus(tokenizer):
+    """(lo, hi) of [lo..hi] or [k], or (None, None) if there is none."""
+    if not tokenizer.accept('['):
+        return None, None
+    lo = hi = tokenizer.integer()
+    if tokenizer.accept('..'):
+        hi = tokenizer.integer()
+    tokenizer.expect(']')
+    if hi < lo:
+        tokenizer.error("bad sub bus [%d..%d]" %(lo, hi))
+    return lo, hi
+
+def _parse_part(tokenizer):
+    line = tokenizer.line
+    chip_name = tokenizer.identifier()
+    tokenizer.expect('(')
+    connections = []
+    while True:
+        pin = tokenizer.identifier()
+        pin_lo, pin_hi = _parse_sub_bus(tokenizer)
+        tokenizer.expect('=')
+        wire = tokenizer.identifier()
+        wire_lo, wire_hi = _parse_sub_bus(tokenizer)
+        connections.append(Connection(pin, pin_lo, pin_hi,
+                                      wire, wire_lo, wire_hi))
+        if not tokenizer.accept(','):
+            break
+    tokenizer.expect(')')
+    tokenizer.expect(';')
+    return Part(chip_name, connections, line)
+
+def _check_chip(chip, tokenizer):
+    names = [name for name, _ in chip.inputs + chip.outputs]
+    for name in names:
+        if names.count(name) > 1:
+            tokenizer.error("pin %s declared twice in %s" %(name, chip.name))
+        if is_constant(name):
+            tokenizer.error("%s can not be a pin name" %name)
+    for name in chip.clocked:
+        if name not in chip.widths:
+            tokenizer.error("clocked pin %s is not a pin of %s"
+                            %(name, chip.name))
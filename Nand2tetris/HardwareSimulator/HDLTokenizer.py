@@ -0,0 +1,100 @@
+"""The HDLTokenizer module provides function tokenize for converting the text
+of a HDL file into a list of tokens, and class Tokenizer for walking through
+them. A token may be:
+
+  * A keyword (represented as a predefined word)
+  * A symbol (represented as a delimiter)
+  * A identifier (represented as a chip name, pin name or wire name)
+  * A int constant (represented as a int, the index of a sub bus)
+
+"""
+
+import re
+from HDLDefinitions import *
+
+class HDLError(Exception):
+    pass
+
+_TOKEN = re.compile(r"""
+      (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<space>\s+)
+    | (?P<symbol>\.\.|[{}()\[\],;:=])
+    | (?P<integer>\d+)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    """, re.VERBOSE | re.DOTALL)
+
+def tokenize(text, filename='<hdl>'):
+    """A list of (token, token_type, line) of text, excluding comments."""
+    result, k, line = [], 0, 1
+    while k < len(text):
+        m = _TOKEN.match(text, k)
+        if m is None:
+            raise HDLError("%s, line %d: invalid character %r"
+                           %(filename, line, text[k]))
+        kind, token = m.lastgroup, m.group()
+        if kind == 'symbol':
+            result.append((token, T_SYMBOL, line))
+        elif kind == 'integer':
+            result.append((int(token), T_INTEGER, line))
+        elif kind == 'word':
+            result.append((token, T_KEYWORD if is_keyword(token) else T_ID,
+                           line))
+        line += token.count('\n')
+        k = m.end()
+    return result
+
+class Tokenizer:
+    def __init__(self, text, filename='<hdl>'):
+        self.filename = filename
+        self._tokens = tokenize(text, filename)
+        self._k = 0
+
+    def has_more_tokens(self):
+        return self._k < len(self._tokens)
+
+    @property
+    def next_token(self):
+        return self._tokens[self._k][0] if self.has_more_tokens() else None
+
+    @property
+    def line(self):
+        k = min(self._k, len(self._tokens) - 1)
+        return self._tokens[k][2] if k >= 0 else 0
+
+    def error(self, message):
+        raise HDLError("%s, line %d: %s" %(self.filename, self.line, message))
+
+    def advance(self):
+        if not self.has_more_tokens():
+            self.error("unexpected end of file")
+        token = self._tokens[self._k]
+        self._k += 1
+        return token
+
+    def expect(self, expected):
+        token, _, _ = self.advance()
+        if token != expected:
+            self._k -= 1
+            self.error("expected %r, got %r" %(expected, token))
+        return token
+
+    def identifier(self):
+        token, token_type, _ = self.advance()
+        if token_type != T_ID:
+            self._k -= 1
+            self.error("expected an identifier, got %r" %(token,))
+        return token
+
+    def integer(self):
+        token, token_type, _ = self.advance()
+        if token_type != T_INTEGER:
+            self._k -= 1
+            self.error("expected an integer, got %r" %(token,))
+        return token
+
+    def accept(self, expected):
+        """Advance and return True if the next token is expected."""
+        if self.next_token == expected:
+            self._k += 1
+            return True
+        return False
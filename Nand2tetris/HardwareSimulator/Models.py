@@ -0,0 +1,343 @@
+"""The Models module provides the behavioral models of the memory chips, which
+the Simulator uses instead of their HDL when they are parts of the chip
+under test (the blocks of its netlist):
+
+  * the RAMs (RAM8 to RAM16K), Register and its aliases, and PC, whose
+    state is an array('H') or an int
+  * the memory maps of the computer (ROM32K, Screen and Keyboard), which
+    have no HDL
+  * the bus chips of 16 bit slices (And16, Or16, Not16, Mux16, Mux4Way16
+    and Mux8Way16, WORD_MODELS), evaluated as one operation on words
+
+A model has the methods eval (the outputs for the values of the pins; only
+those which are not clocked are up to date),
+tick (sample the clocked pins), tock (commit; True if the outputs may have
+changed), reset, peek and poke (the state shown by the test scripts, like
+RAM16K[5]).
+
+>>> sim = simulator(ChipLibrary('../05'), 'Computer')   # CPU built of gates
+>>> sim.load('ROM32K', 'add/Add.hack')
+
+The word chips have no state: out is their expression of the pins, which
+the Compiler inlines, so that a bus which goes from a word chip to another
+stays a word; the bits of their pins are packed and unpacked only where
+they are wired otherwise (in[0..7], a gate).
+
+Function cross_check checks the model of a chip against its HDL on random
+cycles. Run this file to check all the models which have an HDL.
+"""
+
+import re
+import sys
+import random
+from array import array
+from ChipLibrary import ChipLibrary
+from HDLTokenizer import HDLError
+from Netlist import flatten
+from Simulator import Simulator
+from reference import Mismatch, MAX_MISMATCHES
+
+class Memory:
+    """
+    size words of RAM: out is the word at address, and in is written there
+    at the clock if load is set.
+    """
+    size = 1
+    clocked = ('in', 'load')
+
+    def __init__(self):
+        self.words = array('H', bytes(2 * self.size))
+        self._write = None
+
+    def reset(self):
+        self.words = array('H', bytes(2 * self.size))
+        self._write = None
+
+    def eval(self, pins):
+        return {'out': self.words[pins.get('address', 0)]}
+
+    def tick(self, pins):
+        self._write = ((pins.get('address', 0), pins['in']) if pins['load']
+                       else None)
+
+    def tock(self):
+        if self._write is None:
+            return False
+        address, value = self._write
+        self.words[address] = value
+        self._write = None
+        return True
+
+    def _address(self, index):
+        index = index or 0
+        if not 0 <= index < self.size:
+            raise HDLError("%s[%d] is out of range" %(type(self).__name__,
+                                                      index))
+        return index
+
+    def peek(self, index=None):
+        """The word index, with the write sampled at the last tick."""
+        index = self._address(index)
+        if self._write is not None and self._write[0] == index:
+            return self._write[1]
+        return self.words[index]
+
+    def poke(self, index, value):
+        self.words[self._address(index)] = value
+
+class Register(Memory):
+    size = 1
+
+    def _address(self, index):
+        return 0
+
+class RAM8(Memory):
+    size = 8
+
+class RAM64(Memory):
+    size = 64
+
+class RAM512(Memory):
+    size = 512
+
+class RAM4K(Memory):
+    size = 4096
+
+class RAM16K(Memory):
+    size = 16384
+
+class Screen(Memory):
+    size = 8192
+
+class ProgramCounter:
+    """out is the counter; at the clock it is reset, loaded from in or
+    incremented, in that order of priority."""
+    clocked = ('in', 'load', 'inc', 'reset')
+
+    def __init__(self):
+        self.value = 0
+        self._next = 0
+
+    def reset(self):
+        self.value = self._next = 0
+
+    def eval(self, pins):
+        return {'out': self.value}
+
+    def tick(self, pins):
+        if pins['reset']:
+            self._next = 0
+        elif pins['load']:
+            self._next = pins['in']
+        elif pins['inc']:
+            self._next = (self.value + 1) & 0xFFFF
+        else:
+            self._next = self.value
+
+    def tock(self):
+        changed = self.value != self._next
+        self.value = self._next
+        return changed
+
+    def peek(self, index=None):
+        return self._next
+
+    def poke(self, index, value):
+        self.value = self._next = value
+
+class Keyboard:
+    """out is the code of the key held down (0 for none), set by poke."""
+    clocked = ()
+
+    def __init__(self):
+        self.key = 0
+
+    def reset(self):
+        self.key = 0
+
+    def eval(self, pins):
+        return {'out': self.key}
+
+    def tick(self, pins):
+        pass
+
+    def tock(self):
+        return False
+
+    def peek(self, index=None):
+        return self.key
+
+    def poke(self, index, value):
+        self.key = value
+
+class ROM32K(Memory):
+    """The instruction memory: out is the word at address, and the program
+    is loaded from a .hack file."""
+    size = 32768
+    clocked = ()
+
+    def reset(self):
+        pass                            # keep the program
+
+    def tick(self, pins):
+        pass
+
+    def load(self, path):
+        self.words = array('H', bytes(2 * self.size))
+        with open(path) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        if len(lines) > self.size:
+            raise HDLError("%s: more than %d instructions" %(path, self.size))
+        for k, line in enumerate(lines):
+            try:
+                self.words[k] = int(line, 2)
+            except ValueError:
+                raise HDLError("%s, line %d: bad instruction %s"
+                               %(path, k + 1, line))
+
+class WordChip:
+    """
+    A combinational bus chip: out is expression, where {pin} is the value
+    of pin, like '{a} & {b}' (see word_chip).
+    """
+    expression = '0'
+    clocked = ()
+    function = None
+
+    def reset(self):
+        pass
+
+    def eval(self, pins):
+        return {'out': self.function(pins)}
+
+    def tick(self, pins):
+        pass
+
+    def tock(self):
+        return False
+
+    def peek(self, index=None):
+        raise HDLError("%s has no state" %type(self).__name__)
+
+    def poke(self, index, value):
+        raise HDLError("%s has no state" %type(self).__name__)
+
+def word_chip(name, expression):
+    """The WordChip class of chip name computing expression."""
+    pins = {pin: "(pins['%s'])" %pin for pin in
+            re.findall(r'{(\w+)}', expression)}
+    return type(name, (WordChip,), {
+        'expression': expression,
+        'function': staticmethod(eval('lambda pins: ' +
+                                      expression.format(**pins)))})
+
+WORD_MODELS = {
+    'And16':        word_chip('And16', '{a} & {b}'),
+    'Or16':         word_chip('Or16', '{a} | {b}'),
+    'Not16':        word_chip('Not16', '{in} ^ 0xFFFF'),
+    'Mux16':        word_chip('Mux16', '{b} if {sel} else {a}'),
+    'Mux4Way16':    word_chip('Mux4Way16', '({a}, {b}, {c}, {d})[{sel}]'),
+    'Mux8Way16':    word_chip('Mux8Way16',
+                              '({a}, {b}, {c}, {d}, {e}, {f}, {g}, {h})'
+                              '[{sel}]'),
+}
+
+MODELS = {
+    'RAM8':         RAM8,
+    'RAM64':        RAM64,
+    'RAM512':       RAM512,
+    'RAM4K':        RAM4K,
+    'RAM16K':       RAM16K,
+    'Register':     Register,
+    'ARegister':    Register,
+    'DRegister':    Register,
+    'PC':           ProgramCounter,
+    'ROM32K':       ROM32K,
+    'Screen':       Screen,
+    'Keyboard':     Keyboard,
+}
+
+# The memories of the computer, the CPU (and its registers) being gates
+MEMORY_MODELS = {name: MODELS[name] for name in
+                 ('RAM8', 'RAM64', 'RAM512', 'RAM4K', 'RAM16K', 'ROM32K',
+                  'Screen', 'Keyboard')}
+
+# the memory chips simulated by their models even at gate level: RAM4K is
+# 1.2 million Nands, Memory 4.8 million
+LARGE_MODELS = {name: MODELS[name] for name in
+                ('RAM4K', 'RAM16K', 'ROM32K', 'Screen', 'Keyboard')}
+
+def blocks(models=MODELS):
+    """The blocks of a Flattener for models: {chip name: clocked pins}."""
+    return {name: model.clocked for name, model in models.items()}
+
+def simulator(library, name, models=MODELS):
+    """A Simulator of chip name, its parts in models being simulated by
+    their models."""
+    return Simulator(flatten(library, name, blocks(models)), models=models)
+
+def _random_inputs(netlist, rng, addresses):
+    inputs = {}
+    for pin, nets in netlist.inputs:
+        if pin == 'address':
+            address = (rng.choice(addresses) if rng.random() < 0.75 else
+                       rng.getrandbits(16))
+            inputs[pin] = address & ((1 << len(nets)) - 1)
+        elif pin == 'reset':
+            inputs[pin] = int(rng.random() < 0.05)
+        else:
+            inputs[pin] = rng.getrandbits(len(nets))
+    return inputs
+
+def cross_check(library, name, cycles=1000, seed=0, flat=False):
+    """Check the model of chip name against its HDL on cycles random
+    cycles: the outputs are compared before the tick and after the tock.
+    The parts of the chip are simulated by their models unless flat is
+    True. Most addresses are drawn from a few random ones, so that the
+    words written are read back. Return (the number of cycles, [Mismatch])."""
+    rng = random.Random(seed)
+    model = (MODELS.get(name) or WORD_MODELS[name])()
+    netlist = flatten(library, name, None if flat else blocks())
+    sim = Simulator(netlist, models=MODELS)
+    addresses = [rng.getrandbits(16) for _ in range(8)]
+    outputs = [pin for pin, _ in netlist.outputs]
+    mismatches = []
+    for cycle in range(cycles):
+        inputs = _random_inputs(netlist, rng, addresses)
+        for pin, value in inputs.items():
+            sim.set(pin, value)
+        sim.eval()
+        for when in ('before tick', 'after tock'):
+            expected = model.eval(inputs)
+            got = {pin: sim.get(pin) for pin in outputs}
+            if got != expected:
+                mismatches.append(Mismatch(dict(inputs, cycle=cycle,
+                                                when=when), expected, got))
+                if len(mismatches) >= MAX_MISMATCHES:
+                    return cycle + 1, mismatches
+            if when == 'before tick':
+                sim.tick()
+                model.tick(inputs)
+                sim.tock()
+                model.tock()
+    return cycles, mismatches
+
+def cross_check_all(cycles=1000, stream=None):
+    """Cross check the models of the chips which have an HDL; return True
+    if all of them pass."""
+    stream = stream or sys.stdout
+    library = ChipLibrary()
+    passed = True
+    stream.write('%-10s %8s  %s\n' %('chip', 'cycles', 'result'))
+    for name in list(MODELS) + list(WORD_MODELS):
+        if library.find(name) is None:
+            continue
+        checked, mismatches = cross_check(library, name, cycles)
+        passed = passed and not mismatches
+        stream.write('%-10s %8d  %s\n' %(name, checked,
+                                         mismatches[0] if mismatches else
+                                         'ok'))
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if cross_check_all() else 1)
@@ -0,0 +1,493 @@
+"""The Netlist module provides class Netlist, a chip flattened down to Nand
+gates and DFFs, and class Flattener to build it from the HDL of the chip.
+A netlist has:
+
+  * nets numbered from 0, where net 0 is false and net 1 is true
+  * the IN and OUT pins of the chip, each of them a list of nets
+  * the Nand gates in the packed arrays gate_a, gate_b and gate_out
+  * the DFFs in the packed arrays dff_d (sampled at tick) and dff_q
+  * the blocks, parts kept whole (the builtin memory maps, or the chips
+    simulated by models)
+  * the wires, the hierarchical names of the nets, such as 'zr' (a wire of
+    the chip) or 'Add16_0/FullAdder_0.sum' (the pin sum of the first
+    FullAdder of the first Add16)
+
+After levelize, the gates are sorted by level, the length of the longest
+path of gates from the inputs, the DFF outputs and the blocks, so that a
+single sweep over the arrays evaluates the chip. level_starts[k] is the
+index of the first gate of level k+1.
+
+>>> netlist = flatten(ChipLibrary('../02'), 'ALU')
+>>> netlist
+Netlist('ALU', nets=1261, nands=1221, dffs=0, blocks=0, depth=92)
+>>> netlist.pins['zr']
+[56]
+
+"""
+
+from array import array
+from itertools import chain
+from HDLDefinitions import *
+from HDLTokenizer import HDLError
+
+class Block:
+    """
+    A part kept whole in a netlist. inputs and outputs are lists of (pin,
+    nets), clocked is the set of the input pins which are only sampled by
+    the clock, the others may change the outputs at once.
+    """
+    def __init__(self, chip_name, path, inputs, outputs, clocked=()):
+        self.chip_name = chip_name
+        self.path = path
+        self.inputs = inputs
+        self.outputs = outputs
+        self.clocked = set(clocked)
+        self.pins = dict(inputs + outputs)
+        self.level = 0
+
+    @property
+    def combinational_nets(self):
+        return [net for pin, nets in self.inputs if pin not in self.clocked
+                for net in nets]
+
+    @property
+    def output_nets(self):
+        return [net for _, nets in self.outputs for net in nets]
+
+    def remap(self, m, prefix=''):
+        """A copy of the block with the nets n mapped to m[n]."""
+        return Block(self.chip_name, prefix + self.path,
+                     [(pin, [m[n] for n in nets])
+                      for pin, nets in self.inputs],
+                     [(pin, [m[n] for n in nets])
+                      for pin, nets in self.outputs], self.clocked)
+
+    def __repr__(self):
+        return 'Block(%r, %r)' %(self.chip_name, self.path)
+
+class Netlist:
+    def __init__(self, name, num_nets, inputs, outputs, gates=((), (), ()),
+                 dffs=((), ()), blocks=(), wires=None, instances=None):
+        self.name = name
+        self.num_nets = num_nets
+        self.inputs = inputs
+        self.outputs = outputs
+        self.pins = dict(inputs + outputs)
+        self.gate_a, self.gate_b, self.gate_out = (
+            g if isinstance(g, array) else array('i', g) for g in gates)
+        self.dff_d, self.dff_q = (
+            d if isinstance(d, array) else array('i', d) for d in dffs)
+        self.blocks = list(blocks)
+        self.wires = wires if wires is not None else dict(self.pins)
+        self.instances = instances if instances is not None else {}
+        self.level_starts = None
+        self._names = None
+
+    @property
+    def num_gates(self):
+        return len(self.gate_out)
+
+    @property
+    def num_dffs(self):
+        return len(self.dff_q)
+
+    @property
+    def depth(self):
+        """The number of levels of gates (after levelize)."""
+        if self.level_starts is None:
+            return 0
+        return len(self.level_starts) - 1
+
+    @property
+    def input_nets(self):
+        return [net for _, nets in self.inputs for net in nets]
+
+    @property
+    def output_nets(self):
+        return [net for _, nets in self.outputs for net in nets]
+
+    def gates(self):
+        """Iterate (a, b, out) of the gates."""
+        return zip(self.gate_a, self.gate_b, self.gate_out)
+
+    def net_name(self, net):
+        """A name of net, from the wire nearest to the top of the chip."""
+        if self._names is None:
+            self._names = {}
+            order = lambda w: (w.count('/'), '.' in w, w)
+            for name in sorted(self.wires, key=order):
+                nets = self.wires[name]
+                for k, n in enumerate(nets):
+                    if n not in self._names:
+                        self._names[n] = (name if len(nets) == 1 else
+                                          '%s[%d]' %(name, k))
+        return self._names.get(net, '#%d' %net)
+
+    def levelize(self):
+        """Sort the gates by level and compute the levels of the blocks.
+        Raise HDLError for a net with more than one driver, an undriven net
+        in use or a loop of gates."""
+        num_gates, num_nets = self.num_gates, self.num_nets
+        gate_a, gate_b, gate_out = self.gate_a, self.gate_b, self.gate_out
+        self._check_drivers()
+        # the nodes are the gates, then the blocks which have combinational
+        # inputs; driver[n] is the node driving net n (-1 for the sources:
+        # constants, inputs, DFFs and the other blocks)
+        blocks = [block for block in self.blocks if block.combinational_nets]
+        block_inputs = [block.combinational_nets for block in blocks]
+        num_nodes = num_gates + len(blocks)
+        driver = array('i', [-1]) * num_nets
+        for k, out in enumerate(gate_out):
+            driver[out] = k
+        for k, block in enumerate(blocks):
+            for net in block.output_nets:
+                driver[net] = num_gates + k
+        # depth first search from each node, the level of a node is known
+        # after those of its drivers (-1: not visited, -2: on the stack)
+        level = array('i', [-1]) * num_nodes
+        for start in range(num_nodes):
+            if level[start] != -1:
+                continue
+            level[start] = -2
+            stack = [start]
+            while stack:
+                node = stack[-1]
+                lv = 0
+                for net in ((gate_a[node], gate_b[node]) if node < num_gates
+                            else block_inputs[node - num_gates]):
+                    d = driver[net]
+                    if d < 0:
+                        continue
+                    d_level = level[d]
+                    if d_level == -1:
+                        level[d] = -2
+                        stack.append(d)
+                        break
+                    if d_level == -2:
+                        raise HDLError("%s: combinational loop through %s"
+                                       %(self.name, self.net_name(net)))
+                    if d_level > lv:
+                        lv = d_level
+                else:
+                    level[node] = lv + 1
+                    stack.pop()
+        for k, block in enumerate(blocks):
+            block.level = level[num_gates + k]
+        # counting sort of the gates by level
+        depth = max(level[:num_gates]) if num_gates else 0
+        starts = array('i', bytes(4 * (depth + 1)))
+        for k in range(num_gates):
+            starts[level[k] - 1] += 1
+        total = 0
+        for lv in range(depth):
+            starts[lv], total = total, total + starts[lv]
+        order = array('i', bytes(4 * num_gates))
+        for k in range(num_gates):
+            lv = level[k] - 1
+            order[starts[lv]] = k
+            starts[lv] += 1
+        # starts[lv] is now the end of level lv+1
+        self.gate_a = array('i', map(gate_a.__getitem__, order))
+        self.gate_b = array('i', map(gate_b.__getitem__, order))
+        self.gate_out = array('i', map(gate_out.__getitem__, order))
+        self.level_starts = array('i', [0]) + starts[:depth]
+        return self
+
+    def _check_drivers(self):
+        driven = bytearray(self.num_nets)
+        for net in chain([NET_FALSE, NET_TRUE], self.input_nets,
+                         self.gate_out, self.dff_q,
+                         [n for block in self.blocks
+                          for n in block.output_nets]):
+            if driven[net]:
+                raise HDLError("%s: %s has more than one source"
+                               %(self.name, self.net_name(net)))
+            driven[net] = 1
+        for nets in ([self.gate_a, self.gate_b, self.dff_d] +
+                     [nets for block in self.blocks
+                      for _, nets in block.inputs]):
+            if not all(map(driven.__getitem__, nets)):
+                net = next(n for n in nets if not driven[n])
+                raise HDLError("%s: %s has no source"
+                               %(self.name, self.net_name(net)))
+
+    def level_ranges(self):
+        """Iterate (level, lo, hi), the gates lo..hi-1 of each level."""
+        starts = self.level_starts
+        for lv in range(1, len(starts)):
+            yield lv, starts[lv - 1], starts[lv]
+
+    def __repr__(self):
+        return ('Netlist(%r, nets=%d, nands=%d, dffs=%d, blocks=%d, depth=%d)'
+                %(self.name, self.num_nets, self.num_gates, self.num_dffs,
+                  len(self.blocks), self.depth))
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = array('i')
+
+    def add(self, count=1):
+        first = len(self.parent)
+        self.parent.extend(range(first, first + count))
+        return first
+
+    def find(self, n):
+        parent = self.parent
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    def union(self, a, b):
+        """Join the sets of a and b; the smaller root (e.g. a constant or a
+        pin of the chip) is the root of the result."""
+        a, b = self.find(a), self.find(b)
+        if a < b:
+            self.parent[b] = a
+        elif b < a:
+            self.parent[a] = b
+
+class Flattener:
+    """
+    Flatten the chips of library down to Nand gates, DFFs and blocks. The
+    builtin chips other than Nand and DFF are blocks, and so are the chips
+    in blocks, a dict {chip name: clocked pins}. A chip is flattened once
+    and the result is instantiated for each of its parts. If names is False,
+    the wires and the instances of the parts are not kept (the blocks keep
+    their paths).
+    """
+    def __init__(self, library, blocks=None, names=True):
+        self.library = library
+        self.blocks = dict(blocks or {})
+        self.names = names
+        self._templates = {}
+
+    def netlist(self, name):
+        """The levelized netlist of chip name."""
+        return self.template(name).levelize()
+
+    def is_block(self, name):
+        chip = self.library.chip(name)
+        return name in self.blocks or (chip.builtin is not None and
+                                       name not in PRIMITIVES)
+
+    def template(self, name):
+        """The netlist of chip name, not levelized."""
+        if name not in self._templates:
+            self._templates[name] = _ChipBuilder(self, name).build()
+        return self._templates[name]
+
+class _ChipBuilder:
+    """Flatten one chip, from the templates of its parts."""
+    def __init__(self, flattener, name):
+        self.flattener = flattener
+        self.name = name
+        self.chip = flattener.library.chip(name)
+        if self.chip.builtin is not None:
+            raise HDLError("%s is a builtin chip" %name)
+        self.nets = _UnionFind()
+        self.nets.add(2)                # NET_FALSE, NET_TRUE
+        self.pins = {}
+        for pin, width in self.chip.inputs + self.chip.outputs:
+            self.pins[pin] = list(range(self.nets.add(width),
+                                        len(self.nets.parent)))
+        self.internal = {}              # internal wire: nets
+        self.driven = set()             # the (wire, bit) driven by parts
+        self.read = set()               # internal wires read by parts
+        self.gate_a, self.gate_b, self.gate_out = (array('i'), array('i'),
+                                                   array('i'))
+        self.dff_d, self.dff_q = array('i'), array('i')
+        self.blocks = []
+        self.wires = {}
+        self.instances = {}
+
+    def error(self, part, message):
+        raise HDLError("%s, line %d: %s" %(self.chip.filename, part.line,
+                                           message))
+
+    def build(self):
+        counts = {}
+        for part in self.chip.parts:
+            k = counts.get(part.chip_name, 0)
+            counts[part.chip_name] = k + 1
+            self.add_part(part, '%s_%d' %(part.chip_name, k))
+        for wire in self.read:
+            if (wire, 0) not in self.driven:
+                raise HDLError("%s: wire %s has no source"
+                               %(self.chip.filename, wire))
+        for pin, _ in self.chip.outputs:
+            for k, net in enumerate(self.pins[pin]):
+                if (pin, k) not in self.driven:
+                    self.nets.union(net, NET_FALSE)
+        return self.compact()
+
+    def connect(self, part, child):
+        """{pin: [[parent nets] for each bit]} of the pins of child."""
+        bits = {pin: [[] for _ in range(width)]
+                for pin, width in child.inputs + child.outputs}
+        for c in part.connections:
+            if c.pin not in child.widths:
+                self.error(part, "%s has no pin %s" %(part.chip_name, c.pin))
+            is_output = child.is_output(c.pin)
+            lo, hi = ((0, child.widths[c.pin] - 1) if c.pin_lo is None else
+                      (c.pin_lo, c.pin_hi))
+            if hi >= child.widths[c.pin]:
+                self.error(part, "sub bus out of %s[%d]"
+                           %(c.pin, child.widths[c.pin]))
+            nets = self.wire_nets(part, c, hi - lo + 1, is_output)
+            for k, net in enumerate(nets):
+                if bits[c.pin][lo + k] and not is_output:
+                    self.error(part, "%s[%d] is connected twice"
+                               %(c.pin, lo + k))
+                bits[c.pin][lo + k].append(net)
+        return bits
+
+    def wire_nets(self, part, c, width, is_output):
+        """The nets of the wire of connection c, width bits."""
+        chip = self.chip
+        if is_constant(c.wire):
+            if is_output:
+                self.error(part, "an output pin can not be connected to %s"
+                           %c.wire)
+            if c.wire_lo is not None:
+                self.error(part, "%s can not have a sub bus" %c.wire)
+            return [NET_TRUE if c.wire == W_TRUE else NET_FALSE] * width
+        if c.wire in chip.widths:
+            if chip.is_input(c.wire) and is_output:
+                self.error(part, "an output pin can not drive input pin %s"
+                           %c.wire)
+            if chip.is_output(c.wire) and not is_output:
+                self.error(part, "output pin %s can not be read" %c.wire)
+            nets = self.pins[c.wire]
+            lo, hi = ((0, len(nets) - 1) if c.wire_lo is None else
+                      (c.wire_lo, c.wire_hi))
+            if hi >= len(nets) or hi - lo + 1 != width:
+                self.error(part, "%s: bad width of %s" %(c.pin, c.wire))
+            if is_output:
+                for k in range(lo, hi + 1):
+                    if (c.wire, k) in self.driven:
+                        self.error(part, "%s[%d] has more than one source"
+                                   %(c.wire, k))
+                    self.driven.add((c.wire, k))
+            return nets[lo:hi + 1]
+        if c.wire_lo is not None:
+            self.error(part, "internal wire %s can not have a sub bus"
+                       %c.wire)
+        if c.wire not in self.internal:
+            first = self.nets.add(width)
+            self.internal[c.wire] = list(range(first, first + width))
+        nets = self.internal[c.wire]
+        if len(nets) != width:
+            self.error(part, "%s: bad width of %s" %(c.pin, c.wire))
+        if is_output:
+            if (c.wire, 0) in self.driven:
+                self.error(part, "%s has more than one source" %c.wire)
+            self.driven.update((c.wire, k) for k in range(width))
+        else:
+            self.read.add(c.wire)
+        return nets
+
+    def output_net(self, targets):
+        """The net of an output bit connected to targets."""
+        if not targets:
+            return self.nets.add()
+        for net in targets[1:]:
+            self.nets.union(targets[0], net)
+        return targets[0]
+
+    def add_part(self, part, path):
+        flattener = self.flattener
+        name = part.chip_name
+        child = flattener.library.chip(name)
+        bits = self.connect(part, child)
+        inputs = [(pin, [b[0] if b else NET_FALSE for b in bits[pin]])
+                  for pin, _ in child.inputs]
+        if name == 'Nand':
+            self.gate_a.append(inputs[0][1][0])
+            self.gate_b.append(inputs[1][1][0])
+            self.gate_out.append(self.output_net(bits['out'][0]))
+        elif name == 'DFF':
+            self.dff_d.append(inputs[0][1][0])
+            self.dff_q.append(self.output_net(bits['out'][0]))
+        elif flattener.is_block(name):
+            outputs = [(pin, [self.output_net(b) for b in bits[pin]])
+                       for pin, _ in child.outputs]
+            clocked = flattener.blocks.get(name, child.clocked)
+            self.blocks.append(Block(name, path, inputs, outputs, clocked))
+            if flattener.names:
+                self.instances[path] = name
+                for pin, nets in inputs + outputs:
+                    self.wires[path + '.' + pin] = nets
+        else:
+            self.instantiate(flattener.template(name), path, inputs, bits)
+
+    def instantiate(self, template, path, inputs, bits):
+        base = self.nets.add(template.num_nets)
+        m = array('i', range(base, base + template.num_nets))
+        m[NET_FALSE], m[NET_TRUE] = NET_FALSE, NET_TRUE
+        for pin, nets in inputs:
+            for c, p in zip(template.pins[pin], nets):
+                m[c] = p
+        for pin, _ in template.outputs:
+            for c, targets in zip(template.pins[pin], bits[pin]):
+                for p in targets:
+                    self.nets.union(m[c], p)
+        self.gate_a.extend(map(m.__getitem__, template.gate_a))
+        self.gate_b.extend(map(m.__getitem__, template.gate_b))
+        self.gate_out.extend(map(m.__getitem__, template.gate_out))
+        self.dff_d.extend(map(m.__getitem__, template.dff_d))
+        self.dff_q.extend(map(m.__getitem__, template.dff_q))
+        prefix = path + '/'
+        self.blocks.extend(block.remap(m, prefix) for block in template.blocks)
+        if self.flattener.names:
+            self.instances[path] = template.name
+            for sub, chip_name in template.instances.items():
+                self.instances[prefix + sub] = chip_name
+            for wire, nets in template.wires.items():
+                self.wires[(path + '.' if wire in template.pins else prefix) +
+                           wire] = [m[n] for n in nets]
+
+    def compact(self):
+        """The netlist of the chip, with the nets in use numbered from 0 in
+        order of the roots of the union find: constants, pins, then the
+        others."""
+        find = self.nets.find
+        canon = array('i', map(find, range(len(self.nets.parent))))
+        pins = [self.pins[pin] for pin, _ in self.chip.inputs +
+                self.chip.outputs]
+        lists = ([self.gate_a, self.gate_b, self.gate_out,
+                  self.dff_d, self.dff_q] + pins +
+                 [nets for block in self.blocks
+                  for _, nets in block.inputs + block.outputs])
+        used = bytearray(len(canon))
+        used[NET_FALSE] = used[NET_TRUE] = 1
+        for nets in lists:
+            for root in map(canon.__getitem__, nets):
+                used[root] = 1
+        new = array('i', bytes(4 * len(canon)))
+        count = 0
+        for root in range(len(canon)):
+            if used[root]:
+                new[root] = count
+                count += 1
+        final = array('i', map(new.__getitem__, canon))
+        del canon, new, used
+        def number(nets):
+            return array('i', map(final.__getitem__, nets))
+        inputs = [(pin, list(number(self.pins[pin])))
+                  for pin, _ in self.chip.inputs]
+        outputs = [(pin, list(number(self.pins[pin])))
+                   for pin, _ in self.chip.outputs]
+        gates = (number(self.gate_a), number(self.gate_b),
+                 number(self.gate_out))
+        dffs = (number(self.dff_d), number(self.dff_q))
+        blocks = [block.remap(final) for block in self.blocks]
+        wires = dict(inputs + outputs)
+        for wire, nets in chain(self.internal.items(), self.wires.items()):
+            wires[wire] = list(number(nets))
+        return Netlist(self.name, count, inputs, outputs, gates, dffs,
+                       blocks, wires, self.instances)
+
+def flatten(library, name, blocks=None, names=True):
+    """The levelized netlist of chip name of library."""
+    return Flattener(library, blocks, names).netlist(name)
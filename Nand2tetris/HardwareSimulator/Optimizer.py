@@ -0,0 +1,207 @@
+"""The Optimizer module provides class Optimizer to simplify a flattened
+netlist, so that the simulators evaluate fewer gates:
+
+  * constant folding: Nand(false, x) is true, Nand(true, x) is Not(x),
+    Not(Not(x)) is x and Nand(x, Not(x)) is true; a DFF which samples
+    false, or its own output, stays false
+  * hash-consing: the gates of the same inputs are merged into one, and so
+    are the DFFs of the same input
+  * dead gate elimination: the gates and the DFFs which no OUT pin nor
+    block depends on are removed (nor the wires to keep, given by name)
+
+The result is a netlist of the same pins, blocks, wires (but those of the
+nets removed) and instances.
+
+>>> netlist = flatten(ChipLibrary('../02'), 'ALU')
+>>> optimize(netlist)
+Netlist('ALU', nets=..., nands=..., dffs=0, blocks=0, depth=...)
+
+Run this file to report the gates of the chips of the projects before and
+after optimization (the memory chips used as parts being models, unless -g
+is given).
+"""
+
+import os
+import sys
+import time
+from array import array
+import Models
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import PROJECT_DIRS, NET_FALSE, NET_TRUE
+from Netlist import Netlist, flatten
+
+class Optimizer:
+    """
+    Optimize netlists; folded, merged and dead count the gates (and DFFs)
+    removed by each pass.
+    """
+    def __init__(self):
+        self.folded = self.merged = self.dead = 0
+
+    def optimize(self, netlist, keep=()):
+        if netlist.level_starts is None:
+            netlist.levelize()
+        dff_rep = {}
+        while True:
+            rep, gates, counts = self._fold(netlist, dff_rep)
+            new_rep = self._fold_dffs(netlist, rep)
+            if new_rep == dff_rep:
+                break
+            dff_rep = new_rep
+        self.folded += counts[0] + len(dff_rep)
+        self.merged += counts[1]
+        dffs = [(rep[d], q) for d, q in zip(netlist.dff_d, netlist.dff_q)
+                if q not in dff_rep]
+        blocks = [block.remap(rep) for block in netlist.blocks]
+        outputs = [(pin, [rep[n] for n in nets])
+                   for pin, nets in netlist.outputs]
+        kept = [rep[n] for wire in keep for n in netlist.wires[wire]]
+        gates, dffs = self._sweep(netlist.num_nets, gates, dffs, blocks,
+                                  outputs, kept)
+        return self._renumber(netlist, rep, gates, dffs, blocks, outputs)
+
+    def _fold(self, netlist, dff_rep):
+        """(rep, gates, (folded, merged)): rep[n] is the net computing the
+        value of net n, gates the arrays of the gates kept."""
+        rep = array('i', range(netlist.num_nets))
+        for q, r in dff_rep.items():
+            rep[q] = r
+        inverse = array('i', [-1]) * netlist.num_nets  # n = Not(inverse[n])
+        table = {}
+        gate_a, gate_b, gate_out = array('i'), array('i'), array('i')
+        folded = merged = 0
+        for a, b, out in netlist.gates():
+            a, b = rep[a], rep[b]
+            if a > b:
+                a, b = b, a
+            if a == NET_FALSE:
+                rep[out] = NET_TRUE
+                folded += 1
+                continue
+            if a == NET_TRUE:
+                if b == NET_TRUE:
+                    rep[out] = NET_FALSE
+                    folded += 1
+                    continue
+                a = b
+            if a == b and inverse[a] >= 0:
+                rep[out] = inverse[a]
+                folded += 1
+                continue
+            if a != b and (inverse[a] == b or inverse[b] == a):
+                rep[out] = NET_TRUE
+                folded += 1
+                continue
+            key = (a, b)
+            if key in table:
+                rep[out] = table[key]
+                merged += 1
+                continue
+            table[key] = out
+            if a == b:
+                inverse[out] = a
+            gate_a.append(a)
+            gate_b.append(b)
+            gate_out.append(out)
+        return rep, (gate_a, gate_b, gate_out), (folded, merged)
+
+    def _fold_dffs(self, netlist, rep):
+        """{q: net} of the DFFs which stay false or are merged."""
+        result, first = {}, {}
+        for d, q in zip(netlist.dff_d, netlist.dff_q):
+            d = rep[d]
+            if d == NET_FALSE or d == rep[q]:
+                result[q] = NET_FALSE
+            elif d in first:
+                result[q] = first[d]
+            else:
+                first[d] = q
+        return result
+
+    def _sweep(self, num_nets, gates, dffs, blocks, outputs, kept=()):
+        """The gates and DFFs which an OUT pin, a block or the nets kept
+        depend on."""
+        gate_a, gate_b, gate_out = gates
+        live = bytearray(num_nets)
+        for nets in ([nets for _, nets in outputs] +
+                     [nets for block in blocks for _, nets in block.inputs] +
+                     [kept]):
+            for net in nets:
+                live[net] = 1
+        changed = True
+        while changed:
+            for k in range(len(gate_out) - 1, -1, -1):
+                if live[gate_out[k]]:
+                    live[gate_a[k]] = live[gate_b[k]] = 1
+            changed = False
+            for d, q in dffs:
+                if live[q] and not live[d]:
+                    live[d] = 1
+                    changed = True
+        kept = [k for k in range(len(gate_out)) if live[gate_out[k]]]
+        live_dffs = [(d, q) for d, q in dffs if live[q]]
+        self.dead += (len(gate_out) - len(kept)) + (len(dffs) -
+                                                    len(live_dffs))
+        return ([array('i', [g[k] for k in kept]) for g in gates],
+                live_dffs)
+
+    def _renumber(self, netlist, rep, gates, dffs, blocks, outputs):
+        """The netlist of the nets in use, numbered from 0: constants,
+        inputs, then the outputs of the gates, DFFs and blocks."""
+        new = array('i', [-1]) * netlist.num_nets
+        count = 0
+        sources = [NET_FALSE, NET_TRUE] + netlist.input_nets + \
+                  list(gates[2]) + [q for _, q in dffs] + \
+                  [n for block in blocks for n in block.output_nets]
+        for net in sources:
+            new[net] = count
+            count += 1
+        def number(nets):
+            return [new[rep[n]] for n in nets]
+        wires = {}
+        for wire, nets in netlist.wires.items():
+            nets = number(nets)
+            if min(nets) >= 0:
+                wires[wire] = nets
+        renumbered = [array('i', [new[n] for n in g]) for g in gates]
+        result = Netlist(netlist.name, count,
+                         [(pin, number(nets)) for pin, nets in netlist.inputs],
+                         [(pin, number(nets)) for pin, nets in outputs],
+                         renumbered, ([new[d] for d, _ in dffs],
+                                      [new[q] for _, q in dffs]),
+                         [block.remap(new) for block in blocks], wires,
+                         netlist.instances)
+        return result.levelize()
+
+def optimize(netlist, keep=()):
+    """The optimized netlist, which has the wires keep."""
+    return Optimizer().optimize(netlist, keep)
+
+def report(gate_level=False, stream=None):
+    """Optimize the chips of the projects and report their gates, DFFs and
+    depths before and after."""
+    stream = stream or sys.stdout
+    blocks = None if gate_level else Models.blocks()
+    stream.write('%-12s %9s %9s %6s %6s %6s %6s %8s %8s %8s %7s\n'
+                 %('chip', 'nands', 'after', 'dffs', 'after', 'depth',
+                   'after', 'folded', 'merged', 'dead', 'time'))
+    total = [0, 0]
+    for directory in PROJECT_DIRS:
+        library = ChipLibrary(directory)
+        for name in sorted(f[:-4] for f in os.listdir(directory)
+                           if f.endswith('.hdl')):
+            netlist = flatten(library, name, blocks)
+            start = time.time()
+            optimizer = Optimizer()
+            result = optimizer.optimize(netlist)
+            total[0] += netlist.num_gates
+            total[1] += result.num_gates
+            stream.write('%-12s %9d %9d %6d %6d %6d %6d %8d %8d %8d %6.2fs\n'
+                         %(name, netlist.num_gates, result.num_gates,
+                           netlist.num_dffs, result.num_dffs, netlist.depth,
+                           result.depth, optimizer.folded, optimizer.merged,
+                           optimizer.dead, time.time() - start))
+    stream.write('%-12s %9d %9d\n' %('total', total[0], total[1]))
+
+if __name__ == '__main__':
+    report('-g' in sys.argv[1:])
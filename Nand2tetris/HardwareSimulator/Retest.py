@@ -0,0 +1,179 @@
+"""The Retest module runs again only the test scripts which an edit may have
+broken. For each script, the state file (STATE, in the cache of the
+Compiler) keeps the hashes of the files it depends on:
+
+  * the script (.tst) and its compare file (.cmp)
+  * the HDL of its chip and of all the chips used by it, directly or through
+    its parts (see ChipLibrary.dependencies)
+
+and whether it passed, for each mode of the simulators (the options -g, -w
+and -l). A script is run if one of these files changed (or went away), if
+it failed, or if it is new; so after an edit of Bit.hdl, only the scripts
+of the registers, the RAMs, the CPU and the computer run (17 of 38), and
+after an edit of Mux.hdl, those of the Muxes and of the ALU too (23):
+
+    script                          rows     time  result
+    03/a/Bit.tst                     216    0.03s  ok
+    ...
+    17 scripts, 17 passed, 0 failed in 1.16s (4 processes)
+    21 scripts unchanged
+
+>>> plan(find_tests(PROJECTS), load_state().get(''))
+[('.../03/a/Bit.tst', ['Bit.hdl']), ...]
+
+Run this file with directories as arguments (the projects 01 to 05 by
+default); -n lists the scripts to run and the files which changed without
+running them, -a runs all the scripts, and -j N, -g, -w and -l DIR are those
+of TestRunner.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+from ChipLibrary import ChipLibrary
+from Compiler import CACHE_DIR
+from HDLDefinitions import PROJECT_DIRS
+from HDLTokenizer import HDLError
+from TestRunner import PROJECTS, ROOT, find_tests, report, run_tests
+from TestScript import parse_script
+
+STATE = os.path.join(CACHE_DIR, 'retest.json')
+
+def file_hash(path, hashes=None):
+    """The sha1 of the content of file path (None if it is missing), from
+    the dict hashes if given."""
+    if hashes is not None and path in hashes:
+        return hashes[path]
+    try:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except IOError:
+        digest = None
+    if hashes is not None:
+        hashes[path] = digest
+    return digest
+
+def script_files(path, chips=None):
+    """The paths of the files the test script path depends on: the script,
+    its compare files and the HDL of its chip and of the chips it uses
+    (searched in directory chips first, if given)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    files = [os.path.abspath(path)]
+    with open(path) as f:
+        commands = parse_script(f.read(), path)
+    library = (ChipLibrary(chips, (directory,) + PROJECT_DIRS) if chips else
+               ChipLibrary(directory))
+    for words, _ in commands:
+        if words[0] == 'compare-to' and len(words) > 1:
+            files.append(os.path.join(directory, words[1]))
+        elif words[0] == 'load' and len(words) > 1:
+            name = os.path.splitext(words[1])[0]
+            for chip_name in sorted(library.dependencies(name) | {name}):
+                hdl = library.find(chip_name)
+                if hdl is not None:     # not a builtin chip
+                    files.append(os.path.abspath(hdl))
+    return files
+
+def load_state(path=STATE):
+    """{mode: {script path: {'passed': ..., 'files': {path: hash}}}}."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def save_state(state, path=STATE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '%s.%d.tmp' %(path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def plan(paths, state, chips=None, hashes=None):
+    """[(path, reasons)] of the scripts of paths to run: the names of the
+    files which changed since they passed, or why else; state is that of
+    a mode, {script path: entry}."""
+    hashes = {} if hashes is None else hashes
+    state = state or {}
+    selected = []
+    for path in paths:
+        entry = state.get(os.path.abspath(path))
+        try:
+            files = script_files(path, chips)
+        except (HDLError, IOError) as e:
+            selected.append((path, ['error: %s' %e]))
+            continue
+        if entry is None:
+            reasons = ['new']
+        else:
+            old = entry['files']
+            reasons = [os.path.basename(f) for f in files
+                       if old.get(f) != file_hash(f, hashes)]
+            reasons += [os.path.basename(f) + ' (gone)' for f in old
+                        if f not in files]
+            if not reasons and not entry['passed']:
+                reasons = ['failed']
+        if reasons:
+            selected.append((path, reasons))
+    return selected
+
+def record(state, results, chips=None, hashes=None):
+    """Store the results (TestResults) in state (that of a mode), with the
+    hashes of the files of their scripts."""
+    hashes = {} if hashes is None else hashes
+    for r in results:
+        try:
+            files = script_files(r.path, chips)
+        except (HDLError, IOError):
+            files = [os.path.abspath(r.path)]
+        state[os.path.abspath(r.path)] = {
+            'passed': r.passed,
+            'files': {f: file_hash(f, hashes) for f in files}}
+
+def main(args):
+    workers, gates, words, chips = os.cpu_count() or 1, False, False, None
+    dry_run, everything, directories = False, False, []
+    while args:
+        arg = args.pop(0)
+        if arg == '-j':
+            workers = int(args.pop(0))
+        elif arg == '-g':
+            gates = True
+        elif arg == '-w':
+            words = True
+        elif arg == '-l':
+            chips = os.path.abspath(args.pop(0))
+        elif arg == '-n':
+            dry_run = True
+        elif arg == '-a':
+            everything = True
+        else:
+            directories.append(arg)
+    mode = ' '.join(option for option, on in (('-g', gates), ('-w', words),
+                                              ('-l ' + str(chips), chips))
+                    if on)
+    paths = find_tests(directories or PROJECTS)
+    start = time.time()
+    hashes = {}                         # those seen by the scripts run
+    selected = plan(paths, None if everything else load_state().get(mode),
+                    chips, hashes)
+    if dry_run:
+        for path, reasons in selected:
+            print('%-30s %s' %(os.path.relpath(path, ROOT),
+                               ', '.join(reasons)))
+        print('%d scripts to run, %d unchanged'
+              %(len(selected), len(paths) - len(selected)))
+        return True
+    results = run_tests([path for path, _ in selected], workers, gates,
+                        chips, words) if selected else []
+    state = load_state()
+    record(state.setdefault(mode, {}), results, chips, hashes)
+    save_state(state)
+    report(results, time.time() - start, workers)
+    print('%d scripts unchanged' %(len(paths) - len(selected)))
+    return all(r.passed for r in results)
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -0,0 +1,253 @@
+"""The Simulator module provides class Simulator to simulate a netlist on
+lanes test vectors at once. The value of a net is an int whose bit k is the
+value of the net in vector k, so that a Nand gate is evaluated for all the
+vectors by mask ^ (a & b), mask being the ones of the lanes.
+
+The clock follows the hardware simulator of the course: tick evaluates the
+chip and the DFFs sample their inputs, tock commits the DFFs and evaluates
+the chip again. peek reads the state of a part (like DRegister[] in a test
+script, see TestScript).
+
+>>> sim = Simulator(flatten(ChipLibrary('../01'), 'Mux8Way16'), lanes=64)
+>>> sim.set_vectors('a', [random.getrandbits(16) for _ in range(64)])
+>>> ...
+>>> sim.eval()
+>>> sim.get_vectors('out')
+[...]
+
+"""
+
+from operator import itemgetter
+from HDLDefinitions import NET_TRUE
+from HDLTokenizer import HDLError
+
+def pack(vectors, width):
+    """The bit slices of vectors: a list of width ints, where bit j of slice
+    i is bit i of vectors[j]."""
+    return [int(''.join(['1' if v >> i & 1 else '0'
+                         for v in reversed(vectors)]) or '0', 2)
+            for i in range(width)]
+
+def unpack(slices, count):
+    """The count vectors of slices (the inverse of pack)."""
+    columns = [format(s, '0%db' %count)[::-1] for s in reversed(slices)]
+    return [int(''.join([c[j] for c in columns]) or '0', 2)
+            for j in range(count)]
+
+def counter_slices(width, count, start=0):
+    """The bit slices of the vectors start, start+1, ..., start+count-1,
+    where count is a power of two and start a multiple of count."""
+    slices = []
+    for i in range(width):
+        period = 1 << i
+        if period >= count:
+            slices.append((1 << count) - 1 if start >> i & 1 else 0)
+            continue
+        pattern, size = ((1 << period) - 1) << period, 2 * period
+        while size < count:
+            pattern |= pattern << size
+            size *= 2
+        slices.append(pattern)
+    return slices
+
+def table_rows(table, num_inputs, num_outputs):
+    """{input bits: output bits} of a lookup table (see Synthesis): the
+    bits as an itemgetter of the nets reads them (the output bit itself if
+    there is one), so that a lookup costs a getter and a dict instead of
+    packing and unpacking the words."""
+    rows = {}
+    for index, word in enumerate(table):
+        bits = tuple(index >> k & 1 for k in range(num_inputs))
+        outputs = tuple(word >> k & 1 for k in range(num_outputs))
+        rows[bits if num_inputs > 1 else bits[0]] = (
+            outputs if num_outputs > 1 else outputs[0])
+    return rows
+
+class Simulator:
+    """
+    Simulate netlist on lanes vectors. The value of the nets are in the list
+    values, the state of the DFFs in the list state. The blocks are
+    simulated by models[chip name]() (see Models), on one lane: a block is
+    evaluated after the gates of its level.
+    """
+    def __init__(self, netlist, lanes=1, models=None):
+        if netlist.level_starts is None:
+            netlist.levelize()
+        self.netlist = netlist
+        self.lanes = lanes
+        self.mask = (1 << lanes) - 1
+        self.models = {}                # block path: model
+        for block in netlist.blocks:
+            if models is None or block.chip_name not in models:
+                raise HDLError("%s: no model for %s" %(netlist.name, block))
+            if lanes != 1:
+                raise HDLError("%s: the models simulate one lane"
+                               %netlist.name)
+            self.models[block.path] = models[block.chip_name]()
+        self._steps = self._schedule()
+        self.reset()
+
+    def _schedule(self):
+        """[(gates, bits, tables, blocks)]: evaluate the gates, then the
+        lookup tables (the getter of the bits of the inputs, their rows, the
+        net of the output for bits, the nets of the outputs for tables, see
+        Synthesis), then the other (block, model)."""
+        netlist = self.netlist
+        gates = list(netlist.gates())
+        levels, rows = {}, {}
+        for block in netlist.blocks:
+            model = self.models[block.path]
+            bits, tables, blocks = levels.setdefault(block.level,
+                                                     ([], [], []))
+            if getattr(model, 'table', None) is not None:
+                inputs, outputs = block.combinational_nets, block.output_nets
+                if block.chip_name not in rows:
+                    rows[block.chip_name] = table_rows(
+                        model.table, len(inputs), len(outputs))
+                if len(outputs) == 1:
+                    bits.append((itemgetter(*inputs), rows[block.chip_name],
+                                 outputs[0]))
+                else:
+                    tables.append((itemgetter(*inputs),
+                                   rows[block.chip_name], outputs))
+            else:
+                blocks.append((block, model))
+        steps, lo = [], 0
+        for lv in sorted(levels):
+            hi = (netlist.level_starts[lv] if lv < len(netlist.level_starts)
+                  else len(gates))
+            steps.append((gates[lo:hi],) + levels[lv])
+            lo = hi
+        steps.append((gates[lo:], [], [], []))
+        return steps
+
+    def reset(self):
+        self.values = [0] * self.netlist.num_nets
+        self.values[NET_TRUE] = self.mask
+        self.state = [0] * self.netlist.num_dffs
+        self._sampled = self.state
+        self.time = 0
+        for model in self.models.values():
+            model.reset()
+
+    def set(self, pin, value):
+        """Set the value of input pin in all the lanes."""
+        values, mask = self.values, self.mask
+        for k, net in enumerate(self.netlist.pins[pin]):
+            values[net] = mask if value >> k & 1 else 0
+
+    def get(self, pin, lane=0):
+        """The value of pin (or of any wire of the netlist) in lane."""
+        values = self.values
+        return sum((values[net] >> lane & 1) << k
+                   for k, net in enumerate(self.netlist.wires[pin]))
+
+    def set_bits(self, pin, slices):
+        """Set input pin from its bit slices (see pack)."""
+        values = self.values
+        for net, s in zip(self.netlist.pins[pin], slices):
+            values[net] = s
+
+    def get_bits(self, pin):
+        return [self.values[net] for net in self.netlist.pins[pin]]
+
+    def set_vectors(self, pin, vectors):
+        """Set input pin to vectors[k] in lane k."""
+        self.set_bits(pin, pack(vectors, len(self.netlist.pins[pin])))
+
+    def get_vectors(self, pin):
+        return unpack(self.get_bits(pin), self.lanes)
+
+    def _pins(self, block):
+        values, pins = self.values, {}
+        for pin, nets in block.inputs:
+            value = 0
+            for net in reversed(nets):
+                value = value + value + values[net]
+            pins[pin] = value
+        return pins
+
+    def eval(self):
+        values, mask = self.values, self.mask
+        for q, s in zip(self.netlist.dff_q, self.state):
+            values[q] = s
+        for gates, bits, tables, blocks in self._steps:
+            for a, b, out in gates:
+                values[out] = mask ^ (values[a] & values[b])
+            for get, rows, out in bits:
+                values[out] = rows[get(values)]
+            for get, rows, outputs in tables:
+                for net, bit in zip(outputs, rows[get(values)]):
+                    values[net] = bit
+            for block, model in blocks:
+                outputs = model.eval(self._pins(block))
+                for pin, nets in block.outputs:
+                    value = outputs[pin]
+                    for k, net in enumerate(nets):
+                        values[net] = value >> k & 1
+
+    def tick(self):
+        """Evaluate, then let the DFFs and the models sample their inputs."""
+        self.eval()
+        values = self.values
+        self._sampled = [values[d] for d in self.netlist.dff_d]
+        for block in self.netlist.blocks:
+            model = self.models[block.path]
+            if model.clocked:
+                model.tick(self._pins(block))
+        self.time += 1
+
+    def tock(self):
+        """Commit the sampled inputs of the DFFs and the models, then
+        evaluate."""
+        self.state = self._sampled
+        for model in self.models.values():
+            model.tock()
+        self.eval()
+        self.time += 1
+
+    def part_path(self, chip_name):
+        """The path of the first part of chip chip_name nearest to the top."""
+        paths = [path for path, name in self.netlist.instances.items()
+                 if name == chip_name]
+        paths += [block.path for block in self.netlist.blocks
+                  if block.chip_name == chip_name and block.path not in paths]
+        if not paths:
+            raise HDLError("%s has no part %s" %(self.netlist.name,
+                                                 chip_name))
+        return min(paths, key=lambda path: path.count('/'))
+
+    def peek(self, chip_name, index=None):
+        """The state of the part of chip chip_name, as the hardware simulator
+        shows it: after a tick, the value the part takes at the next tock.
+        The parts built of gates have no addressable state, so index is
+        ignored unless the part is a memory."""
+        path = self.part_path(chip_name)
+        if path in self.models:
+            return self.models[path].peek(index)
+        if path + '.address' in self.netlist.wires:
+            raise HDLError("%s[%s]: no model for %s"
+                           %(chip_name, index, chip_name))
+        if self._sampled is self.state:
+            return self.get(path + '.out')
+        values, state = self.values, self.state
+        self.values, self.state = list(values), self._sampled
+        self.eval()
+        value = self.get(path + '.out')
+        self.values, self.state = values, state
+        return value
+
+    def poke(self, chip_name, index, value):
+        """Set the state of the part of chip chip_name (a model)."""
+        path = self.part_path(chip_name)
+        if path not in self.models:
+            raise HDLError("%s: the state of a part built of gates can not "
+                           "be set" %chip_name)
+        self.models[path].poke(index, value)
+
+    def load(self, chip_name, path):
+        """Load the part of chip chip_name (a ROM32K) from file path."""
+        model = self.models.get(self.part_path(chip_name))
+        if not hasattr(model, 'load'):
+            raise HDLError("%s can not load %s" %(chip_name, path))
+        model.load(path)
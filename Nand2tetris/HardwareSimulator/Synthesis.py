@@ -0,0 +1,206 @@
+"""The Synthesis module synthesizes the lookup tables of the small
+combinational chips, so that a Simulator (or a CompiledSimulator) evaluates
+each of their parts by one lookup instead of their Nand gates. table[index]
+of a chip is the word of its outputs (the bits of its OUT pins in order,
+from bit 0), index being the word of its inputs:
+
+    FullAdder: a, b, c -> sum, carry
+    table[0b011] = 0b10                 # a=1, b=1, c=0: sum=0, carry=1
+
+A part is a lookup table if its chip has at most max_inputs input bits
+(12 by default, a table of 4096 words), no DFF nor block, and more Nands
+than input and output bits, a lookup costing about a step by bit where the
+gates cost one by Nand; else it is flattened to gates as usual. So the
+Muxes, Xors, FullAdders and Or8Ways of the CPU and the DMux8Ways of the RAMs
+are tables, while Not, And and Or stay gates. The tables are computed by
+simulating the chip on all its inputs at once (one lane for each); the
+Simulator reads the bits of the inputs of a part with one itemgetter and
+looks them up in a dict (see Simulator.table_rows), the CompiledSimulator
+indexes the table by the word of its inputs.
+
+>>> sim = simulator(ChipLibrary('../02'), 'ALU')
+>>> sim.netlist
+Netlist('ALU', nets=..., nands=..., dffs=0, blocks=..., depth=...)
+
+Run this file to compare the time spent in the evals of test scripts by the
+Simulator and the CompiledSimulator of the gates and by those of the lookup
+tables (the evals of ALU.tst take 1.8x less time with the tables on the
+Simulator, those of CPU.tst 1.4x less; 1.1x on the CompiledSimulator, whose
+gates cost less).
+"""
+
+import os
+import sys
+import time
+from array import array
+import Models
+from ChipLibrary import ChipLibrary
+import Compiler
+from Compiler import CompiledSimulator, compile_chip
+from HDLTokenizer import HDLError
+from Netlist import Flattener, flatten
+from Simulator import Simulator, counter_slices
+from TestScript import TestScript
+
+MAX_INPUTS = 12
+MAX_OUTPUTS = 64                        # the bits of a word of the table
+
+class LookupTable:
+    """
+    The model of a combinational chip: table is the array of the words of
+    its outputs, indexed by the words of its inputs, and rows the tuples of
+    their bits; inputs and outputs are the (pin, width) of the chip. The
+    simulators look the table up themselves.
+    """
+    table = None
+    rows = None
+    inputs = ()
+    outputs = ()
+    clocked = ()
+
+    def reset(self):
+        pass
+
+    def eval(self, pins):
+        index, shift = 0, 0
+        for pin, width in self.inputs:
+            index |= pins[pin] << shift
+            shift += width
+        word = self.table[index]
+        outputs = {}
+        for pin, width in self.outputs:
+            outputs[pin] = word & ((1 << width) - 1)
+            word >>= width
+        return outputs
+
+    def tick(self, pins):
+        pass
+
+    def tock(self):
+        return False
+
+    def peek(self, index=None):
+        raise HDLError("%s has no state" %type(self).__name__)
+
+    def poke(self, index, value):
+        raise HDLError("%s has no state" %type(self).__name__)
+
+def truth_table(netlist):
+    """The array of the words of the outputs of netlist (combinational) for
+    all the words of its inputs."""
+    width = len(netlist.input_nets)
+    count = 1 << width
+    sim = Simulator(netlist, lanes=count)
+    slices = counter_slices(width, count)
+    k = 0
+    for pin, nets in netlist.inputs:
+        sim.set_bits(pin, slices[k:k + len(nets)])
+        k += len(nets)
+    sim.eval()
+    table = array('Q', bytes(8 * count))
+    for position, net in enumerate(netlist.output_nets):
+        lanes = format(sim.values[net], '0%db' %count)[::-1]
+        bit = 1 << position
+        index = lanes.find('1')
+        while index >= 0:
+            table[index] |= bit
+            index = lanes.find('1', index + 1)
+    return table
+
+def choose(library, name, max_inputs=MAX_INPUTS):
+    """{chip name: netlist} of the chips used by chip name which are worth
+    a lookup table."""
+    flattener = Flattener(library, names=False)
+    chosen = {}
+    for part_name in sorted(library.dependencies(name)):
+        chip = library.chip(part_name)
+        if (chip.builtin is not None or part_name in Models.MODELS or
+                chip.input_width > max_inputs):
+            continue
+        netlist = flattener.netlist(part_name)
+        bits = len(netlist.input_nets) + len(netlist.output_nets)
+        if (netlist.num_dffs == 0 and not netlist.blocks and
+                len(netlist.output_nets) <= MAX_OUTPUTS and
+                netlist.num_gates > bits):
+            chosen[part_name] = netlist
+    return chosen
+
+def lookup_models(library, name, max_inputs=MAX_INPUTS):
+    """Models.MODELS and the LookupTables of the chips chosen for chip
+    name."""
+    models = dict(Models.MODELS)
+    for part_name, netlist in choose(library, name, max_inputs).items():
+        chip = library.chip(part_name)
+        table = truth_table(netlist)
+        width = len(netlist.output_nets)
+        models[part_name] = type(part_name + 'Table', (LookupTable,), {
+            'table': table,
+            'rows': tuple(tuple(word >> k & 1 for k in range(width))
+                          for word in table),
+            'inputs': chip.inputs,
+            'outputs': chip.outputs})
+    return models
+
+def simulator(library, name, max_inputs=MAX_INPUTS):
+    """A Simulator of chip name whose small parts are lookup tables, and
+    the memories models."""
+    models = lookup_models(library, name, max_inputs)
+    return Simulator(flatten(library, name, Models.blocks(models)),
+                     models=models)
+
+def compiled_simulator(library, name, max_inputs=MAX_INPUTS):
+    """A CompiledSimulator of chip name whose small parts are lookup
+    tables."""
+    models = lookup_models(library, name, max_inputs)
+    return CompiledSimulator(compile_chip(library, name, models),
+                             models=models)
+
+def _timed(sim, times):
+    """Count the time of the evals of sim in times[0]."""
+    evaluate = sim.eval
+    def eval():
+        start = time.perf_counter()
+        evaluate()
+        times[0] += time.perf_counter() - start
+    sim.eval = eval
+
+def compare(paths, runs=20, stream=None):
+    """Run the test scripts paths runs times on the simulators of the gates
+    and on those of the lookup tables (built once), and report the time of
+    the evals of the fastest run (the rest of a script costs the same with
+    both)."""
+    stream = stream or sys.stdout
+    stream.write('%-14s %5s %6s %6s %7s %7s %5s %8s %7s %5s\n'
+                 %('script', 'rows', 'nands', 'tables', 'gates', 'tables',
+                   'gain', 'compiled', 'tables', 'gain'))
+    for path in paths:
+        library = ChipLibrary(os.path.dirname(os.path.abspath(path)))
+        name = os.path.splitext(os.path.basename(path))[0]
+        sims = [Models.simulator(library, name), simulator(library, name),
+                Compiler.compiled_simulator(library, name),
+                compiled_simulator(library, name)]
+        times = []
+        for sim in sims:
+            def backend(library, name):
+                sim.reset()
+                return sim
+            elapsed, best = [0.0], None
+            _timed(sim, elapsed)
+            for _ in range(runs):
+                elapsed[0] = 0.0
+                rows = TestScript(path, backend).run()
+                best = min(best or elapsed[0], elapsed[0])
+            times.append(1000 * best)
+        stream.write('%-14s %5d %6d %6d %5.1fms %5.1fms %4.1fx %6.2fms '
+                     '%5.2fms %4.1fx\n'
+                     %(os.path.basename(path), rows, sims[0].netlist.num_gates,
+                       sum(1 for model in sims[1].models.values()
+                           if isinstance(model, LookupTable)),
+                       times[0], times[1], times[0] / times[1],
+                       times[2], times[3], times[2] / times[3]))
+
+if __name__ == '__main__':
+    tests = ['FullAdder', 'Add16', 'ALU', 'DMux8Way', 'Mux8Way16', 'PC',
+             'CPU']
+    compare(sys.argv[1:] or
+            [ChipLibrary().find(name)[:-4] + '.tst' for name in tests])
@@ -0,0 +1,146 @@
+"""The TestRunner module runs all the test scripts (.tst) of chips found under
+some directories in a pool of processes, each script on a CompiledSimulator
+of its chip (see Compiler), and reports the result and the time of each one:
+
+    script                          rows     time  result
+    01/And.tst                         5    0.01s  ok
+    ...
+    05/Memory.tst                     54    0.02s  ok
+    38 scripts, 38 passed, 0 failed in 0.97s (4 processes)
+
+>>> results = run_tests(find_tests(['../01', '../02']))
+>>> all(r.passed for r in results)
+True
+
+Run this file with directories as arguments (the projects 01 to 05 by
+default); -j N runs N processes (the number of CPUs by default), -g
+simulates the chips built of gates with the Simulator instead (but RAM4K,
+RAM16K and the memory maps, whose scripts are skipped, see gate_level), -w
+simulates the bus parts on words (Models.WORD_MODELS), and -l DIR uses the
+chips of DIR instead of those of the projects, such as ../02/lookahead:
+
+    python TestRunner.py -l ../02/lookahead ../02 ../05
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import Models
+from Compiler import compiled_simulator
+from HDLTokenizer import HDLError
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import PROJECT_DIRS
+from TestScript import ChipTooLarge, TestScript, gate_level, parse_script
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECTS = [os.path.join(ROOT, d) for d in ('01', '02', '03', '04', '05')]
+
+class TestResult:
+    def __init__(self, path, passed, rows, elapsed, message='',
+                 skipped=False):
+        self.path = path
+        self.passed = passed
+        self.rows = rows
+        self.elapsed = elapsed
+        self.message = message
+        self.skipped = skipped
+
+    def __repr__(self):
+        return 'TestResult(%r, %s)' %(self.path,
+                                      'ok' if self.passed else 'failed')
+
+def chip_test(path):
+    """Whether the script path tests a chip: it loads an .hdl (not a program
+    for the CPU emulator, like the scripts of project 04)."""
+    with open(path) as f:
+        commands = parse_script(f.read(), path)
+    for words, _ in commands:
+        if words[0] == 'load' and len(words) > 1:
+            return words[1].endswith('.hdl')
+    return False
+
+def find_tests(directories):
+    """The paths of the chip test scripts under directories, in order."""
+    paths = []
+    for directory in directories:
+        for parent, dirs, files in os.walk(directory):
+            dirs.sort()
+            paths.extend(os.path.join(parent, f) for f in sorted(files)
+                         if f.endswith('.tst') and
+                         chip_test(os.path.join(parent, f)))
+    return paths
+
+def word_level(library, name):
+    """A CompiledSimulator of chip name, its bus parts being word chips."""
+    return compiled_simulator(library, name, models=dict(
+        Models.MODELS, **Models.WORD_MODELS))
+
+def run_test(path, gates=False, chips=None, words=False):
+    """The TestResult of the test script path; the chips are searched in
+    directory chips first, if given. Any error fails the script alone."""
+    start = time.time()
+    library = (ChipLibrary(chips, (os.path.dirname(os.path.abspath(path)),) +
+                           PROJECT_DIRS) if chips else None)
+    backend = (gate_level if gates else word_level if words else
+               compiled_simulator)
+    script = TestScript(path, backend, library=library)
+    try:
+        rows = script.run()
+        return TestResult(path, True, rows, time.time() - start)
+    except ChipTooLarge as e:
+        return TestResult(path, True, 0, time.time() - start, str(e), True)
+    except (HDLError, IOError) as e:
+        return TestResult(path, False, script.compared, time.time() - start,
+                          str(e))
+    except Exception as e:              # a bug, kept from the other scripts
+        return TestResult(path, False, script.compared, time.time() - start,
+                          '%s: %s' %(type(e).__name__, e))
+
+def run_tests(paths, workers=None, gates=False, chips=None, words=False):
+    """The TestResults of paths, run by workers processes."""
+    if workers == 1:
+        return [run_test(path, gates, chips, words) for path in paths]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(run_test, paths, [gates] * len(paths),
+                             [chips] * len(paths), [words] * len(paths)))
+
+def report(results, elapsed, workers, stream=None):
+    stream = stream or sys.stdout
+    stream.write('%-30s %6s %8s  %s\n' %('script', 'rows', 'time', 'result'))
+    for r in results:
+        stream.write('%-30s %6d %7.2fs  %s\n'
+                     %(os.path.relpath(r.path, ROOT), r.rows, r.elapsed,
+                       'skipped: ' + r.message if r.skipped else
+                       'ok' if r.passed else
+                       'FAILED: ' + r.message.replace('\n', '\n' + ' ' * 50)))
+    failed = sum(1 for r in results if not r.passed)
+    skipped = sum(1 for r in results if r.skipped)
+    stream.write('%d scripts, %d passed, %d failed%s in %.2fs (%d processes)\n'
+                 %(len(results), len(results) - failed - skipped, failed,
+                   ', %d skipped' %skipped if skipped else '', elapsed,
+                   workers))
+
+def main(args):
+    workers, gates, chips, directories = os.cpu_count() or 1, False, None, []
+    words = False
+    while args:
+        arg = args.pop(0)
+        if arg == '-j':
+            workers = int(args.pop(0))
+        elif arg == '-g':
+            gates = True
+        elif arg == '-w':
+            words = True
+        elif arg == '-l':
+            chips = os.path.abspath(args.pop(0))
+        else:
+            directories.append(arg)
+    start = time.time()
+    results = run_tests(find_tests(directories or PROJECTS), workers, gates,
+                        chips, words)
+    report(results, time.time() - start, workers)
+    return all(r.passed for r in results)
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1:]) else 1)
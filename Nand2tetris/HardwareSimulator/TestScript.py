@@ -0,0 +1,414 @@
+"""The TestScript module provides class TestScript to run a test script (.tst)
+of the hardware simulator of the course on a Simulator of the chip. The rows
+of the output are formatted as the hardware simulator does, and each row is
+compared with the compare file (.cmp) as soon as it is output: the script
+stops at the first row which differs, by raising ComparisonError.
+
+The commands of the scripts are:
+
+  * load, output-file, compare-to and output-list
+  * set (of a pin, or of the state of a part like RAM16K[5]), eval, tick,
+    tock, ticktock and output
+  * repeat n {...} and while condition {...}
+  * echo and clear-echo
+  * <part> load <file> (like ROM32K load Max.hack)
+
+The state of a part, like DRegister[] or RAM16K[0], is the state of the
+first part of that chip nearest to the top (see Simulator.peek). By
+default the memory chips used as parts are simulated by their models (see
+Models); the backend gate_level flattens them to gates instead, down to
+RAM512: RAM4K, RAM16K and the memory maps (Models.LARGE_MODELS) are still
+their models, and the scripts of RAM4K and RAM16K themselves are skipped
+(ChipTooLarge). When an
+echo asks to hold down a key, the key is pressed on the Keyboard until the
+next clear-echo.
+
+>>> script = TestScript('../03/a/PC.tst')
+>>> script.run()                        # the number of rows compared
+31
+
+Run this file with test scripts as arguments to run them; with -o, the
+output file of each script is written too; with -g the chips are
+simulated at gate level, and with -O their netlists are optimized (see
+Optimizer). With -w FILE, the wires selected by the options -s PATTERN
+(the pins of the chip by default) are dumped to the VCD file FILE (see
+Waveform), which takes a single test script:
+
+    python TestScript.py -w PC.vcd -s '*' ../03/a/PC.tst
+"""
+
+import os
+import re
+import sys
+import time
+from ChipLibrary import ChipLibrary
+from HDLTokenizer import HDLError
+import Models
+from Models import simulator
+from Netlist import flatten
+from Optimizer import optimize
+from Simulator import Simulator
+from Waveform import Waveform
+
+MAX_LOOPS = 1000000
+
+_TOKEN = re.compile(r'//[^\n]*|/\*.*?\*/|"([^"\n]*)"|([,;!{}])|'
+                    r'([^\s,;!{}"/]+|/)', re.S)
+
+class ScriptError(HDLError):
+    pass
+
+class ComparisonError(ScriptError):
+    def __init__(self, filename, line, expected, got):
+        ScriptError.__init__(self, "%s: comparison failure at line %d\n"
+                          "expected: %s\ngot:      %s"
+                          %(filename, line, expected, got))
+        self.line = line
+        self.expected = expected
+        self.got = got
+
+class ChipTooLarge(ScriptError):
+    pass
+
+def gate_level(library, name):
+    """A Simulator of chip name flattened to gates, but the parts in
+    Models.LARGE_MODELS."""
+    if name in Models.LARGE_MODELS:
+        raise ChipTooLarge("%s is too large to be simulated at gate level"
+                           %name)
+    return simulator(library, name, Models.LARGE_MODELS)
+
+def optimized(library, name):
+    """A Simulator of the optimized netlist of chip name."""
+    return Simulator(optimize(flatten(library, name, Models.blocks())),
+                     models=Models.MODELS)
+
+def parse_value(text):
+    """The value of a constant of a script: %B0101, %XFF, %D-1 or -1."""
+    try:
+        if text[:2] in ('%B', '%X', '%D'):
+            return int(text[2:], {'B': 2, 'X': 16, 'D': 10}[text[1]])
+        return int(text)
+    except ValueError:
+        raise HDLError("bad value %s" %text)
+
+def _tokenize(text, filename):
+    """The list of (token, is_string, line) of text."""
+    tokens, line, last = [], 1, 0
+    for m in _TOKEN.finditer(text):
+        line += text.count('\n', last, m.start())
+        last = m.end()
+        if m.group(1) is not None:
+            tokens.append((m.group(1), True, line))
+        elif m.group(2) or m.group(3):
+            tokens.append((m.group(2) or m.group(3), False, line))
+        line += m.group().count('\n')
+    return tokens
+
+def parse_script(text, filename='<script>'):
+    """The commands of text: a list of (words, line), where the words of
+    repeat and while end with the list of the commands of the loop."""
+    tokens = _tokenize(text, filename)
+    commands, pos = _parse_commands(tokens, 0, filename)
+    if pos < len(tokens):
+        raise ScriptError("%s, line %d: unexpected }"
+                          %(filename, tokens[pos][2]))
+    return commands
+
+def _parse_commands(tokens, pos, filename):
+    commands = []
+    while pos < len(tokens) and tokens[pos][0] != '}':
+        token, _, line = tokens[pos]
+        if token in ',;!':
+            pos += 1
+            continue
+        words = []
+        while pos < len(tokens) and tokens[pos][0] not in ',;!{}':
+            words.append(tokens[pos][0])
+            pos += 1
+        if words[0] in ('repeat', 'while'):
+            if pos == len(tokens) or tokens[pos][0] != '{':
+                raise ScriptError("%s, line %d: expected {" %(filename, line))
+            body, pos = _parse_commands(tokens, pos + 1, filename)
+            if pos == len(tokens):
+                raise ScriptError("%s, line %d: expected }" %(filename, line))
+            words.append(body)
+            pos += 1
+        commands.append((words, line))
+    return commands, pos
+
+class OutputColumn:
+    """
+    A variable of output-list: name%F<left>.<width>.<right>, the format F
+    being B (binary), X (hex), D (decimal) or S (string).
+    """
+    def __init__(self, spec, bits):
+        self.name, _, form = spec.partition('%')
+        self.bits = bits
+        try:
+            if form:
+                self.format = form[0]
+                self.left, self.width, self.right = map(int,
+                                                        form[1:].split('.'))
+            else:
+                self.format, self.left, self.width, self.right = \
+                    'B', 1, bits, 1
+        except ValueError:
+            raise HDLError("bad output format %s" %spec)
+        if self.format not in 'BXDS':
+            raise HDLError("bad output format %s" %spec)
+
+    def header(self):
+        space = self.left + self.width + self.right
+        name = self.name[:space]
+        left = (space - len(name)) // 2
+        return ' ' * left + name + ' ' * (space - left - len(name))
+
+    def cell(self, value):
+        width = self.width
+        if self.format == 'S':
+            text = str(value).ljust(width)
+        elif self.format == 'D':
+            if self.bits >= 16 and value >> 15 & 1:
+                value -= 1 << 16
+            text = str(value).rjust(width)
+        elif self.format == 'B':
+            text = format(value & ((1 << width) - 1), '0%db' %width)
+        else:
+            text = '%0*X' %(width, value & ((1 << 4 * width) - 1))
+        return ' ' * self.left + text + ' ' * self.right
+
+class TestScript:
+    """
+    Run the test script path on the simulator returned by backend(library,
+    chip name) for the chip loaded by the script, found in library (by
+    default, in the directory of the script and in the projects). The
+    echoed messages are written to stream (if given), the output to the
+    output file if write_output is True, and the wires to waveform (a
+    Waveform) if given; coverage (a Coverage) records the nets toggled.
+    """
+    def __init__(self, path, backend=None, write_output=False, stream=None,
+                 library=None, waveform=None, coverage=None):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.backend = backend or simulator
+        self.write_output = write_output
+        self.stream = stream
+        self.library = library or ChipLibrary(self.directory)
+        self.waveform = waveform
+        self.coverage = coverage
+        self.probes = [p for p in (waveform, coverage) if p is not None]
+        self.sim = None
+        self.columns = []
+        self.compared = 0               # the rows compared so far
+        self._compare = None
+        self._compare_line = 0
+        self._output = None
+
+    def run(self):
+        """Run the script; return the number of rows compared."""
+        with open(self.path) as f:
+            commands = parse_script(f.read(), self.path)
+        try:
+            self.execute(commands)
+        finally:
+            for f in [self._compare, self._output] + self.probes:
+                if f is not None:
+                    f.close()
+        return self.compared
+
+    def error(self, line, message):
+        raise ScriptError("%s, line %d: %s" %(self.path, line, message))
+
+    def execute(self, commands):
+        for words, line in commands:
+            try:
+                self.command(words, line)
+            except ScriptError:
+                raise
+            except HDLError as e:
+                self.error(line, str(e))
+
+    def command(self, words, line):
+        name, args = words[0], words[1:]
+        sim = self.sim
+        if name == 'repeat':
+            count = parse_value(args[0]) if len(args) == 2 else MAX_LOOPS
+            for _ in range(count):
+                self.execute(args[-1])
+        elif name == 'while':
+            if len(args) != 4:
+                self.error(line, "expected while <variable> <op> <value>")
+            for _ in range(MAX_LOOPS):
+                if not self.condition(*args[:3]):
+                    return
+                self.execute(args[3])
+            self.error(line, "the loop does not end after %d iterations"
+                       %MAX_LOOPS)
+        elif name == 'load' and args:
+            self.load(args[0])
+        elif name == 'output-file':
+            if self.write_output:
+                self._output = open(self.file(args[0]), 'w')
+        elif name == 'compare-to':
+            self._compare = open(self.file(args[0]))
+            self._compare_line = 0
+        elif name == 'output-list':
+            self.columns = [OutputColumn(spec, self.bits(spec.split('%')[0]))
+                            for spec in args]
+            self.output('|'.join(c.header() for c in self.columns))
+        elif name == 'echo':
+            if self.stream:
+                self.stream.write(' '.join(args) + '\n')
+            m = re.search(r"hold down (?:the )?'(.)'", ' '.join(args), re.I)
+            if m and sim is not None:
+                self.press(ord(m.group(1)))
+        elif name == 'clear-echo':
+            if sim is not None:
+                self.press(0)
+        elif sim is None:
+            self.error(line, "no chip loaded")
+        elif name == 'set' and len(args) == 2:
+            self.set(args[0], parse_value(args[1]))
+        elif name == 'eval':
+            sim.eval()
+            self.sample()
+        elif name == 'tick':
+            sim.tick()
+            self.sample()
+        elif name == 'tock':
+            sim.tock()
+            self.sample()
+        elif name == 'ticktock':
+            sim.tick()
+            self.sample()
+            sim.tock()
+            self.sample()
+        elif name == 'output':
+            self.output('|'.join(c.cell(self.value(c.name))
+                                 for c in self.columns))
+        elif len(args) == 2 and args[0] == 'load':
+            sim.load(name, self.file(args[1]))
+        else:
+            self.error(line, "unknown command %s" %' '.join(words))
+
+    def file(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self, filename):
+        name = os.path.splitext(filename)[0]
+        self.sim = self.backend(self.library, name)
+        for probe in self.probes:
+            probe.attach(self.sim)
+
+    def sample(self):
+        for probe in self.probes:
+            probe.sample()
+
+    def press(self, key):
+        """Hold down key on the Keyboard of the chip (if any)."""
+        try:
+            self.sim.poke('Keyboard', None, key)
+        except HDLError:
+            pass
+
+    def output(self, row):
+        row = '|' + row + '|'
+        if self._output is not None:
+            self._output.write(row + '\n')
+        if self._compare is None:
+            return
+        expected = self._compare.readline().rstrip()
+        self._compare_line += 1
+        if len(expected) != len(row) or any(e != g and e != '*'
+                                            for e, g in zip(expected, row)):
+            raise ComparisonError(self.path, self._compare_line, expected,
+                                  row)
+        self.compared += 1
+
+    def _reference(self, name):
+        """(chip name, index) if name is the state of a part, or None."""
+        m = re.match(r'(\w+)\[(\d*)\]$', name)
+        if m is None or name in self.sim.netlist.wires:
+            return None
+        return m.group(1), int(m.group(2)) if m.group(2) else None
+
+    def bits(self, name):
+        if name == 'time':
+            return 0
+        if self.sim is not None and name in self.sim.netlist.wires:
+            return len(self.sim.netlist.wires[name])
+        return 16
+
+    def value(self, name):
+        sim = self.sim
+        if name == 'time':
+            return '%d%s' %(sim.time // 2, '+' if sim.time % 2 else '')
+        ref = self._reference(name)
+        if ref is not None:
+            return sim.peek(*ref)
+        if name not in sim.netlist.wires:
+            raise HDLError("%s has no pin %s" %(sim.netlist.name, name))
+        return sim.get(name)
+
+    def set(self, name, value):
+        sim = self.sim
+        ref = self._reference(name)
+        if ref is not None:
+            sim.poke(ref[0], ref[1], value & 0xFFFF)
+        elif name in sim.netlist.pins and name not in dict(
+                sim.netlist.outputs):
+            sim.set(name, value & ((1 << len(sim.netlist.pins[name])) - 1))
+        else:
+            raise HDLError("%s has no input pin %s" %(sim.netlist.name, name))
+
+    def condition(self, name, op, text):
+        value, other = self.value(name), parse_value(text)
+        if self.bits(name) >= 16 and value >> 15 & 1:
+            value -= 1 << 16
+        if op == '=':
+            return value == other
+        if op == '<>':
+            return value != other
+        if op == '<':
+            return value < other
+        if op == '>':
+            return value > other
+        if op == '<=':
+            return value <= other
+        if op == '>=':
+            return value >= other
+        raise HDLError("bad operator %s" %op)
+
+def main(args):
+    write_output = '-o' in args
+    backend = (gate_level if '-g' in args else
+               optimized if '-O' in args else simulator)
+    vcd, patterns, paths = None, None, []
+    while args:
+        arg = args.pop(0)
+        if arg == '-w':
+            vcd = args.pop(0)
+        elif arg == '-s':
+            patterns = (patterns or []) + [args.pop(0)]
+        elif arg not in ('-o', '-g', '-O'):
+            paths.append(arg)
+    if vcd and len(paths) > 1:
+        print('-w %s takes a single test script, not %d' %(vcd, len(paths)))
+        return False
+    passed = True
+    for path in paths:
+        start = time.time()
+        waveform = Waveform(vcd, patterns) if vcd else None
+        try:
+            rows = TestScript(path, backend, write_output, sys.stdout,
+                              waveform=waveform).run()
+            print('%s: %d rows compared successfully (%.2fs)'
+                  %(path, rows, time.time() - start))
+        except (HDLError, IOError) as e:
+            print(e)
+            passed = False
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -0,0 +1,122 @@
+"""The TruthTable module provides function truth_table to compute the whole
+truth table of a small combinational chip with NumPy, and function verify
+to check it against a reference function (see reference).
+
+Every input combination of the chip is a row: the value of each net is a
+boolean array of 2**n rows (n input bits, at most MAX_INPUT_BITS), and each
+Nand gate is one operation on whole arrays. The array of a net is dropped
+after the last gate which reads it.
+
+>>> netlist = flatten(ChipLibrary('../02'), 'FullAdder')
+>>> truth_table(netlist)['sum']
+array([0, 1, 1, 0, 1, 0, 0, 1])
+>>> verify(netlist, reference.FullAdder)
+(8, [])
+
+Run this file to check every chip of 01 and 02 with at most MAX_INPUT_BITS
+input bits.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import reference
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import PROJECT_DIRS, NET_FALSE, NET_TRUE
+from HDLTokenizer import HDLError
+from Netlist import flatten
+from Verifier import Mismatch, MAX_MISMATCHES
+
+MAX_INPUT_BITS = 20
+
+def input_columns(netlist):
+    """{pin: int64 array of the values of pin in each row}; the first input
+    bit changes at each row."""
+    bits = len(netlist.input_nets)
+    if bits > MAX_INPUT_BITS:
+        raise HDLError("%s has %d input bits (more than %d)"
+                       %(netlist.name, bits, MAX_INPUT_BITS))
+    rows = np.arange(1 << bits, dtype=np.int64)
+    columns, offset = {}, 0
+    for pin, nets in netlist.inputs:
+        columns[pin] = (rows >> offset) & ((1 << len(nets)) - 1)
+        offset += len(nets)
+    return columns
+
+def evaluate(netlist, columns):
+    """{pin: int64 array} of the OUT pins, for the rows of columns."""
+    if netlist.level_starts is None:
+        netlist.levelize()
+    if netlist.dff_q or netlist.blocks:
+        raise HDLError("%s is not combinational" %netlist.name)
+    rows = len(next(iter(columns.values())))
+    values = {NET_FALSE: np.zeros(rows, dtype=bool),
+              NET_TRUE: np.ones(rows, dtype=bool)}
+    for pin, nets in netlist.inputs:
+        for k, net in enumerate(nets):
+            values[net] = ((columns[pin] >> k) & 1).astype(bool)
+    # the last gate reading each net, so that its array can be dropped
+    keep = set(netlist.output_nets) | {NET_FALSE, NET_TRUE}
+    last = {}
+    for k, (a, b, _) in enumerate(netlist.gates()):
+        last[a] = last[b] = k
+    dead = [[] for _ in range(netlist.num_gates)]
+    for net, k in last.items():
+        if net not in keep:
+            dead[k].append(net)
+    for k, (a, b, out) in enumerate(netlist.gates()):
+        values[out] = ~(values[a] & values[b])
+        for net in dead[k]:
+            del values[net]
+    result = {}
+    for pin, nets in netlist.outputs:
+        column = np.zeros(rows, dtype=np.int64)
+        for k, net in enumerate(nets):
+            column |= values[net].astype(np.int64) << k
+        result[pin] = column
+    return result
+
+def truth_table(netlist):
+    return evaluate(netlist, input_columns(netlist))
+
+def verify(netlist, function):
+    """Check all the rows of netlist against function. Return (the number
+    of rows, [Mismatch])."""
+    columns = input_columns(netlist)
+    got = evaluate(netlist, columns)
+    expected = reference.call(function, columns)
+    wrong = np.zeros(len(next(iter(columns.values()))), dtype=bool)
+    for pin in got:
+        wrong |= got[pin] != expected[pin]
+    mismatches = [Mismatch({pin: int(c[row]) for pin, c in columns.items()},
+                           {pin: int(expected[pin][row]) for pin in got},
+                           {pin: int(got[pin][row]) for pin in got})
+                  for row in np.flatnonzero(wrong)[:MAX_MISMATCHES]]
+    return len(wrong), mismatches
+
+def verify_projects(stream=None):
+    stream = stream or sys.stdout
+    passed = True
+    stream.write('%-12s %6s %10s %10s  %s\n' %('chip', 'bits', 'rows', 'time',
+                                              'result'))
+    for directory in PROJECT_DIRS[:2]:
+        library = ChipLibrary(directory)
+        for name in sorted(f[:-4] for f in os.listdir(directory)
+                           if f.endswith('.hdl')):
+            if name not in reference.CHIPS:
+                continue
+            netlist = flatten(library, name)
+            if len(netlist.input_nets) > MAX_INPUT_BITS:
+                continue
+            start = time.time()
+            rows, mismatches = verify(netlist, reference.CHIPS[name])
+            passed = passed and not mismatches
+            stream.write('%-12s %6d %10d %8.1fms  %s\n'
+                         %(name, len(netlist.input_nets), rows,
+                           1000 * (time.time() - start),
+                           mismatches[0] if mismatches else 'ok'))
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if verify_projects() else 1)
@@ -0,0 +1,128 @@
+"""The Verifier module provides function verify to check a combinational chip
+against its reference function (see reference), lanes vectors at a time
+with the bit-parallel Simulator:
+
+  * on all the input vectors, if the chip has at most EXHAUSTIVE_BITS input
+    bits (the vectors are counted in bit slices, with no packing)
+  * on count random vectors otherwise
+
+>>> library = ChipLibrary('../02')
+>>> verify(flatten(library, 'ALU'), reference.ALU, count=100000)
+(100000, [])
+
+The reference function is called once for each batch, on the NumPy arrays
+of its vectors, and the inputs are set from their bit slices (a counter, or
+random bits), so that the vectors cost no packing.
+
+Run this file to verify every chip of 01 and 02 which has a reference (in
+about half a second).
+"""
+
+import os
+import sys
+import time
+import random
+import numpy as np
+import reference
+from ChipLibrary import ChipLibrary
+from HDLDefinitions import PROJECT_DIRS
+from Netlist import flatten
+from Simulator import Simulator, counter_slices
+from reference import Mismatch, MAX_MISMATCHES
+
+EXHAUSTIVE_BITS = 20
+
+def lane_values(slices, lanes):
+    """The int64 array of the values of lanes vectors, from their bit
+    slices."""
+    size = (lanes + 7) // 8
+    values = np.zeros(lanes, dtype=np.int64)
+    for k, s in enumerate(slices):
+        bits = np.unpackbits(np.frombuffer(s.to_bytes(size, 'little'),
+                                           dtype=np.uint8),
+                             bitorder='little')[:lanes]
+        values |= bits.astype(np.int64) << k
+    return values
+
+def _batches(netlist, count, lanes, rng):
+    """Iterate (simulator, {pin: int64 array of the input vectors}) of each
+    batch of vectors; the inputs are set by their bit slices (a counter, or
+    random bits)."""
+    widths = [(pin, len(nets)) for pin, nets in netlist.inputs]
+    total_bits = sum(w for _, w in widths)
+    sim = None
+    if total_bits <= EXHAUSTIVE_BITS:
+        count, size = 1 << total_bits, 1
+        while size < min(lanes, count):
+            size *= 2
+        lanes = size
+    for start in range(0, count, lanes):
+        size = min(lanes, count - start)
+        if sim is None or sim.lanes != size:
+            sim = Simulator(netlist, size)
+        if total_bits <= EXHAUSTIVE_BITS:
+            slices = counter_slices(total_bits, size, start)
+        else:
+            slices = [rng.getrandbits(size) for _ in range(total_bits)]
+        vectors, offset = {}, 0
+        for pin, width in widths:
+            sim.set_bits(pin, slices[offset:offset + width])
+            vectors[pin] = lane_values(slices[offset:offset + width], size)
+            offset += width
+        yield sim, vectors
+
+def verify(netlist, function, count=100000, lanes=1024, seed=0):
+    """Check netlist against function, on all the vectors or on count
+    random vectors, called once for each batch on the arrays of its
+    vectors. Return (the number of vectors, [Mismatch])."""
+    rng = random.Random(seed)
+    checked, mismatches = 0, []
+    outputs = [pin for pin, _ in netlist.outputs]
+    for sim, vectors in _batches(netlist, count, lanes, rng):
+        sim.eval()
+        got = {pin: lane_values(sim.get_bits(pin), sim.lanes)
+               for pin in outputs}
+        expected = {pin: np.broadcast_to(value, sim.lanes) for pin, value
+                    in reference.call(function, vectors).items()}
+        wrong = np.zeros(sim.lanes, dtype=bool)
+        for pin in outputs:
+            wrong |= got[pin] != expected[pin]
+        for j in np.flatnonzero(wrong):
+            mismatches.append(Mismatch(
+                {pin: int(v[j]) for pin, v in vectors.items()},
+                {pin: int(expected[pin][j]) for pin in outputs},
+                {pin: int(got[pin][j]) for pin in outputs}))
+            if len(mismatches) >= MAX_MISMATCHES:
+                return checked + int(j) + 1, mismatches
+        checked += sim.lanes
+    return checked, mismatches
+
+def verify_projects(count=100000, lanes=1024, stream=None):
+    """Verify the chips of 01 and 02 which have a reference; return True if
+    all of them pass."""
+    stream = stream or sys.stdout
+    passed = True
+    stream.write('%-12s %6s %12s %10s %8s  %s\n' %('chip', 'bits', 'mode',
+                                                  'vectors', 'time', 'result'))
+    for directory in PROJECT_DIRS[:2]:
+        library = ChipLibrary(directory)
+        names = sorted(f[:-4] for f in os.listdir(directory)
+                       if f.endswith('.hdl'))
+        for name in names:
+            if name not in reference.CHIPS:
+                continue
+            start = time.time()
+            netlist = flatten(library, name)
+            bits = len(netlist.input_nets)
+            checked, mismatches = verify(netlist, reference.CHIPS[name],
+                                         count, lanes)
+            passed = passed and not mismatches
+            stream.write('%-12s %6d %12s %10d %7.2fs  %s\n'
+                         %(name, bits,
+                           'exhaustive' if bits <= EXHAUSTIVE_BITS else
+                           'random', checked, time.time() - start,
+                           mismatches[0] if mismatches else 'ok'))
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if verify_projects() else 1)
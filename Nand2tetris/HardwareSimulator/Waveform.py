@@ -0,0 +1,161 @@
+"""The Waveform module provides class Waveform to dump the values of some
+wires of a simulated chip to a VCD file (Value Change Dump, which GTKWave and
+the other waveform viewers read). The wires are selected by glob patterns
+over their hierarchical names:
+
+    out                     the pin out of the chip
+    PC_0.*                  the pins of the part PC_0
+    */Register_0.out        the out pin of the first Register of any part
+    ALU_0/*                 all the wires inside ALU_0 (may be many)
+
+by default, the pins of the chip. Each sample costs a comparison of the
+nets of the wires selected with their last values, whatever the size of the
+chip, and only the wires which changed are written, through a buffer of
+lines.
+
+>>> sim = Models.simulator(ChipLibrary('../03/a'), 'PC')
+>>> waveform = Waveform('PC.vcd', ['*'])
+>>> waveform.attach(sim)                # write the definitions, then #0
+>>> sim.set('inc', 1); sim.tick(); waveform.sample()
+>>> waveform.close()
+
+A TestScript samples its waveform (if any) after each eval, tick and tock,
+which are one unit of time each.
+"""
+
+import fnmatch
+from operator import itemgetter
+from HDLTokenizer import HDLError
+
+BUFFER_LINES = 4096
+
+def select(netlist, patterns=None):
+    """The names of the wires of netlist matching one of patterns (the pins
+    of the chip if None), in order of their scopes."""
+    if patterns is None:
+        return [pin for pin, _ in netlist.inputs + netlist.outputs]
+    names = set()
+    for pattern in patterns:
+        matches = fnmatch.filter(netlist.wires, pattern)
+        if not matches:
+            raise HDLError("%s: no wire matches %s" %(netlist.name, pattern))
+        names.update(matches)
+    return sorted(names, key=lambda name: scope(name))
+
+def scope(name):
+    """(scopes, variable) of the wire name: 'PC_0/Inc16_0.out' is the
+    variable out of the scope PC_0, Inc16_0."""
+    parts = name.split('/')
+    instance, dot, pin = parts[-1].rpartition('.')
+    if dot:
+        return tuple(parts[:-1]) + (instance,), pin
+    return tuple(parts[:-1]), parts[-1]
+
+def identifier(k):
+    """The k-th identifier code of VCD, of the characters ! to ~."""
+    code = chr(33 + k % 94)
+    while k >= 94:
+        k = k // 94 - 1
+        code += chr(33 + k % 94)
+    return code
+
+class Waveform:
+    """
+    Dump the wires patterns of the simulator attached to the VCD file path.
+    time is the time of the next sample.
+    """
+    def __init__(self, path, patterns=None, buffer_lines=BUFFER_LINES):
+        self.path = path
+        self.patterns = patterns
+        self.buffer_lines = buffer_lines
+        self.sim = None
+        self.names = []
+        self.time = 0
+        self._file = None
+        self._buffer = []
+        self._slots = []                # (code, lo, hi) into the nets
+        self._getter = None
+        self._last = None
+
+    def attach(self, sim):
+        """Select the wires of the chip of sim, write the definitions of the
+        VCD file and the first sample."""
+        self.close()
+        netlist = sim.netlist
+        self.sim = sim
+        self.names = select(netlist, self.patterns)
+        self.time = 0
+        nets = []
+        self._slots = []
+        lines = ['$version Nand2tetris HardwareSimulator $end\n',
+                 '$timescale 1ns $end\n',
+                 '$scope module %s $end\n' %netlist.name]
+        current = ()
+        for k, name in enumerate(self.names):
+            scopes, variable = scope(name)
+            common = 0
+            while (common < min(len(scopes), len(current)) and
+                   scopes[common] == current[common]):
+                common += 1
+            lines.extend(['$upscope $end\n'] * (len(current) - common))
+            lines.extend('$scope module %s $end\n' %s
+                         for s in scopes[common:])
+            current = scopes
+            wire = netlist.wires[name]
+            code = identifier(k)
+            lines.append('$var wire %d %s %s%s $end\n'
+                         %(len(wire), code, variable,
+                           ' [%d:0]' %(len(wire) - 1) if len(wire) > 1
+                           else ''))
+            self._slots.append((code, len(nets), len(nets) + len(wire)))
+            nets.extend(wire)
+        lines.extend(['$upscope $end\n'] * (len(current) + 1))
+        lines.append('$enddefinitions $end\n')
+        if len(nets) == 1:
+            self._getter = lambda values, net=nets[0]: (values[net],)
+        else:
+            self._getter = itemgetter(*nets)
+        self._file = open(self.path, 'w')
+        self._buffer = lines
+        bits = self._getter(sim.values)
+        self._buffer.append('#0\n$dumpvars\n')
+        self._changes(bits, range(len(self._slots)))
+        self._buffer.append('$end\n')
+        self._last = bits
+        self.time = 1
+
+    def _changes(self, bits, slots):
+        for k in slots:
+            code, lo, hi = self._slots[k]
+            if hi - lo == 1:
+                self._buffer.append('%d%s\n' %(bits[lo] & 1, code))
+            else:
+                self._buffer.append('b%s %s\n' %(''.join(
+                    '1' if bits[n] & 1 else '0'
+                    for n in range(hi - 1, lo - 1, -1)), code))
+
+    def sample(self):
+        """Write the wires which changed since the last sample."""
+        bits = self._getter(self.sim.values)
+        last = self._last
+        if bits != last:
+            self._buffer.append('#%d\n' %self.time)
+            self._changes(bits, [k for k, (_, lo, hi) in
+                                 enumerate(self._slots)
+                                 if bits[lo:hi] != last[lo:hi]])
+            self._last = bits
+            if len(self._buffer) >= self.buffer_lines:
+                self.flush()
+        self.time += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.writelines(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        if self._file is not None:
+            self._buffer.append('#%d\n' %self.time)
+            self.flush()
+            self._file.close()
+            self._file = None
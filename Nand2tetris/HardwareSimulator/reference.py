@@ -0,0 +1,145 @@
+"""The reference module provides the functions of the combinational chips of
+projects 01 and 02 (and of the helper chips of this repository), to check
+the chips built in HDL against them. A function takes the values of the IN
+pins (in the order of the chip, 'in' being in_) and returns a dict of the
+values of the OUT pins.
+
+The functions have no branches and use only &, |, ^, +, -, >> and << on
+the values, so that the same code works on ints, on NumPy arrays of all
+the vectors of a truth table, and on other number-like values.
+
+>>> ALU(x=3, y=5, zx=0, nx=0, zy=0, ny=0, f=1, no=0)
+{'out': 8, 'zr': 0, 'ng': 0}
+
+"""
+
+WORD = 0xFFFF
+
+def select(sel, a, b):
+    """b if the bit sel is 1 else a."""
+    return a ^ ((a ^ b) & -sel)
+
+def is_zero(value, width):
+    """1 if value (0 <= value < 2**width) is 0 else 0."""
+    return ((value - 1) >> width) & 1
+
+def bit(value, k):
+    return (value >> k) & 1
+
+##############
+# Project 01 #
+##############
+
+def Not(in_):
+    return {'out': in_ ^ 1}
+
+def And(a, b):
+    return {'out': a & b}
+
+def Or(a, b):
+    return {'out': a | b}
+
+def Xor(a, b):
+    return {'out': a ^ b}
+
+def Mux(a, b, sel):
+    return {'out': select(sel, a, b)}
+
+def DMux(in_, sel):
+    return {'a': in_ & (sel ^ 1), 'b': in_ & sel}
+
+def Not16(in_):
+    return {'out': in_ ^ WORD}
+
+def And16(a, b):
+    return {'out': a & b}
+
+def Or16(a, b):
+    return {'out': a | b}
+
+def Mux16(a, b, sel):
+    return {'out': select(sel, a, b)}
+
+def Or8Way(in_):
+    return {'out': is_zero(in_, 8) ^ 1}
+
+def Mux4Way16(a, b, c, d, sel):
+    s0, s1 = bit(sel, 0), bit(sel, 1)
+    return {'out': select(s1, select(s0, a, b), select(s0, c, d))}
+
+def Mux8Way16(a, b, c, d, e, f, g, h, sel):
+    s0, s1, s2 = bit(sel, 0), bit(sel, 1), bit(sel, 2)
+    low = select(s1, select(s0, a, b), select(s0, c, d))
+    high = select(s1, select(s0, e, f), select(s0, g, h))
+    return {'out': select(s2, low, high)}
+
+def _demux(in_, sel, names, width):
+    return {name: in_ & is_zero(sel ^ k, width)
+            for k, name in enumerate(names)}
+
+def DMux4Way(in_, sel):
+    return _demux(in_, sel, 'abcd', 2)
+
+def DMux8Way(in_, sel):
+    return _demux(in_, sel, 'abcdefgh', 3)
+
+##############
+# Project 02 #
+##############
+
+def HalfAdder(a, b):
+    return {'sum': a ^ b, 'carry': a & b}
+
+def FullAdder(a, b, c):
+    total = a + b + c
+    return {'sum': total & 1, 'carry': total >> 1}
+
+def Add16(a, b):
+    return {'out': (a + b) & WORD}
+
+def Inc16(in_):
+    return {'out': (in_ + 1) & WORD}
+
+def ALU(x, y, zx, nx, zy, ny, f, no):
+    x = select(zx, x, 0)
+    x = select(nx, x, x ^ WORD)
+    y = select(zy, y, 0)
+    y = select(ny, y, y ^ WORD)
+    out = select(f, x & y, (x + y) & WORD)
+    out = select(no, out, out ^ WORD)
+    return {'out': out, 'zr': is_zero(out, 16), 'ng': out >> 15}
+
+#################
+# Helper chips  #
+#################
+
+def IsNeg16(in_):
+    return {'out': in_ >> 15}
+
+def Or16Way(in_):
+    return {'out': is_zero(in_, 16) ^ 1}
+
+def Drop16(in_):
+    return {'out': in_ & 0x7FFF}
+
+CHIPS = {name: fn for name, fn in globals().items()
+         if callable(fn) and name[0].isupper()}
+
+def call(function, inputs):
+    """Call function with inputs, a dict {pin: value}."""
+    return function(**{(pin + '_' if pin == 'in' else pin): value
+                       for pin, value in inputs.items()})
+
+MAX_MISMATCHES = 10                     # reported by a check
+
+class Mismatch:
+    """A vector on which a chip differs from its reference (or a model from
+    its chip)."""
+    def __init__(self, inputs, expected, got):
+        self.inputs = inputs
+        self.expected = expected
+        self.got = got
+
+    def __repr__(self):
+        return 'Mismatch(%r: expected %r, got %r)' %(self.inputs,
+                                                      self.expected, self.got)